@@ -0,0 +1,193 @@
+"""
+app/batch_loader.py - DataLoader 式批量查询
+
+计划中并行的查询步骤、/chat/batch 中的并发对话会对同一个上游逐条发起按ID查询，
+每个ID一次HTTP往返。BatchLoader 把短时间窗口内的单条查询收集起来，合并成一次批量请求：
+- 第一条查询开启一个窗口（默认几毫秒），窗口结束或凑满 max_batch_size 时发出批量请求
+- 同步调用（线程池中执行）由开启窗口的线程负责发出请求，其余线程等待结果
+- 异步调用按事件循环收集，窗口结束后在独立的 Task 中执行（某个调用方取消不影响其他调用方；
+  Task 本身被取消时等待的调用方收到异常，不会一直挂起）
+批量函数接收去重后的ID列表，返回 {ID: 单条结果}，结果格式与单条查询完全相同。
+"""
+from typing import Dict, Any, Awaitable, Callable, Hashable, List, Optional
+import asyncio
+import concurrent.futures
+import copy
+import threading
+
+BatchFn = Callable[[List[Hashable]], Dict[Hashable, Any]]
+AsyncBatchFn = Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]
+
+
+class _Batch:
+    """收集中的一批查询"""
+
+    def __init__(self):
+        self.futures: Dict[Hashable, Any] = {}
+        self.full = threading.Event()
+        self.handle: Optional[asyncio.TimerHandle] = None
+
+
+class BatchLoader:
+    """把窗口内的单条查询合并为批量查询（线程安全）"""
+
+    def __init__(
+        self,
+        name: str,
+        batch_fn: BatchFn,
+        abatch_fn: AsyncBatchFn,
+        window: float = 0.002,
+        max_batch_size: int = 50,
+        enabled: bool = True
+    ):
+        """
+        初始化批量加载器
+
+        Args:
+            name: 名称（统计用，如 get_order）
+            batch_fn: 同步批量函数
+            abatch_fn: 异步批量函数
+            window: 收集窗口（秒）
+            max_batch_size: 单次批量请求最多包含的ID数
+            enabled: 是否启用（关闭时技能直接逐条查询）
+        """
+        self.name = name
+        self.batch_fn = batch_fn
+        self.abatch_fn = abatch_fn
+        self.window = window
+        self.max_batch_size = max(1, max_batch_size)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._pending: Optional[_Batch] = None
+        self._async_pending: Dict[asyncio.AbstractEventLoop, _Batch] = {}
+        self._tasks: set = set()  # 执行中的批量 Task（保留引用，避免被垃圾回收）
+        self.loads = 0
+        self.batches = 0
+        self.keys = 0
+        self.largest_batch = 0
+
+    def _add(self, batch: _Batch, key: Hashable, create_future: Callable[[], Any]) -> Any:
+        """把查询加入批次（调用方持有锁），返回该ID的 future"""
+        self.loads += 1
+        future = batch.futures.get(key)
+        if future is None:
+            future = create_future()
+            batch.futures[key] = future
+        return future
+
+    def _record(self, size: int) -> None:
+        with self._lock:
+            self.batches += 1
+            self.keys += size
+            self.largest_batch = max(self.largest_batch, size)
+
+    def load(self, key: Hashable) -> Any:
+        """
+        同步查询单个ID（在窗口内与其他线程的查询合并）
+
+        Args:
+            key: 查询ID
+
+        Returns:
+            该ID的查询结果（副本，同一批次中重复的ID互不影响）
+        """
+        with self._lock:
+            batch = self._pending
+            leader = batch is None
+            if leader:
+                batch = self._pending = _Batch()
+            future = self._add(batch, key, concurrent.futures.Future)
+            if len(batch.futures) >= self.max_batch_size:
+                self._pending = None
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._pending is batch:
+                    self._pending = None
+            self._dispatch(batch)
+        return copy.deepcopy(future.result())
+
+    def _dispatch(self, batch: _Batch) -> None:
+        """发出同步批量请求，把结果（或异常）分发给各个等待的线程"""
+        keys = list(batch.futures)
+        self._record(len(keys))
+        try:
+            results = self.batch_fn(keys)
+        except Exception as e:
+            for future in batch.futures.values():
+                future.set_exception(e)
+            return
+        for key, future in batch.futures.items():
+            if key in results:
+                future.set_result(results[key])
+            else:
+                future.set_exception(KeyError(key))
+
+    async def aload(self, key: Hashable) -> Any:
+        """
+        异步查询单个ID（在窗口内与同一事件循环上的其他查询合并）
+
+        Args:
+            key: 查询ID
+
+        Returns:
+            该ID的查询结果（副本）
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            batch = self._async_pending.get(loop)
+            if batch is None:
+                batch = self._async_pending[loop] = _Batch()
+                batch.handle = loop.call_later(self.window, self._adispatch, loop, batch)
+            future = self._add(batch, key, loop.create_future)
+            full = len(batch.futures) >= self.max_batch_size
+        if full:
+            batch.handle.cancel()
+            self._adispatch(loop, batch)
+        return copy.deepcopy(await asyncio.shield(future))
+
+    def _adispatch(self, loop: asyncio.AbstractEventLoop, batch: _Batch) -> None:
+        """窗口结束（或批次已满）：在独立的 Task 中发出异步批量请求"""
+        with self._lock:
+            if self._async_pending.get(loop) is not batch:
+                return
+            del self._async_pending[loop]
+        task = loop.create_task(self._arun(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _arun(self, batch: _Batch) -> None:
+        keys = list(batch.futures)
+        self._record(len(keys))
+        error: Exception = RuntimeError(f"批量查询 {self.name} 被取消")
+        try:
+            results = await self.abatch_fn(keys)
+            for key, future in batch.futures.items():
+                if future.done():
+                    continue
+                if key in results:
+                    future.set_result(results[key])
+                else:
+                    future.set_exception(KeyError(key))
+        except Exception as e:
+            error = e
+        finally:
+            # 批量请求失败或 Task 被取消：仍在等待的调用方都收到异常
+            for future in batch.futures.values():
+                if not future.done():
+                    future.set_exception(error)
+
+    def stats(self) -> Dict[str, Any]:
+        """批量统计（供 /metrics 使用）：loads 为单条查询数，batches 为实际发出的请求数"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "window_ms": round(self.window * 1000, 3),
+                "max_batch_size": self.max_batch_size,
+                "loads": self.loads,
+                "batches": self.batches,
+                "avg_batch_size": round(self.keys / self.batches, 2) if self.batches else 0.0,
+                "largest_batch": self.largest_batch
+            }
@@ -0,0 +1,184 @@
+"""
+app/conditional_get.py - 技能GET请求的条件请求缓存（ETag / Last-Modified）
+
+技能每次GET都重新下载并解析完整的JSON（物流接口的 history 数组尤其长）。
+这里按URL缓存上游返回的校验器（ETag、Last-Modified）和已经解析好的JSON：
+- 再次请求同一URL时带上 If-None-Match / If-Modified-Since
+- 上游返回 304（没有响应体）时直接交给技能流程缓存的解析结果，不再解码JSON
+  （200 响应用 app/json_codec.py 解码一次）
+- 按接口统计请求数、304次数和节省的字节数
+"""
+from typing import Dict, Any, Optional
+from collections import OrderedDict
+import copy
+import logging
+import re
+import threading
+
+import httpx
+
+from app import json_codec
+
+logger = logging.getLogger(__name__)
+
+_LITERAL_SEGMENT = re.compile(r"[a-z_]+")
+
+
+def endpoint_of(url: httpx.URL) -> str:
+    """统计用的接口名：路径中的ID段替换为 {id}，如 /api/logistics/{id}"""
+    segments = [s if _LITERAL_SEGMENT.fullmatch(s) else "{id}" for s in url.path.split("/") if s]
+    return "/" + "/".join(segments)
+
+
+class ValidatedResponse(httpx.Response):
+    """交给技能流程的响应：json() 直接返回已解析结果的副本（调用方修改结果不影响缓存）"""
+
+    def __init__(self, data: Any, response: httpx.Response):
+        super().__init__(200, headers=response.headers, request=response.request)
+        self._data = data
+
+    def json(self, **kwargs: Any) -> Any:
+        return copy.deepcopy(self._data)
+
+
+class _Entry:
+    """一个URL的校验器和解析结果"""
+
+    def __init__(self, etag: Optional[str], last_modified: Optional[str], data: Any, size: int):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.data = data
+        self.size = size
+
+
+class ConditionalGetCache:
+    """按URL缓存校验器和解析结果的LRU（线程安全）"""
+
+    def __init__(self, max_entries: int = 2048, max_body_bytes: int = 1024 * 1024, enabled: bool = True):
+        """
+        初始化条件请求缓存
+
+        Args:
+            max_entries: 最多缓存的URL数（超出时淘汰最久未使用的）
+            max_body_bytes: 超过该大小的响应不缓存
+            enabled: 是否启用（关闭时请求和响应原样透传）
+        """
+        self.max_entries = max_entries
+        self.max_body_bytes = max_body_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._endpoints: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def _key(method: str, url: str, params: Optional[Dict[str, Any]]) -> Optional[str]:
+        if method.upper() != "GET":
+            return None
+        return str(httpx.URL(url, params=params))
+
+    def request_headers(self, method: str, url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+        """
+        本次请求需要附带的条件请求头
+
+        Args:
+            method: HTTP方法（只处理GET）
+            url: 请求地址
+            params: 查询参数
+
+        Returns:
+            If-None-Match / If-Modified-Since 请求头（没有缓存时为空）
+        """
+        key = self._key(method, url, params) if self.enabled else None
+        if key is None:
+            return {}
+        with self._lock:
+            entry = self._entries.get(key)
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def process(self, method: str, url: str, params: Optional[Dict[str, Any]], response: httpx.Response) -> httpx.Response:
+        """
+        处理上游响应：304 换成缓存的解析结果，带校验器的 200 解析一次并缓存
+
+        Args:
+            method: HTTP方法
+            url: 请求地址
+            params: 查询参数
+            response: 上游响应
+
+        Returns:
+            交给技能流程的响应
+        """
+        key = self._key(method, url, params) if self.enabled else None
+        if key is None:
+            return response
+        endpoint = endpoint_of(httpx.URL(url))
+
+        if response.status_code == 304:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                self._count(endpoint, not_modified=1 if entry else 0, bytes_saved=entry.size if entry else 0)
+            if entry is None:
+                # 缓存条目已被淘汰，304 无法使用（流程按"API错误"处理）
+                logger.warning(f"304 without cached entry: {key}")
+                return response
+            return ValidatedResponse(entry.data, response)
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        size = len(response.content)
+        with self._lock:
+            self._count(endpoint, bytes_received=size)
+        if response.status_code != 200 or not (etag or last_modified) or size > self.max_body_bytes:
+            return response
+        try:
+            data = json_codec.loads(response.content)
+        except ValueError:
+            return response
+        with self._lock:
+            self._entries[key] = _Entry(etag, last_modified, data, size)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return ValidatedResponse(data, response)
+
+    def _count(self, endpoint: str, not_modified: int = 0, bytes_saved: int = 0, bytes_received: int = 0) -> None:
+        """更新接口统计（调用方持有锁）"""
+        counter = self._endpoints.setdefault(
+            endpoint, {"requests": 0, "not_modified": 0, "bytes_received": 0, "bytes_saved": 0}
+        )
+        counter["requests"] += 1
+        counter["not_modified"] += not_modified
+        counter["bytes_saved"] += bytes_saved
+        counter["bytes_received"] += bytes_received
+
+    def stats(self) -> Dict[str, Any]:
+        """条件请求统计（供 /metrics 使用）：按接口的 304 比例和节省的字节数"""
+        with self._lock:
+            endpoints = {
+                endpoint: {
+                    **counter,
+                    "not_modified_ratio": round(counter["not_modified"] / counter["requests"], 4) if counter["requests"] else 0.0
+                }
+                for endpoint, counter in sorted(self._endpoints.items())
+            }
+            size = len(self._entries)
+        requests = sum(c["requests"] for c in endpoints.values())
+        not_modified = sum(c["not_modified"] for c in endpoints.values())
+        return {
+            "enabled": self.enabled,
+            "size": size,
+            "max_entries": self.max_entries,
+            "requests": requests,
+            "not_modified": not_modified,
+            "not_modified_ratio": round(not_modified / requests, 4) if requests else 0.0,
+            "bytes_saved": sum(c["bytes_saved"] for c in endpoints.values()),
+            "endpoints": endpoints
+        }
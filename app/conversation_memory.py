@@ -0,0 +1,196 @@
+"""
+app/conversation_memory.py - 会话记忆
+
+同一会话（session_id）的多轮对话写入 chat_history，规划时注入精简的对话上下文，
+用户追问"它到哪了"时不必重复订单号：
+- 最近 window_turns 轮对话保留原文（每条消息截断到 message_max_chars）
+- 滑出窗口的消息增量折叠进会话摘要（chat_sessions）：提到过的实体（最近的在前）和较早的请求要点，
+  都有条数上限，折叠不调用LLM
+- 每轮只按 (session_id, timestamp) 索引读取一个窗口的消息和一条摘要，注入的上下文长度有上限，
+  不随对话轮数增长
+"""
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
+import threading
+
+from app import json_codec
+from app.database import Database
+from app.entities import extract_entities
+
+# 实体类型在摘要中的前缀
+ENTITY_LABELS: Dict[str, str] = {
+    "order_id": "订单",
+    "product_id": "产品",
+    "tracking_number": "物流单号",
+    "customer_id": "客户",
+    "refund_id": "退款申请",
+    "replenishment_id": "补货申请",
+}
+
+# 助手回复中的纯数字（库存数量、金额...）容易误识别为订单号，只从用户消息中提取订单号
+USER_ONLY_ENTITIES = ("order_id",)
+
+# 折叠时多读取的消息数：上一轮折叠失败时漏掉的消息也能补上
+FOLD_SLACK = 4
+
+
+def fold_messages(
+    summary: Dict[str, List[str]],
+    messages: List[Dict[str, Any]],
+    max_entities: int,
+    max_requests: int,
+    request_max_chars: int
+) -> Dict[str, List[str]]:
+    """
+    把滑出窗口的消息折叠进摘要
+
+    Args:
+        summary: {"entities": [...], "requests": [...]}（实体最近的在前，请求按时间正序）
+        messages: 待折叠的消息（按时间正序）
+        max_entities: 最多保留的实体数
+        max_requests: 最多保留的请求要点数
+        request_max_chars: 每条请求要点的最大长度
+
+    Returns:
+        新的摘要
+    """
+    entities = list(summary.get("entities", []))
+    requests = list(summary.get("requests", []))
+    for message in messages:
+        content = message["content"]
+        for entity in extract_entities(content):
+            if message["role"] != "user" and entity.kind in USER_ONLY_ENTITIES:
+                continue
+            label = f"{ENTITY_LABELS.get(entity.kind, '')}{entity.value}"
+            if label in entities:
+                entities.remove(label)
+            entities.insert(0, label)
+        if message["role"] == "user":
+            requests.append(_clip(content, request_max_chars))
+    return {"entities": entities[:max_entities], "requests": requests[-max_requests:]}
+
+
+def _clip(text: str, max_chars: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= max_chars else text[:max_chars] + "..."
+
+
+class ConversationMemory:
+    """会话记忆（读写 chat_history / chat_sessions）"""
+
+    def __init__(
+        self,
+        db: Database,
+        window_turns: int = 3,
+        message_max_chars: int = 200,
+        max_entities: int = 8,
+        max_requests: int = 5
+    ):
+        """
+        初始化会话记忆
+
+        Args:
+            db: 数据库
+            window_turns: 保留原文的最近轮数（一轮为用户消息 + 助手回复）
+            message_max_chars: 注入上下文时每条消息的最大长度
+            max_entities: 摘要中最多保留的实体数
+            max_requests: 摘要中最多保留的较早请求要点数
+        """
+        self.db = db
+        self.window_messages = max(1, window_turns) * 2
+        self.message_max_chars = message_max_chars
+        self.max_entities = max_entities
+        self.max_requests = max_requests
+        self._lock = threading.Lock()  # 统计计数
+        self._fold_lock = threading.Lock()  # 保存与折叠（在线程池中执行）
+        self.loads = 0
+        self.turns_saved = 0
+        self.messages_folded = 0
+        self.context_chars = 0
+
+    async def load(self, session_id: str) -> str:
+        """
+        读取会话上下文
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            注入规划提示词的上下文文本（新会话返回空字符串）
+        """
+        summary, messages = await asyncio.to_thread(self._load, session_id)
+        context = self.render(summary, messages)
+        with self._lock:
+            self.loads += 1
+            self.context_chars += len(context)
+        return context
+
+    async def append(self, session_id: str, user_id: str, user_input: str, response: str) -> None:
+        """
+        保存一轮对话，并把滑出窗口的消息折叠进摘要
+
+        Args:
+            session_id: 会话ID
+            user_id: 用户ID
+            user_input: 用户输入
+            response: 助手回复
+        """
+        await asyncio.to_thread(self._append, session_id, user_id, user_input, response)
+
+    def render(self, summary: Dict[str, List[str]], messages: List[Dict[str, Any]]) -> str:
+        """把摘要和最近的消息整理为上下文文本"""
+        lines = []
+        if summary.get("entities"):
+            lines.append(f"之前提到过：{'、'.join(summary['entities'])}")
+        if summary.get("requests"):
+            lines.append(f"更早的请求：{'；'.join(summary['requests'])}")
+        if messages:
+            lines.append("最近的对话：")
+            for message in messages:
+                role = "用户" if message["role"] == "user" else "助手"
+                lines.append(f"{role}：{_clip(message['content'], self.message_max_chars)}")
+        return "\n".join(lines)
+
+    def _load(self, session_id: str) -> Tuple[Dict[str, List[str]], List[Dict[str, Any]]]:
+        record = self.db.get_session_summary(session_id)
+        messages = self.db.get_recent_turns(session_id, self.window_messages)
+        return self._parse_summary(record), messages
+
+    def _append(self, session_id: str, user_id: str, user_input: str, response: str) -> None:
+        with self._fold_lock:
+            self.db.save_chat_turn(session_id, user_id, "user", user_input)
+            self.db.save_chat_turn(session_id, user_id, "assistant", response)
+
+            # 每轮最多滑出两条消息，只需读取窗口之外最近的几条
+            recent = self.db.get_recent_turns(session_id, self.window_messages + FOLD_SLACK)
+            record = self.db.get_session_summary(session_id)
+            summarized_until = record["summarized_until"] if record else 0
+            pending = [m for m in recent[:-self.window_messages] if m["id"] > summarized_until]
+
+            if pending:
+                summary = fold_messages(
+                    self._parse_summary(record), pending,
+                    self.max_entities, self.max_requests, self.message_max_chars // 2
+                )
+                self.db.save_session_summary(session_id, user_id, json_codec.dumps(summary), pending[-1]["id"])
+
+        with self._lock:
+            self.turns_saved += 1
+            self.messages_folded += len(pending)
+
+    @staticmethod
+    def _parse_summary(record: Optional[Dict[str, Any]]) -> Dict[str, List[str]]:
+        if not record or not record.get("summary"):
+            return {"entities": [], "requests": []}
+        return json_codec.loads(record["summary"])
+
+    def stats(self) -> Dict[str, Any]:
+        """会话记忆统计（供 /metrics 使用）"""
+        with self._lock:
+            return {
+                "window_messages": self.window_messages,
+                "loads": self.loads,
+                "turns_saved": self.turns_saved,
+                "messages_folded": self.messages_folded,
+                "avg_context_chars": round(self.context_chars / self.loads, 1) if self.loads else 0.0
+            }
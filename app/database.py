@@ -1,8 +1,46 @@
 # app/database.py - 数据库管理
 import sqlite3
+import asyncio
 from datetime import datetime
 from typing import List, Dict, Any, Optional
-import json
+
+from app import json_codec
+
+# ai_decisions 的LLM用量列（旧库缺少的列在 init_db 中自动补齐）
+USAGE_COLUMNS = {
+    "input_tokens": "INTEGER",
+    "output_tokens": "INTEGER",
+    "cache_creation_tokens": "INTEGER",
+    "cache_read_tokens": "INTEGER",
+    "plan_input_tokens": "INTEGER",
+    "plan_output_tokens": "INTEGER",
+    "plan_cost": "REAL",
+    "response_input_tokens": "INTEGER",
+    "response_output_tokens": "INTEGER",
+    "response_cost": "REAL",
+}
+
+# ai_decisions 的规划结果列：plan_source 为 rule / cache / llm，plan_format 为 tool / text（LLM规划的输出方式）
+PLAN_COLUMNS = {
+    "plan_source": "TEXT",
+    "plan_format": "TEXT",
+    "plan_error": "TEXT",
+}
+
+# ai_decisions 的模型分级列：规划最终使用的级别（small / large）、升级原因、各级规划耗时，回复模型及耗时
+MODEL_COLUMNS = {
+    "plan_model": "TEXT",
+    "plan_tier": "TEXT",
+    "plan_escalation": "TEXT",
+    "plan_small_ms": "REAL",
+    "plan_large_ms": "REAL",
+    "response_model": "TEXT",
+    "response_ms": "REAL",
+}
+
+# 旧记录没有 plan_error 列，按意图识别规划失败
+PLAN_FAILURE_INTENTS = ("解析失败", "分析失败", "计划校验失败")
+
 
 class Database:
     """数据库管理类"""
@@ -11,8 +49,8 @@ class Database:
         self.db_path = db_path
         self._connection = None  # 用于内存数据库
         if db_path == ":memory:":
-            # 内存数据库需要保持连接
-            self._connection = sqlite3.connect(db_path)
+            # 内存数据库需要保持连接（允许线程池中的异步写入复用）
+            self._connection = sqlite3.connect(db_path, check_same_thread=False)
         self.init_db()
 
     def get_connection(self):
@@ -21,6 +59,11 @@ class Database:
             return self._connection
         return sqlite3.connect(self.db_path)
 
+    def release_connection(self, conn):
+        """释放数据库连接（内存数据库的共享连接保持打开）"""
+        if conn is not self._connection:
+            conn.close()
+
     def init_db(self):
         """初始化数据库表"""
         conn = self.get_connection()
@@ -42,6 +85,13 @@ class Database:
             )
         ''')
 
+        # 补齐旧库缺少的用量列、规划结果列和模型分级列
+        cursor.execute("PRAGMA table_info(ai_decisions)")
+        existing_columns = {row[1] for row in cursor.fetchall()}
+        for column, column_type in {**USAGE_COLUMNS, **PLAN_COLUMNS, **MODEL_COLUMNS}.items():
+            if column not in existing_columns:
+                cursor.execute(f"ALTER TABLE ai_decisions ADD COLUMN {column} {column_type}")
+
         # 系统指标表
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS system_metrics (
@@ -64,6 +114,17 @@ class Database:
             )
         ''')
 
+        # 会话摘要表：早于最近窗口的对话增量折叠成摘要，summarized_until 为已折叠的最后一条 chat_history.id
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS chat_sessions (
+                session_id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                summary TEXT,
+                summarized_until INTEGER DEFAULT 0,
+                updated_at TEXT NOT NULL
+            )
+        ''')
+
         # 创建索引以提高查询性能
         cursor.execute('''
             CREATE INDEX IF NOT EXISTS idx_decisions_timestamp
@@ -80,8 +141,14 @@ class Database:
             ON system_metrics(metric_name, timestamp)
         ''')
 
+        # 按会话取最近N条对话只扫描N条索引项
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_chat_history_session
+            ON chat_history(session_id, timestamp)
+        ''')
+
         conn.commit()
-        conn.close()
+        self.release_connection(conn)
 
         # 不使用emoji避免Windows编码问题
 
@@ -94,19 +161,36 @@ class Database:
         user_id: str = "default",
         success: bool = True,
         execution_time_ms: Optional[float] = None,
-        llm_cost: Optional[float] = None
+        llm_cost: Optional[float] = None,
+        llm_usage: Optional[Dict[str, Any]] = None,
+        plan_source: Optional[str] = None,
+        plan_format: Optional[str] = None,
+        plan_error: Optional[str] = None,
+        model_routing: Optional[Dict[str, Any]] = None
     ) -> int:
-        """保存AI决策记录"""
+        """
+        保存AI决策记录
+
+        llm_usage 为 UsageTracker.summary() 的返回值，提供时按阶段写入用量列，
+        llm_cost 未提供时取其中的总成本。plan_* 记录计划来源、LLM输出方式和规划错误。
+        model_routing 为编排器返回的模型分级信息，展开写入模型分级列。
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
 
         # 将result转换为JSON字符串
-        result_json = json.dumps(result, ensure_ascii=False)
+        result_json = json_codec.dumps(result)
 
-        cursor.execute('''
+        usage_values = self._flatten_usage(llm_usage)
+        routing_values = self._flatten_routing(model_routing)
+        if llm_cost is None and llm_usage:
+            llm_cost = llm_usage["total"]["cost"]
+
+        cursor.execute(f'''
             INSERT INTO ai_decisions
-            (user_id, user_input, intent, action, result, success, execution_time_ms, llm_cost, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            (user_id, user_input, intent, action, result, success, execution_time_ms, llm_cost, timestamp,
+             {", ".join(USAGE_COLUMNS)}, plan_source, plan_format, plan_error, {", ".join(MODEL_COLUMNS)})
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, {", ".join("?" * len(USAGE_COLUMNS))}, ?, ?, ?, {", ".join("?" * len(MODEL_COLUMNS))})
         ''', (
             user_id,
             user_input,
@@ -116,15 +200,125 @@ class Database:
             1 if success else 0,
             execution_time_ms,
             llm_cost,
-            datetime.now().isoformat()
+            datetime.now().isoformat(),
+            *(usage_values[column] for column in USAGE_COLUMNS),
+            plan_source,
+            plan_format,
+            plan_error,
+            *(routing_values[column] for column in MODEL_COLUMNS)
         ))
 
         decision_id = cursor.lastrowid
         conn.commit()
-        conn.close()
+        self.release_connection(conn)
 
         return decision_id
 
+    @staticmethod
+    def _flatten_usage(llm_usage: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """把按阶段的用量展开为 ai_decisions 的列值（未提供时全部为None）"""
+        if not llm_usage:
+            return {column: None for column in USAGE_COLUMNS}
+
+        total = llm_usage["total"]
+        plan = llm_usage.get("plan") or {}
+        response = llm_usage.get("response") or {}
+        return {
+            "input_tokens": total["input_tokens"],
+            "output_tokens": total["output_tokens"],
+            "cache_creation_tokens": total["cache_creation_tokens"],
+            "cache_read_tokens": total["cache_read_tokens"],
+            "plan_input_tokens": plan.get("input_tokens", 0),
+            "plan_output_tokens": plan.get("output_tokens", 0),
+            "plan_cost": plan.get("cost", 0.0),
+            "response_input_tokens": response.get("input_tokens", 0),
+            "response_output_tokens": response.get("output_tokens", 0),
+            "response_cost": response.get("cost", 0.0),
+        }
+
+    @staticmethod
+    def _flatten_routing(model_routing: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """把模型分级信息展开为 ai_decisions 的列值（未提供时全部为None）"""
+        routing = model_routing or {}
+        latency = routing.get("plan_latency_ms") or {}
+        return {
+            "plan_model": routing.get("plan_model"),
+            "plan_tier": routing.get("plan_tier"),
+            "plan_escalation": routing.get("escalation"),
+            "plan_small_ms": latency.get("small"),
+            "plan_large_ms": latency.get("large"),
+            "response_model": routing.get("response_model"),
+            "response_ms": routing.get("response_latency_ms"),
+        }
+
+    async def asave_decision(self, **kwargs) -> int:
+        """
+        save_decision 的异步版本
+
+        sqlite3 是阻塞IO，放到线程池执行，避免在事件循环上写库。
+        参数与 save_decision 相同。
+        """
+        return await asyncio.to_thread(self.save_decision, **kwargs)
+
+    def save_chat_turn(self, session_id: str, user_id: str, role: str, content: str) -> int:
+        """保存一条会话消息（role 为 user / assistant），返回消息ID"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO chat_history (session_id, user_id, role, content, timestamp)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (session_id, user_id, role, content, datetime.now().isoformat()))
+        message_id = cursor.lastrowid
+        conn.commit()
+        self.release_connection(conn)
+        return message_id
+
+    def get_recent_turns(self, session_id: str, limit: int) -> List[Dict[str, Any]]:
+        """获取会话最近的 limit 条消息（按时间正序）"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, role, content, timestamp
+            FROM chat_history
+            WHERE session_id = ?
+            ORDER BY timestamp DESC, id DESC
+            LIMIT ?
+        ''', (session_id, limit))
+        rows = cursor.fetchall()
+        self.release_connection(conn)
+        return [
+            {"id": row[0], "role": row[1], "content": row[2], "timestamp": row[3]}
+            for row in reversed(rows)
+        ]
+
+    def get_session_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """获取会话摘要，没有摘要返回None"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT summary, summarized_until FROM chat_sessions WHERE session_id = ?
+        ''', (session_id,))
+        row = cursor.fetchone()
+        self.release_connection(conn)
+        if row is None:
+            return None
+        return {"summary": row[0], "summarized_until": row[1] or 0}
+
+    def save_session_summary(self, session_id: str, user_id: str, summary: str, summarized_until: int) -> None:
+        """保存会话摘要（覆盖旧摘要）"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO chat_sessions (session_id, user_id, summary, summarized_until, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(session_id) DO UPDATE SET
+                summary = excluded.summary,
+                summarized_until = excluded.summarized_until,
+                updated_at = excluded.updated_at
+        ''', (session_id, user_id, summary, summarized_until, datetime.now().isoformat()))
+        conn.commit()
+        self.release_connection(conn)
+
     def get_recent_decisions(self, limit: int = 10) -> List[Dict[str, Any]]:
         """获取最近的决策记录"""
         conn = self.get_connection()
@@ -138,7 +332,7 @@ class Database:
         ''', (limit,))
 
         rows = cursor.fetchall()
-        conn.close()
+        self.release_connection(conn)
 
         results = []
         for row in rows:
@@ -204,7 +398,7 @@ class Database:
         ''')
         today_cost = cursor.fetchone()[0] or 0
 
-        conn.close()
+        self.release_connection(conn)
 
         return {
             "today_total": today_total,
@@ -214,6 +408,131 @@ class Database:
             "today_cost": today_cost
         }
 
+    def get_today_llm_usage(self) -> Dict[str, Any]:
+        """获取今日LLM用量（按阶段汇总token与成本）"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT
+                COUNT(input_tokens),
+                SUM(input_tokens), SUM(output_tokens),
+                SUM(cache_creation_tokens), SUM(cache_read_tokens),
+                SUM(plan_input_tokens), SUM(plan_output_tokens), SUM(plan_cost),
+                SUM(response_input_tokens), SUM(response_output_tokens), SUM(response_cost),
+                SUM(llm_cost)
+            FROM ai_decisions
+            WHERE date(timestamp) = date('now')
+            AND input_tokens IS NOT NULL
+        ''')
+        row = [value or 0 for value in cursor.fetchone()]
+        self.release_connection(conn)
+
+        requests, input_tokens, output_tokens, cache_creation, cache_read = row[:5]
+        # 提示缓存命中率：缓存读取的token占全部输入token的比例
+        all_input = input_tokens + cache_creation + cache_read
+        return {
+            "requests": requests,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cache_creation_tokens": cache_creation,
+            "cache_read_tokens": cache_read,
+            "cache_hit_rate": cache_read / all_input if all_input else 0.0,
+            "plan": {"input_tokens": row[5], "output_tokens": row[6], "cost": row[7]},
+            "response": {"input_tokens": row[8], "output_tokens": row[9], "cost": row[10]},
+            "total_cost": row[11],
+            "avg_cost_per_request": row[11] / requests if requests else 0.0
+        }
+
+    def get_plan_failure_stats(self, days: int = 7) -> Dict[str, Any]:
+        """
+        按LLM输出方式统计规划失败率（对比 tool use 与文本JSON解析）
+
+        没有 plan_format 的旧记录归为 legacy，按意图识别失败。
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        placeholders = ", ".join("?" * len(PLAN_FAILURE_INTENTS))
+        cursor.execute(f'''
+            SELECT
+                COALESCE(plan_format, 'legacy'),
+                COUNT(*),
+                SUM(CASE WHEN plan_error IS NOT NULL OR intent IN ({placeholders}) THEN 1 ELSE 0 END)
+            FROM ai_decisions
+            WHERE date(timestamp) >= date('now', ?)
+            AND (plan_source = 'llm' OR plan_source IS NULL)
+            GROUP BY COALESCE(plan_format, 'legacy')
+        ''', (*PLAN_FAILURE_INTENTS, f'-{days} days'))
+
+        stats = {}
+        for plan_format, requests, failures in cursor.fetchall():
+            stats[plan_format] = {
+                "requests": requests,
+                "failures": failures,
+                "failure_rate": failures / requests if requests else 0.0
+            }
+        self.release_connection(conn)
+        return stats
+
+    def get_model_tier_stats(self, days: int = 7) -> Dict[str, Any]:
+        """
+        按模型级别统计规划升级率和延迟，按回复模型统计回复延迟
+
+        Returns:
+            {"plan": {级别: {...}}, "escalation_rate": 升级率, "escalation_reasons": {原因: 次数},
+             "response": {模型: {...}}}
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        since = f'-{days} days'
+
+        cursor.execute('''
+            SELECT plan_tier, COUNT(*), SUM(CASE WHEN plan_escalation IS NOT NULL THEN 1 ELSE 0 END),
+                   AVG(plan_small_ms), AVG(plan_large_ms)
+            FROM ai_decisions
+            WHERE date(timestamp) >= date('now', ?) AND plan_tier IS NOT NULL
+            GROUP BY plan_tier
+        ''', (since,))
+        plan_stats = {}
+        requests = escalations = 0
+        for tier, count, escalated, small_ms, large_ms in cursor.fetchall():
+            plan_stats[tier] = {
+                "requests": count,
+                "escalations": escalated,
+                "avg_small_ms": small_ms,
+                "avg_large_ms": large_ms
+            }
+            requests += count
+            escalations += escalated
+
+        cursor.execute('''
+            SELECT plan_escalation, COUNT(*)
+            FROM ai_decisions
+            WHERE date(timestamp) >= date('now', ?) AND plan_escalation IS NOT NULL
+            GROUP BY plan_escalation
+        ''', (since,))
+        reasons = dict(cursor.fetchall())
+
+        cursor.execute('''
+            SELECT response_model, COUNT(*), AVG(response_ms)
+            FROM ai_decisions
+            WHERE date(timestamp) >= date('now', ?) AND response_model IS NOT NULL
+            GROUP BY response_model
+        ''', (since,))
+        response_stats = {
+            model: {"requests": count, "avg_latency_ms": avg_ms}
+            for model, count, avg_ms in cursor.fetchall()
+        }
+        self.release_connection(conn)
+
+        return {
+            "plan": plan_stats,
+            "escalation_rate": escalations / requests if requests else 0.0,
+            "escalation_reasons": reasons,
+            "response": response_stats
+        }
+
     def get_intent_distribution(self, days: int = 7) -> List[Dict[str, Any]]:
         """获取意图分布"""
         conn = self.get_connection()
@@ -228,7 +547,7 @@ class Database:
         ''', (f'-{days} days',))
 
         rows = cursor.fetchall()
-        conn.close()
+        self.release_connection(conn)
 
         return [{"intent": row[0], "count": row[1]} for row in rows]
 
@@ -243,7 +562,7 @@ class Database:
         ''', (metric_name, metric_value, datetime.now().isoformat()))
 
         conn.commit()
-        conn.close()
+        self.release_connection(conn)
 
     def cleanup_old_data(self, days: int = 90):
         """清理旧数据（保留最近90天）"""
@@ -262,6 +581,6 @@ class Database:
 
         deleted = cursor.rowcount
         conn.commit()
-        conn.close()
+        self.release_connection(conn)
 
         return deleted
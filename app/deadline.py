@@ -0,0 +1,82 @@
+"""
+app/deadline.py - 请求级截止时间
+
+/chat 入口设置截止时间，之后的规划、每个技能步骤、回复生成都从剩余时间推算超时：
+- 用 contextvars 保存，asyncio 任务和 asyncio.to_thread 的线程会自动继承
+- 下游超时取 min(自身默认超时, 剩余时间)，时间用完时直接抛 DeadlineExceeded，不再发请求
+"""
+from typing import Optional, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+import time
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """请求的截止时间已到"""
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[None]:
+    """
+    在作用域内设置截止时间（已有更早的截止时间时保留更早的）
+
+    Args:
+        seconds: 从现在起的时间预算（秒），None 或 <=0 表示不限制
+    """
+    if not seconds or seconds <= 0:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def detached() -> Iterator[None]:
+    """在作用域内不受截止时间限制（请求触发的后台任务使用）"""
+    token = _deadline.set(None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """剩余时间（秒），未设置截止时间返回None"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def expired() -> bool:
+    """截止时间是否已到"""
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def clamp_timeout(timeout: float) -> float:
+    """
+    按剩余时间收紧下游超时
+
+    Args:
+        timeout: 下游调用自身的默认超时（秒）
+
+    Returns:
+        min(timeout, 剩余时间)
+
+    Raises:
+        DeadlineExceeded: 截止时间已到
+    """
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded("请求截止时间已到")
+    return min(timeout, left)
@@ -0,0 +1,45 @@
+"""
+app/entities.py - 业务实体识别
+
+从用户输入中识别订单号、物流单号、产品ID等业务实体。
+实体类型直接使用技能参数名（order_id、product_id ...），方便和技能参数对应。
+"""
+from typing import Dict, List, NamedTuple
+import re
+
+# 实体类型 → 正则（按优先级排列：同一位置先匹配到的类型生效）
+# 用 (?<![A-Za-z0-9]) / (?![A-Za-z0-9]) 代替 \b，因为中文字符也算 \w
+ENTITY_PATTERNS: Dict[str, str] = {
+    "tracking_number": r"(?<![A-Za-z0-9])[A-Z]{2,4}\d{8,14}(?![A-Za-z0-9])",  # SF1234567890
+    "customer_id": r"(?<![A-Za-z0-9])CUST\d+(?![A-Za-z0-9])",                 # CUST001
+    "refund_id": r"(?<![A-Za-z0-9])RF\d+(?![A-Za-z0-9])",                     # RF001
+    "replenishment_id": r"(?<![A-Za-z0-9])REP\d+(?![A-Za-z0-9])",             # REP001
+    "product_id": r"(?<=产品)[A-Za-z0-9]{1,10}(?![A-Za-z0-9])",               # 产品A → A
+    "order_id": r"(?<![A-Za-z0-9])\d{3,}(?![A-Za-z0-9])",                     # 12345
+}
+
+_ENTITY_RE = re.compile("|".join(f"(?P<{kind}>{pattern})" for kind, pattern in ENTITY_PATTERNS.items()))
+
+
+class Entity(NamedTuple):
+    """识别出的实体"""
+    kind: str
+    value: str
+    start: int
+    end: int
+
+
+def extract_entities(text: str) -> List[Entity]:
+    """
+    识别文本中的业务实体
+
+    Args:
+        text: 用户输入
+
+    Returns:
+        按出现顺序排列的实体列表
+    """
+    return [
+        Entity(match.lastgroup, match.group(), match.start(), match.end())
+        for match in _ENTITY_RE.finditer(text)
+    ]
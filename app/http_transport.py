@@ -0,0 +1,186 @@
+"""
+app/http_transport.py - 技能共享的HTTP连接池
+
+各技能类原来各自创建 httpx.Client（大多指向同一个内部系统），连接和TLS握手无法复用。
+现在按上游地址（scheme://host:port）共享客户端：
+- 每个上游一个连接池，keep-alive、最大连接数可配置，可选 HTTP/2（需要安装 h2）
+- 异步客户端按事件循环分别创建（连接池不能跨事件循环复用）
+- 由 FastAPI 的 lifespan 在启动时预热、关闭时统一释放连接
+- mounts 可以把部分上游交给指定的 transport（如测试中的 httpx.MockTransport）
+"""
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
+import logging
+import os
+import threading
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+def origin_of(url: str) -> str:
+    """上游地址的 scheme://host:port（同一上游的技能共用连接池）"""
+    parsed = httpx.URL(url)
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    return f"{parsed.scheme}://{parsed.host}:{port}"
+
+
+class HTTPTransportManager:
+    """按上游地址管理共享的HTTP客户端"""
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        mounts: Optional[Dict[str, Any]] = None
+    ):
+        """
+        初始化连接池管理器
+
+        Args:
+            max_connections: 每个上游的最大连接数
+            max_keepalive_connections: 每个上游保持的空闲连接数
+            keepalive_expiry: 空闲连接的保持时间（秒）
+            http2: 是否启用HTTP/2（未安装 h2 时退回HTTP/1.1）
+            mounts: URL模式 -> transport（同 httpx 的 mounts，如 {"all://": httpx.MockTransport(handler)}），
+                同步、异步客户端共用，需要同时实现两种接口
+        """
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("HTTP/2 requires the h2 package (pip install httpx[http2]), falling back to HTTP/1.1")
+                http2 = False
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.http2 = http2
+        self.mounts = dict(mounts or {})
+        self._lock = threading.Lock()
+        self._clients: Dict[str, httpx.Client] = {}
+        self._async_clients: Dict[Tuple[str, asyncio.AbstractEventLoop], httpx.AsyncClient] = {}
+        self._requests: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+
+    def client(self, base_url: str) -> httpx.Client:
+        """上游对应的同步客户端（线程安全，同步技能在线程池中共用）"""
+        origin = origin_of(base_url)
+        with self._lock:
+            client = self._clients.get(origin)
+            if client is None or client.is_closed:
+                client = httpx.Client(
+                    limits=self.limits,
+                    http2=self.http2,
+                    mounts=self.mounts,
+                    event_hooks={"request": [self._count_request], "response": [self._count_response]}
+                )
+                self._clients[origin] = client
+            return client
+
+    def async_client(self, base_url: str) -> httpx.AsyncClient:
+        """上游对应的异步客户端（当前事件循环内共用）"""
+        origin = origin_of(base_url)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get((origin, loop))
+            if client is None or client.is_closed:
+                # 顺便清理已关闭事件循环上的客户端
+                for key in [key for key in self._async_clients if key[1].is_closed()]:
+                    del self._async_clients[key]
+                client = httpx.AsyncClient(
+                    limits=self.limits,
+                    http2=self.http2,
+                    mounts=self.mounts,
+                    event_hooks={"request": [self._acount_request], "response": [self._acount_response]}
+                )
+                self._async_clients[(origin, loop)] = client
+            return client
+
+    async def startup(self, base_urls: List[str]) -> None:
+        """预先创建各上游在当前事件循环上的客户端（FastAPI 启动时调用）"""
+        for base_url in dict.fromkeys(base_urls):
+            self.async_client(base_url)
+        logger.info(f"HTTP transport ready: {len(self._async_clients)} upstream(s), http2={self.http2}")
+
+    async def aclose(self) -> None:
+        """关闭所有客户端并释放连接（FastAPI 关闭时调用）"""
+        with self._lock:
+            async_clients = list(self._async_clients.items())
+            clients = list(self._clients.values())
+            self._async_clients.clear()
+            self._clients.clear()
+        loop = asyncio.get_running_loop()
+        for (_, client_loop), client in async_clients:
+            if client_loop is loop:
+                await client.aclose()
+        for client in clients:
+            client.close()
+
+    def _record(self, counter: Dict[str, int], url: httpx.URL) -> None:
+        origin = origin_of(str(url))
+        with self._lock:
+            counter[origin] = counter.get(origin, 0) + 1
+
+    def _count_request(self, request: httpx.Request) -> None:
+        self._record(self._requests, request.url)
+
+    def _count_response(self, response: httpx.Response) -> None:
+        if response.status_code >= 500:
+            self._record(self._errors, response.request.url)
+
+    async def _acount_request(self, request: httpx.Request) -> None:
+        self._count_request(request)
+
+    async def _acount_response(self, response: httpx.Response) -> None:
+        self._count_response(response)
+
+    @staticmethod
+    def _pool_state(client: Any) -> Dict[str, int]:
+        """连接池中的连接数（httpcore 内部状态，取不到时为0）"""
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        return {
+            "connections": len(connections),
+            "idle": sum(1 for connection in connections if connection.is_idle())
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """连接池统计（供 /metrics 使用）"""
+        with self._lock:
+            upstreams: Dict[str, Dict[str, Any]] = {}
+            for origin, client in self._clients.items():
+                entry = upstreams.setdefault(origin, {"connections": 0, "idle": 0, "clients": 0})
+                state = self._pool_state(client)
+                entry["connections"] += state["connections"]
+                entry["idle"] += state["idle"]
+                entry["clients"] += 1
+            for (origin, _), client in self._async_clients.items():
+                entry = upstreams.setdefault(origin, {"connections": 0, "idle": 0, "clients": 0})
+                state = self._pool_state(client)
+                entry["connections"] += state["connections"]
+                entry["idle"] += state["idle"]
+                entry["clients"] += 1
+            for origin, entry in upstreams.items():
+                entry["requests"] = self._requests.get(origin, 0)
+                entry["server_errors"] = self._errors.get(origin, 0)
+            return {
+                "max_connections": self.limits.max_connections,
+                "max_keepalive_connections": self.limits.max_keepalive_connections,
+                "keepalive_expiry": self.limits.keepalive_expiry,
+                "http2": self.http2,
+                "upstreams": upstreams
+            }
+
+
+# 所有技能共用的连接池（配置来自环境变量）
+http_transport = HTTPTransportManager(
+    max_connections=int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "100")),
+    max_keepalive_connections=int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "20")),
+    keepalive_expiry=float(os.getenv("HTTP_POOL_KEEPALIVE_EXPIRY", "30")),
+    http2=os.getenv("HTTP_POOL_HTTP2", "false").lower() == "true"
+)
@@ -0,0 +1,268 @@
+"""
+app/inventory_cache.py - 库存查询的 stale-while-revalidate 缓存
+
+库存查询占了大部分流量，InventorySkill.query_inventory 每次都请求库存系统。
+这里在技能层加一个读穿透缓存：
+- 每个字段有自己的时效：fresh 秒内算新鲜，超过 max_stale 秒不能再返回
+  （库存数量几秒就会变，仓库地址几乎不变）
+- 所有字段都新鲜时直接返回；有字段过了新鲜期但都没超过 max_stale 时，立即返回旧结果
+  （标记 stale 和过期字段），同时在后台刷新；有字段超过 max_stale 时同步请求上游
+- 补货申请、订单变更（创建、审批退款）涉及的商品条目立即失效，失效期间发出的请求结果不写回
+"""
+from typing import Dict, Any, Callable, Iterable, List, NamedTuple, Optional, Tuple
+from collections import OrderedDict
+import copy
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MISS = object()  # lookup 未命中（或超过字段的最大过期时间）时返回的哨兵值
+
+# 不参与时效判断的字段
+META_FIELDS = ("success", "product_id", "query_time")
+
+# 会影响商品库存的写操作技能
+REPLENISHMENT_MUTATIONS = ("create_replenishment",)
+ORDER_MUTATIONS = ("create_refund", "approve_refund")
+
+
+class FieldBound(NamedTuple):
+    """单个字段的时效（秒）"""
+    fresh: float
+    max_stale: float
+
+
+def parse_bound(value: str) -> FieldBound:
+    """解析 "新鲜期/最大过期时间"（只写一个数时两者相同）"""
+    fresh, _, max_stale = value.partition("/")
+    return FieldBound(float(fresh), float(max_stale or fresh))
+
+
+def parse_field_bounds(spec: str) -> Dict[str, FieldBound]:
+    """
+    解析字段时效配置，如 "stock=2/10,warehouse_address=3600/86400"
+
+    Args:
+        spec: 逗号分隔的 字段=新鲜期/最大过期时间
+
+    Returns:
+        字段 -> FieldBound
+    """
+    bounds = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        field, _, value = item.partition("=")
+        bounds[field.strip()] = parse_bound(value)
+    return bounds
+
+
+class InventoryCache:
+    """按商品缓存库存查询结果，支持按字段时效的 stale-while-revalidate（线程安全）"""
+
+    def __init__(
+        self,
+        field_bounds: Optional[Dict[str, FieldBound]] = None,
+        default_bound: FieldBound = FieldBound(30.0, 300.0),
+        max_size: int = 1024,
+        enabled: bool = True,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        初始化库存缓存
+
+        Args:
+            field_bounds: 字段 -> 时效（未列出的字段使用 default_bound）
+            default_bound: 默认字段时效
+            max_size: 最多缓存的商品数（超出时淘汰最久未使用的）
+            enabled: 是否启用
+            clock: 时钟函数（测试中可替换）
+        """
+        self.field_bounds = dict(field_bounds or {})
+        self.default_bound = default_bound
+        self.max_size = max_size
+        self.enabled = enabled
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._refreshing: set = set()
+        self._names: Dict[str, str] = {}  # 商品名称 -> 商品ID（订单里的商品只有名称）
+        self._orders: "OrderedDict[str, List[str]]" = OrderedDict()  # 订单ID -> 商品名称
+        self._refunds: "OrderedDict[str, str]" = OrderedDict()  # 退款ID -> 订单ID（审批退款只带退款ID）
+        # 失效代数：每次失效加一；lookup 返回当时的代数，写回时只检查该商品（和清空）是否在那之后失效过，
+        # 避免失效前发出的请求把旧结果写回，又不影响其他商品的写回
+        self.generation = 0
+        self._invalidated_at: Dict[str, int] = {}  # 商品ID -> 最近一次失效时的代数
+        self._cleared_at = 0  # 最近一次清空时的代数
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.invalidations = 0
+
+    def bound(self, field: str) -> FieldBound:
+        return self.field_bounds.get(field, self.default_bound)
+
+    def lookup(self, product_id: str) -> Tuple[Any, int, bool]:
+        """
+        查询缓存
+
+        Args:
+            product_id: 商品ID
+
+        Returns:
+            (结果副本 或 MISS, 当前失效代数, 是否由调用方发起后台刷新)
+            返回旧结果时结果中带 stale=True、stale_fields 和 data_age_seconds
+        """
+        with self._lock:
+            entry = self._entries.get(product_id)
+            if entry is None:
+                self.misses += 1
+                return MISS, self.generation, False
+
+            stored_at, result = entry
+            age = self._clock() - stored_at
+            fields = [f for f in result if f not in META_FIELDS]
+            if any(age > self.bound(f).max_stale for f in fields):
+                self.misses += 1
+                return MISS, self.generation, False
+
+            self._entries.move_to_end(product_id)
+            stale_fields = sorted(f for f in fields if age > self.bound(f).fresh)
+            if not stale_fields:
+                self.fresh_hits += 1
+                return copy.deepcopy(result), self.generation, False
+
+            self.stale_hits += 1
+            refresh = product_id not in self._refreshing
+            if refresh:
+                self._refreshing.add(product_id)
+            served = copy.deepcopy(result)
+            served.update({"stale": True, "stale_fields": stale_fields, "data_age_seconds": round(age, 3)})
+            return served, self.generation, refresh
+
+    def put(self, product_id: str, result: Any, generation: int) -> bool:
+        """
+        写入缓存（失败的结果不缓存；查询期间有过失效时也不缓存）
+
+        Args:
+            product_id: 商品ID
+            result: query_inventory 的结果
+            generation: lookup 时返回的失效代数（之后该商品失效过或缓存清空过则不写入）
+
+        Returns:
+            是否写入成功
+        """
+        if not isinstance(result, dict) or not result.get("success"):
+            return False
+        with self._lock:
+            if max(self._cleared_at, self._invalidated_at.get(product_id, 0)) > generation:
+                return False
+            self._entries[product_id] = (self._clock(), copy.deepcopy(result))
+            self._entries.move_to_end(product_id)
+            if result.get("product_name"):
+                self._names[result["product_name"]] = product_id
+            while len(self._entries) > self.max_size:
+                _, (_, old) = self._entries.popitem(last=False)
+                self._names.pop(old.get("product_name"), None)
+        return True
+
+    def end_refresh(self, product_id: str, result: Any, generation: int) -> None:
+        """后台刷新结束：写入新结果（刷新失败时保留旧条目，下次读取再刷新）"""
+        self.put(product_id, result, generation)
+        with self._lock:
+            self._refreshing.discard(product_id)
+            self.refreshes += 1
+            if not (isinstance(result, dict) and result.get("success")):
+                self.refresh_failures += 1
+
+    def invalidate(self, product_ids: Iterable[str]) -> None:
+        """失效指定商品"""
+        product_ids = list(product_ids)
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+            for product_id in product_ids:
+                self._entries.pop(product_id, None)
+                self._invalidated_at[product_id] = self.generation
+        logger.debug(f"Inventory cache invalidated: {product_ids}")
+
+    def clear(self) -> None:
+        """清空所有条目"""
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+            self._entries.clear()
+            self._invalidated_at.clear()
+            self._cleared_at = self.generation
+
+    def on_skill_result(self, name: str, params: Dict[str, Any], result: Any) -> None:
+        """
+        技能执行后调用（skills_real 的 get_order 和写操作技能）：记住订单包含的商品，写操作后失效涉及的商品
+
+        补货申请按 product_id 失效；订单变更按订单里的商品名称找到商品ID失效
+        （审批退款按创建退款时记下的退款ID找到订单），不知道订单包含哪些商品时清空整个缓存。
+        """
+        values = {**(result if isinstance(result, dict) else {}), **params}
+        if name == "get_order" and isinstance(result, dict) and result.get("products"):
+            self._remember_order(str(values.get("order_id")), result["products"])
+        elif name in REPLENISHMENT_MUTATIONS and values.get("product_id"):
+            self.invalidate([values["product_id"]])
+        elif name in ORDER_MUTATIONS:
+            refund = values.get("refund")
+            if isinstance(refund, dict) and refund.get("refund_id"):
+                self._remember_refund(str(refund["refund_id"]), str(values.get("order_id")))
+            order_id = values.get("order_id")
+            if order_id is None and values.get("refund_id") is not None:
+                with self._lock:
+                    order_id = self._refunds.get(str(values["refund_id"]))
+            product_ids = self._order_products(str(order_id))
+            if product_ids is None:
+                self.clear()
+            else:
+                self.invalidate(product_ids)
+
+    def _remember_order(self, order_id: str, products: List[Any]) -> None:
+        names = [p.get("product_id") or p.get("name") for p in products if isinstance(p, dict)]
+        with self._lock:
+            self._orders[order_id] = [name for name in names if name]
+            self._orders.move_to_end(order_id)
+            while len(self._orders) > self.max_size:
+                self._orders.popitem(last=False)
+
+    def _remember_refund(self, refund_id: str, order_id: str) -> None:
+        with self._lock:
+            self._refunds[refund_id] = order_id
+            self._refunds.move_to_end(refund_id)
+            while len(self._refunds) > self.max_size:
+                self._refunds.popitem(last=False)
+
+    def _order_products(self, order_id: str) -> Optional[List[str]]:
+        """订单包含的商品ID（只需要找出已缓存的商品），不知道订单内容时返回None"""
+        with self._lock:
+            names = self._orders.get(order_id)
+            if names is None:
+                return None
+            return [self._names.get(name, name) for name in names]
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计（供 /metrics 使用）"""
+        with self._lock:
+            lookups = self.fresh_hits + self.stale_hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "fresh_hits": self.fresh_hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.fresh_hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+                "refreshes": self.refreshes,
+                "refresh_failures": self.refresh_failures,
+                "invalidations": self.invalidations,
+                "field_bounds": {field: list(bound) for field, bound in self.field_bounds.items()},
+                "default_bound": list(self.default_bound)
+            }
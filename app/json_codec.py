@@ -0,0 +1,112 @@
+"""
+app/json_codec.py - 可替换的JSON编解码
+
+API响应、技能解析上游响应、决策日志和会话摘要的持久化都要做JSON编解码，
+标准库 json 在大结果（物流 history、客户订单列表、报表）上占了不少CPU时间。
+这里统一编解码入口：
+- 安装了 orjson 时使用 orjson（快数倍，直接输出UTF-8字节），否则回退到标准库
+- 两种实现输出一致：中文不转义、紧凑分隔符、非字符串的键转为字符串、
+  无法序列化的对象（datetime 等）按 str() 输出
+- loads 的解析错误都是 json.JSONDecodeError（orjson 的异常是它的子类），调用方无需区分
+- FastJSONResponse 作为 FastAPI 的默认响应类；CodecResponse 让技能解析上游响应时也走这里
+"""
+from typing import Any, Optional, Union
+import json
+import os
+
+import httpx
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson 是可选依赖
+    orjson = None
+
+# 当前后端（"orjson" / "json"），首次编解码时按 JSON_CODEC 选定：
+# main.py 在 load_dotenv 之前就间接导入了本模块，导入时还读不到 .env 里的配置
+BACKEND: Optional[str] = None
+
+
+def backend() -> str:
+    """当前后端：JSON_CODEC=json 强制使用标准库（排查问题或对比性能时使用），否则有 orjson 时用 orjson"""
+    global BACKEND
+    if BACKEND is None:
+        BACKEND = "orjson" if orjson is not None and os.getenv("JSON_CODEC", "orjson").lower() != "json" else "json"
+    return BACKEND
+
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson is not None else 0
+
+
+def dumps_bytes(obj: Any, indent: bool = False, sort_keys: bool = False) -> bytes:
+    """
+    序列化为UTF-8字节
+
+    Args:
+        obj: 要序列化的对象
+        indent: 是否两空格缩进
+        sort_keys: 是否按键排序
+
+    Returns:
+        JSON字节串
+    """
+    if backend() == "orjson":
+        options = _ORJSON_OPTIONS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        if sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=str, option=options)
+    return _stdlib_dumps(obj, indent, sort_keys).encode("utf-8")
+
+
+def dumps(obj: Any, indent: bool = False, sort_keys: bool = False) -> str:
+    """序列化为字符串（参数同 dumps_bytes）"""
+    if backend() == "orjson":
+        return dumps_bytes(obj, indent, sort_keys).decode("utf-8")
+    return _stdlib_dumps(obj, indent, sort_keys)
+
+
+def loads(data: Union[str, bytes, bytearray]) -> Any:
+    """
+    解析JSON文本或UTF-8字节
+
+    Raises:
+        json.JSONDecodeError: 不是合法的JSON
+    """
+    if backend() == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _stdlib_dumps(obj: Any, indent: bool, sort_keys: bool) -> str:
+    return json.dumps(
+        obj,
+        ensure_ascii=False,
+        indent=2 if indent else None,
+        separators=(",", ": ") if indent else (",", ":"),
+        sort_keys=sort_keys,
+        default=str
+    )
+
+
+class FastJSONResponse(JSONResponse):
+    """使用 json_codec 序列化的 JSONResponse（FastAPI 的默认响应类）"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
+
+
+class CodecResponse(httpx.Response):
+    """json() 使用 json_codec 解码的 httpx 响应（交给技能流程）"""
+
+    @classmethod
+    def wrap(cls, response: httpx.Response) -> httpx.Response:
+        """包装已读取响应体的上游响应（已经是解析好的响应时原样返回）"""
+        if isinstance(response, cls) or type(response) is not httpx.Response:
+            return response
+        # 响应体已经解压，去掉 Content-Encoding / Content-Length 避免重复解码
+        headers = [(k, v) for k, v in response.headers.multi_items() if k.lower() not in ("content-encoding", "content-length")]
+        return cls(response.status_code, headers=headers, content=response.content, request=response.request)
+
+    def json(self, **kwargs: Any) -> Any:
+        return loads(self.content)
@@ -0,0 +1,133 @@
+"""
+app/llm_usage.py - LLM用量与成本统计
+
+从 response.usage 读取输入/输出/缓存token，按模型价格表计算成本，
+并按阶段（plan 规划 / response 生成回复）汇总单次请求的用量。
+"""
+from typing import Dict, Any, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 模型价格（美元 / 百万token）
+# cache_write: 写入提示缓存的输入token，cache_read: 命中提示缓存的输入token
+MODEL_PRICING: Dict[str, Dict[str, float]] = {
+    "claude-opus-4-20250514": {"input": 15.0, "output": 75.0, "cache_write": 18.75, "cache_read": 1.50},
+    "claude-sonnet-4-20250514": {"input": 3.0, "output": 15.0, "cache_write": 3.75, "cache_read": 0.30},
+    "claude-3-7-sonnet-20250219": {"input": 3.0, "output": 15.0, "cache_write": 3.75, "cache_read": 0.30},
+    "claude-3-5-haiku-20241022": {"input": 0.80, "output": 4.0, "cache_write": 1.0, "cache_read": 0.08},
+}
+
+# 价格表中没有的模型按Sonnet计价
+DEFAULT_PRICING = MODEL_PRICING["claude-sonnet-4-20250514"]
+
+# response.usage 中的字段 → 统计中使用的名字
+USAGE_FIELDS: Dict[str, str] = {
+    "input_tokens": "input_tokens",
+    "output_tokens": "output_tokens",
+    "cache_creation_input_tokens": "cache_creation_tokens",
+    "cache_read_input_tokens": "cache_read_tokens",
+}
+
+
+def usage_to_dict(usage: Any) -> Dict[str, int]:
+    """
+    把 response.usage 转换为字典（缺失或为None的字段记为0）
+
+    Args:
+        usage: Anthropic响应的 usage 对象
+
+    Returns:
+        {"input_tokens", "output_tokens", "cache_creation_tokens", "cache_read_tokens"}
+    """
+    return {name: getattr(usage, field, None) or 0 for field, name in USAGE_FIELDS.items()}
+
+
+def compute_cost(model: str, usage: Dict[str, int]) -> float:
+    """
+    按模型价格计算一次调用的成本（美元）
+
+    Args:
+        model: 模型名称
+        usage: usage_to_dict 的返回值
+
+    Returns:
+        成本（美元）
+    """
+    pricing = MODEL_PRICING.get(model)
+    if pricing is None:
+        logger.warning(f"No pricing for model {model}, using default")
+        pricing = DEFAULT_PRICING
+    return (
+        usage["input_tokens"] * pricing["input"]
+        + usage["output_tokens"] * pricing["output"]
+        + usage["cache_creation_tokens"] * pricing["cache_write"]
+        + usage["cache_read_tokens"] * pricing["cache_read"]
+    ) / 1_000_000
+
+
+class UsageTracker:
+    """单次请求的LLM用量（按阶段累计）"""
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.compaction: Dict[str, Dict[str, int]] = {}
+
+    def record(self, stage: str, model: str, usage: Any) -> Dict[str, Any]:
+        """
+        记录一次LLM调用
+
+        Args:
+            stage: 阶段名（plan / response）
+            model: 模型名称
+            usage: Anthropic响应的 usage 对象
+
+        Returns:
+            该阶段累计后的用量
+        """
+        tokens = usage_to_dict(usage)
+        entry = self.stages.setdefault(stage, {
+            "model": model, "calls": 0, "cost": 0.0, **{name: 0 for name in USAGE_FIELDS.values()}
+        })
+        entry["model"] = model
+        entry["calls"] += 1
+        entry["cost"] += compute_cost(model, tokens)
+        for name, value in tokens.items():
+            entry[name] += value
+        return entry
+
+    def record_compaction(self, stage: str, original_tokens: int, compacted_tokens: int) -> None:
+        """
+        记录提示词压缩节省的token数（估算值）
+
+        Args:
+            stage: 阶段名（response）
+            original_tokens: 压缩前的token数
+            compacted_tokens: 压缩后的token数
+        """
+        self.compaction[stage] = {
+            "original_tokens": original_tokens,
+            "compacted_tokens": compacted_tokens,
+            "saved_tokens": max(0, original_tokens - compacted_tokens)
+        }
+
+    def stage(self, stage: str) -> Optional[Dict[str, Any]]:
+        """获取某个阶段的用量，未调用过LLM返回None"""
+        return self.stages.get(stage)
+
+    @property
+    def total_cost(self) -> float:
+        return sum(entry["cost"] for entry in self.stages.values())
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        汇总用量
+
+        Returns:
+            {"plan": {...}, "response": {...}, "total": {"calls", "cost", 各类token}}
+        """
+        total = {"calls": 0, "cost": 0.0, **{name: 0 for name in USAGE_FIELDS.values()}}
+        for entry in self.stages.values():
+            for key in total:
+                total[key] += entry[key]
+        return {**{stage: dict(entry) for stage, entry in self.stages.items()}, "total": total}
@@ -1,17 +1,28 @@
 # app/main.py - 核心API（Day 2增强版）
 from fastapi import FastAPI, HTTPException
-from anthropic import Anthropic
+from fastapi.responses import StreamingResponse
+from typing import Dict, Any, Optional
+from contextlib import asynccontextmanager
+import asyncio
 import os
 from datetime import datetime
-import json
 import time
 import logging
+import traceback
 from dotenv import load_dotenv
 
 # 导入自定义模块
+from app.conversation_memory import ConversationMemory
 from app.database import Database
-from app.models import ChatRequest, ChatResponse
+from app.deadline import deadline_scope
+from app import json_codec
+from app.models import ChatRequest, ChatResponse, ChatBatchRequest
+from app.model_router import ModelRouter, SMALL_MODEL, LARGE_MODEL
 from app.orchestrator import AIOrchestrator  # Day 6新增
+from app.plan_cache import PlanCache
+from app.rule_router import RuleRouter
+from app.result_compactor import ResultCompactor
+from app.skill_cache import SkillCache
 
 # 配置日志
 logging.basicConfig(
@@ -23,6 +34,9 @@ logger = logging.getLogger(__name__)
 # 加载环境变量
 load_dotenv()
 
+# 技能共享的HTTP连接池（读取 HTTP_POOL_* 环境变量，需在 load_dotenv 之后导入）
+from app.http_transport import http_transport
+
 # 检查API密钥
 CLAUDE_API_KEY = os.getenv("CLAUDE_API_KEY")
 if not CLAUDE_API_KEY:
@@ -33,15 +47,27 @@ if not CLAUDE_API_KEY:
     print("2. .env 文件中包含：CLAUDE_API_KEY=sk-ant-xxxxx")
     raise ValueError("CLAUDE_API_KEY 未配置")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时预热技能的HTTP连接池，关闭时释放所有连接"""
+    if USE_REAL_SKILLS:
+        from app.skills_real import ORDER_API_BASE, INVENTORY_API_BASE, LOGISTICS_API_BASE
+        await http_transport.startup([ORDER_API_BASE, INVENTORY_API_BASE, LOGISTICS_API_BASE])
+    yield
+    await http_transport.aclose()
+
+
 app = FastAPI(
     title="AI Business Assistant",
     description="企业AI业务助手 API",
-    version="0.2.0"
+    version="0.2.0",
+    lifespan=lifespan,
+    default_response_class=json_codec.FastJSONResponse
 )
-client = Anthropic(api_key=CLAUDE_API_KEY)
 
-# 初始化数据库
-db = Database()
+# 初始化数据库（DATABASE_URL 形如 sqlite:///./database.db）
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./database.db")
+db = Database(DATABASE_URL.replace("sqlite:///", "", 1))
 logger.info("数据库初始化完成")
 
 # 选择使用真实技能或Mock技能（Day 4）
@@ -49,7 +75,10 @@ USE_REAL_SKILLS = os.getenv("USE_REAL_SKILLS", "true").lower() == "true"
 
 if USE_REAL_SKILLS:
     logger.info("使用真实API技能...")
-    from app.skills_real import REAL_SKILLS
+    from app.skills_real import (
+        REAL_SKILLS, ASYNC_REAL_SKILLS, skill_resilience, skill_single_flight,
+        batch_loader_stats, inventory_cache, skill_conditional_get
+    )
     from app.skills import MockSkills  # 保留Mock技能作为后备
     from app.notification_skill import notification_skill  # Day 5新增
 
@@ -78,235 +107,466 @@ if USE_REAL_SKILLS:
         "generate_apology": MockSkills.generate_apology,
         "offer_compensation": MockSkills.offer_compensation
     }
+    # 异步版本技能（Mock技能没有IO，不需要异步版本）
+    ASYNC_SKILLS = {
+        **ASYNC_REAL_SKILLS,
+        "send_email": notification_skill.asend_email,
+        "send_notification": notification_skill.asend_notification,
+    }
     logger.info(f"加载了 {len(SKILLS)} 个技能（13个真实API + 3个Mock）")
 else:
     logger.info("使用Mock技能...")
     from app.skills import SKILLS as SKILL_REGISTRY
     SKILLS = SKILL_REGISTRY
+    skill_resilience = None  # Mock技能没有HTTP调用
+    skill_single_flight = None
+    batch_loader_stats = None
+    inventory_cache = None
+    skill_conditional_get = None
+    ASYNC_SKILLS = {}
     logger.info(f"加载了 {len(SKILLS)} 个Mock技能")
 
 # Day 6: 初始化AI编排器
-orchestrator = AIOrchestrator(CLAUDE_API_KEY)
+# 快速路径：单步骤只读查询用计划模板本地渲染回复，省掉第二次LLM调用
+FAST_PATH_MODE = os.getenv("FAST_PATH_MODE", "true").lower() == "true"
+# 计划缓存：同一问法只是ID不同时复用已生成的计划，省掉规划LLM调用
+PLAN_CACHE_ENABLED = os.getenv("PLAN_CACHE_ENABLED", "true").lower() == "true"
+plan_cache = PlanCache(
+    max_size=int(os.getenv("PLAN_CACHE_SIZE", "512")),
+    ttl_seconds=float(os.getenv("PLAN_CACHE_TTL", "600"))
+) if PLAN_CACHE_ENABLED else None
+# 规则预路由：意图明确的单实体查询（订单号、产品库存、物流单号...）直接生成计划
+RULE_ROUTER_ENABLED = os.getenv("RULE_ROUTER_ENABLED", "true").lower() == "true"
+rule_router = RuleRouter() if RULE_ROUTER_ENABLED else None
+# LLM地址：离线压测时指向 fake_llm_server.py（例如 http://localhost:9100）
+ANTHROPIC_BASE_URL = os.getenv("ANTHROPIC_BASE_URL") or None
+# 计划中相互独立的步骤并行执行的数量上限
+PLAN_MAX_PARALLEL = int(os.getenv("PLAN_MAX_PARALLEL", "4"))
+# 技能结果缓存：只读技能短时间内重复查询同一实体时复用结果，写操作后按实体失效
+SKILL_CACHE_ENABLED = os.getenv("SKILL_CACHE_ENABLED", "true").lower() == "true"
+skill_cache = SkillCache(max_size=int(os.getenv("SKILL_CACHE_SIZE", "2048"))) if SKILL_CACHE_ENABLED else None
+# 库存查询由技能层的 stale-while-revalidate 缓存负责（按字段时效，返回旧数据时带 stale 标记），
+# 启用时不再在编排器层缓存 query_inventory，避免 stale 标记被缓存下来
+INVENTORY_CACHE_ACTIVE = inventory_cache is not None and inventory_cache.enabled
+INVENTORY_SKILL_CACHE_TTL = None if INVENTORY_CACHE_ACTIVE else 15
+# 投机预取：LLM规划期间按输入中的订单号/物流单号/产品ID等先调用对应的查询技能
+SPECULATIVE_PREFETCH = os.getenv("SPECULATIVE_PREFETCH", "true").lower() == "true"
+# 回复提示词中执行结果的token预算（按技能投影字段、截断长列表）
+RESPONSE_TOKEN_BUDGET = int(os.getenv("RESPONSE_TOKEN_BUDGET", "1500"))
+# 单条对话的处理时限（秒）：规划、技能调用、回复生成共用，用完时返回部分回复（前端30秒超时，0表示不限制）
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "28"))
+# /chat、/chat/stream 默认是否返回完整调试信息（请求可用 include_debug=false 只要摘要，减小响应体）
+CHAT_DEBUG_DEFAULT = os.getenv("CHAT_DEBUG_DEFAULT", "true").lower() == "true"
+LEAN_DEBUG_FIELDS = ("intent", "skill", "fast_path", "plan_source", "deadline_exceeded", "timings_ms", "execution_time_ms", "llm_cost")
+# 模型分级：先用小模型规划，不合格或把握不足时升级到大模型；回复按意图类别选模型
+MODEL_TIERING_ENABLED = os.getenv("MODEL_TIERING_ENABLED", "true").lower() == "true"
+model_router = ModelRouter(
+    small_model=os.getenv("SMALL_MODEL", SMALL_MODEL),
+    large_model=os.getenv("LARGE_MODEL", LARGE_MODEL),
+    confidence_threshold=float(os.getenv("PLAN_CONFIDENCE_THRESHOLD", "0.7"))
+) if MODEL_TIERING_ENABLED else None
+orchestrator = AIOrchestrator(
+    CLAUDE_API_KEY,
+    fast_path=FAST_PATH_MODE,
+    plan_cache=plan_cache,
+    rule_router=rule_router,
+    base_url=ANTHROPIC_BASE_URL,
+    max_parallel_steps=PLAN_MAX_PARALLEL,
+    skill_cache=skill_cache,
+    speculative_prefetch=SPECULATIVE_PREFETCH,
+    result_compactor=ResultCompactor(token_budget=RESPONSE_TOKEN_BUDGET),
+    model_router=model_router
+)
+# 会话记忆：传 session_id 的对话保存到 chat_history，规划时注入最近几轮原文和更早对话的摘要
+CONVERSATION_MEMORY_ENABLED = os.getenv("CONVERSATION_MEMORY_ENABLED", "true").lower() == "true"
+conversation_memory = ConversationMemory(
+    db,
+    window_turns=int(os.getenv("MEMORY_WINDOW_TURNS", "3")),
+    max_entities=int(os.getenv("MEMORY_MAX_ENTITIES", "8"))
+) if CONVERSATION_MEMORY_ENABLED else None
 
 # 注册所有技能到编排器
 
 # 原有技能
-orchestrator.register_skill("get_order", SKILLS["get_order"], "查询订单信息", {"order_id": "订单号"})
-orchestrator.register_skill("query_inventory", SKILLS["query_inventory"], "查询库存信息", {"product_id": "产品ID（单个字母或数字）"})
-orchestrator.register_skill("query_logistics", SKILLS["query_logistics"], "查询物流信息", {"tracking_number": "物流单号"})
-orchestrator.register_skill("send_email", SKILLS["send_email"], "发送邮件", {"to": "收件人", "subject": "主题", "content": "内容"})
-orchestrator.register_skill("send_notification", SKILLS["send_notification"], "发送通知邮件（使用模板）", {"to": "收件人", "template": "模板名", "context": "模板数据"})
-orchestrator.register_skill("update_order_status", SKILLS["update_order_status"], "更新订单状态", {"order_id": "订单号", "status": "新状态"})
-orchestrator.register_skill("generate_apology", SKILLS["generate_apology"], "生成道歉信", {"order_id": "订单号", "reason": "原因"})
-orchestrator.register_skill("offer_compensation", SKILLS["offer_compensation"], "提供补偿", {"user_id": "用户ID", "policy": "补偿政策"})
+orchestrator.register_skill(
+    "get_order", SKILLS["get_order"], "查询订单信息", {"order_id": "订单号"},
+    async_func=ASYNC_SKILLS.get("get_order"),
+    read_only=True,
+    keywords=["订单"],
+    response_template="订单{order_id}当前状态：{status}",
+    cache_ttl=30,
+    prefetch=True,
+    result_fields=[
+        "order_id", "status", "tracking", "customer_name", "customer_email", "create_time", "ship_time",
+        "estimated_delivery", "delay_reason", "amount", "products", "address"
+    ]
+)
+orchestrator.register_skill(
+    "query_inventory", SKILLS["query_inventory"], "查询库存信息", {"product_id": "产品ID（单个字母或数字）"},
+    async_func=ASYNC_SKILLS.get("query_inventory"),
+    read_only=True,
+    keywords=["库存", "存货", "还有多少"],
+    response_template="{product_name}当前库存{stock}件，状态：{status}，所在仓库：{warehouse}",
+    cache_ttl=INVENTORY_SKILL_CACHE_TTL,
+    prefetch=True
+)
+orchestrator.register_skill(
+    "query_logistics", SKILLS["query_logistics"], "查询物流信息", {"tracking_number": "物流单号"},
+    async_func=ASYNC_SKILLS.get("query_logistics"),
+    read_only=True,
+    keywords=["物流", "快递", "运单", "到哪"],
+    response_template="物流单号{tracking}（{carrier}）当前状态：{status}，预计送达：{estimated_delivery}",
+    cache_ttl=60,
+    prefetch=True,
+    result_fields=[
+        "tracking", "carrier", "status", "current_location", "estimated_delivery", "delay_reason",
+        "delivery_time", "receiver", "history"
+    ]
+)
+orchestrator.register_skill(
+    "send_email", SKILLS["send_email"], "发送邮件", {"to": "收件人", "subject": "主题", "content": "内容"},
+    async_func=ASYNC_SKILLS.get("send_email")
+)
+orchestrator.register_skill(
+    "send_notification", SKILLS["send_notification"], "发送通知邮件（使用模板）",
+    {"to": "收件人", "template": "模板名", "context": "模板数据"},
+    async_func=ASYNC_SKILLS.get("send_notification")
+)
+orchestrator.register_skill(
+    "update_order_status", SKILLS["update_order_status"], "更新订单状态", {"order_id": "订单号", "status": "新状态"},
+    async_func=ASYNC_SKILLS.get("update_order_status"),
+    invalidates=["get_order", "get_customer_orders"]
+)
+orchestrator.register_skill(
+    "generate_apology", SKILLS["generate_apology"], "生成道歉信", {"order_id": "订单号", "reason": "原因"},
+    async_func=ASYNC_SKILLS.get("generate_apology")
+)
+orchestrator.register_skill(
+    "offer_compensation", SKILLS["offer_compensation"], "提供补偿", {"user_id": "用户ID", "policy": "补偿政策"},
+    async_func=ASYNC_SKILLS.get("offer_compensation"),
+    invalidates=["get_customer"]
+)
 
 # Week 2 新增技能
-orchestrator.register_skill("query_promotions", SKILLS["query_promotions"], "查询促销活动", {"product_id": "产品ID（可选）", "status": "促销状态（可选）"})
-orchestrator.register_skill("get_customer", SKILLS["get_customer"], "查询客户信息", {"customer_id": "客户ID"})
-orchestrator.register_skill("get_customer_orders", SKILLS["get_customer_orders"], "查询客户订单历史", {"customer_id": "客户ID"})
-orchestrator.register_skill("get_refund", SKILLS["get_refund"], "查询退款申请详情", {"refund_id": "退款ID"})
-orchestrator.register_skill("create_refund", SKILLS["create_refund"], "创建退款申请", {"order_id": "订单号", "reason": "退款原因", "amount": "退款金额（可选）"})
-orchestrator.register_skill("approve_refund", SKILLS["approve_refund"], "审批退款申请", {"refund_id": "退款ID"})
-orchestrator.register_skill("get_replenishment_suggestion", SKILLS["get_replenishment_suggestion"], "获取智能补货建议", {"product_id": "产品ID"})
-orchestrator.register_skill("create_replenishment", SKILLS["create_replenishment"], "创建补货申请", {"product_id": "产品ID", "quantity": "补货数量", "priority": "优先级（可选）"})
-orchestrator.register_skill("get_replenishment", SKILLS["get_replenishment"], "查询补货申请详情", {"replenishment_id": "补货申请ID"})
-orchestrator.register_skill("generate_report", SKILLS["generate_report"], "生成业务报表", {"report_type": "报表类型（sales/inventory/customer）", "start_date": "开始日期（可选）", "end_date": "结束日期（可选）"})
+orchestrator.register_skill(
+    "query_promotions", SKILLS["query_promotions"], "查询促销活动",
+    {"product_id": "产品ID（可选）", "status": "促销状态（可选）"},
+    async_func=ASYNC_SKILLS.get("query_promotions"),
+    read_only=True,
+    cache_ttl=300
+)
+orchestrator.register_skill(
+    "get_customer", SKILLS["get_customer"], "查询客户信息", {"customer_id": "客户ID"},
+    async_func=ASYNC_SKILLS.get("get_customer"),
+    read_only=True,
+    keywords=["客户信息", "客户资料", "会员等级", "积分"],
+    response_template="客户{name}（{customer_id}），会员等级：{level}，积分：{points}",
+    cache_ttl=300,
+    prefetch=True
+)
+orchestrator.register_skill(
+    "get_customer_orders", SKILLS["get_customer_orders"], "查询客户订单历史", {"customer_id": "客户ID"},
+    async_func=ASYNC_SKILLS.get("get_customer_orders"),
+    read_only=True,
+    keywords=["订单", "购买记录", "买过"],
+    cache_ttl=60,
+    result_fields=[
+        "customer_id", "customer_name", "total_orders",
+        {"orders": ["order_id", "status", "amount", "create_time"]}
+    ]
+)
+orchestrator.register_skill(
+    "get_refund", SKILLS["get_refund"], "查询退款申请详情", {"refund_id": "退款ID"},
+    async_func=ASYNC_SKILLS.get("get_refund"),
+    read_only=True,
+    keywords=["退款"],
+    response_template="退款申请{refund_id}（订单{order_id}）状态：{status}，金额：{amount}元",
+    cache_ttl=30,
+    prefetch=True
+)
+orchestrator.register_skill(
+    "create_refund", SKILLS["create_refund"], "创建退款申请",
+    {"order_id": "订单号", "reason": "退款原因", "amount": "退款金额（可选）"},
+    async_func=ASYNC_SKILLS.get("create_refund"),
+    invalidates=["get_order", "get_refund", "get_customer_orders"]
+)
+orchestrator.register_skill(
+    "approve_refund", SKILLS["approve_refund"], "审批退款申请", {"refund_id": "退款ID"},
+    async_func=ASYNC_SKILLS.get("approve_refund"),
+    invalidates=["get_refund", "get_order"]
+)
+orchestrator.register_skill(
+    "get_replenishment_suggestion", SKILLS["get_replenishment_suggestion"], "获取智能补货建议",
+    {"product_id": "产品ID"},
+    async_func=ASYNC_SKILLS.get("get_replenishment_suggestion"),
+    read_only=True,
+    keywords=["补货建议", "需要补货", "该补货"],
+    cache_ttl=60
+)
+orchestrator.register_skill(
+    "create_replenishment", SKILLS["create_replenishment"], "创建补货申请",
+    {"product_id": "产品ID", "quantity": "补货数量", "priority": "优先级（可选）"},
+    async_func=ASYNC_SKILLS.get("create_replenishment"),
+    invalidates=["get_replenishment_suggestion", "get_replenishment", "query_inventory"]
+)
+orchestrator.register_skill(
+    "get_replenishment", SKILLS["get_replenishment"], "查询补货申请详情", {"replenishment_id": "补货申请ID"},
+    async_func=ASYNC_SKILLS.get("get_replenishment"),
+    read_only=True,
+    keywords=["补货申请", "补货单"],
+    response_template="补货申请{replenishment_id}状态：{status}",
+    cache_ttl=30,
+    prefetch=True
+)
+orchestrator.register_skill(
+    "generate_report", SKILLS["generate_report"], "生成业务报表",
+    {"report_type": "报表类型（sales/inventory/customer）", "start_date": "开始日期（可选）", "end_date": "结束日期（可选）"},
+    async_func=ASYNC_SKILLS.get("generate_report"),
+    read_only=True
+)
 
 logger.info(f"AI编排器初始化完成，已注册 {len(orchestrator.skills)} 个技能")
 
+async def _save_chat_result(user_input: str, user_id: str, result: Dict[str, Any], start_time: float) -> Dict[str, Any]:
+    """
+    记录一次编排处理结果，返回给前端的调试信息
+
+    Args:
+        user_input: 用户输入
+        user_id: 用户ID
+        result: AIOrchestrator.process 的返回值
+        start_time: 请求开始时间（time.time()）
+
+    Returns:
+        调试信息字典
+    """
+    plan = result["plan"]
+    step_results = result["execution_result"].get("results", [])
+    skills_used = [r.get("skill") for r in step_results if r.get("skill")]
+    action = ",".join(skills_used) or "none"
+
+    # 计算执行时间和成本
+    execution_time_ms = (time.time() - start_time) * 1000
+
+    # LLM成本：按 response.usage 的token数和模型价格计算（规划/回复分阶段）
+    llm_usage = result["llm_usage"]
+    llm_cost = llm_usage["total"]["cost"]
+
+    await db.asave_decision(
+        user_input=user_input,
+        intent=plan.get("intent", "未知"),
+        action=action,
+        result=step_results if "error" not in plan else {"error": plan["error"]},
+        user_id=user_id,
+        success=result["success"],
+        execution_time_ms=execution_time_ms,
+        llm_cost=llm_cost,
+        llm_usage=llm_usage,
+        plan_source=plan.get("plan_source"),
+        plan_format=plan.get("plan_format"),
+        plan_error=plan.get("error"),
+        model_routing=result.get("model_routing")
+    )
+
+    logger.info(f"请求处理完成: intent={plan.get('intent')}, skills={action}, fast_path={result['fast_path']}, time={execution_time_ms:.0f}ms")
+
+    return {
+        "intent": plan.get("intent"),
+        "skill": action,
+        "result": step_results[0].get("result") if len(step_results) == 1 else step_results,
+        "steps": plan.get("steps", []),
+        "fast_path": result["fast_path"],
+        "plan_source": plan.get("plan_source"),
+        "plan_format": plan.get("plan_format"),
+        "prompt_compaction": result.get("prompt_compaction"),
+        "timings_ms": result.get("timings_ms"),
+        "deadline_exceeded": result.get("deadline_exceeded", False),
+        "model_routing": result.get("model_routing"),
+        "execution_time_ms": round(execution_time_ms, 2),
+        "llm_cost": llm_cost,
+        "llm_usage": llm_usage
+    }
+
+
+def _lean_debug(debug: Dict[str, Any]) -> Dict[str, Any]:
+    """精简调试信息：只保留意图、技能、路径和耗时等摘要，不含完整执行结果、计划步骤和用量明细"""
+    return {key: debug.get(key) for key in LEAN_DEBUG_FIELDS}
+
+
+async def _save_chat_error(user_input: str, user_id: str, error: Exception, start_time: float) -> None:
+    """记录处理过程中的系统错误"""
+    logger.error(f"未知错误: {str(error)}\n{traceback.format_exc()}")
+    await db.asave_decision(
+        user_input=user_input,
+        intent="系统错误",
+        action="none",
+        result={"error": str(error)},
+        user_id=user_id,
+        success=False,
+        execution_time_ms=(time.time() - start_time) * 1000
+    )
+
+
+async def _load_history(session_id: Optional[str]) -> Optional[str]:
+    """读取会话上下文（未启用会话记忆或没有 session_id 时返回None）"""
+    if conversation_memory is None or not session_id:
+        return None
+    return await conversation_memory.load(session_id) or None
+
+
+async def _remember(session_id: Optional[str], user_id: str, user_input: str, response: str) -> None:
+    """保存一轮对话到会话记忆"""
+    if conversation_memory is not None and session_id:
+        await conversation_memory.append(session_id, user_id, user_input, response)
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """格式化一条Server-Sent Events消息"""
+    return f"event: {event}\ndata: {json_codec.dumps(data)}\n\n"
+
+
 @app.post("/chat", response_model=ChatResponse)
-async def chat(user_input: str, user_id: str = "default"):
-    """核心对话接口（Day 2增强版）"""
-    start_time = time.time()
-    logger.info(f"收到用户请求: user_id={user_id}, input={user_input}")
+async def chat(user_input: str, user_id: str = "default", session_id: Optional[str] = None, include_debug: Optional[bool] = None):
+    """
+    核心对话接口（Day 6: 通过AI编排器处理，支持多步骤计划和快速路径；传 session_id 时带上会话上下文）
 
-    try:
-        # Step 1: 用Claude识别意图并生成执行计划
-        response = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=1000,
-            messages=[{
-                "role": "user",
-                "content": f"""你是企业AI助手。分析用户请求并生成执行计划。
-
-用户输入："{user_input}"
-
-可用技能：
-- get_order(order_id): 查询订单，参数order_id是订单号字符串
-- query_inventory(product_id): 查询库存，参数product_id是产品ID字符串（注意：如果用户说"产品A"，ID应该是"A"，不是"产品A"）
-- send_email(to, subject, content): 发送邮件，必须提供3个参数：to邮箱地址，subject邮件主题，content邮件内容
-- send_notification(to, template, context): 发送通知邮件（使用预置模板），template可选：order_shipped（发货通知）、order_delay（延迟通知）、out_of_stock（缺货通知）
-
-重要提示：
-- 产品ID是单个字母或数字，例如用户说"产品A"或"产品A的库存"时，product_id应该是"A"
-- 订单号是完整的数字字符串，例如用户说"订单12345"时，order_id是"12345"
-- 发货通知、延迟通知等标准场景使用send_notification，自定义邮件使用send_email
-
-示例：
-用户: "查询产品A的库存" → skill: "query_inventory", params: {{"product_id": "A"}}
-用户: "订单12345的状态" → skill: "get_order", params: {{"order_id": "12345"}}
-用户: "发送发货通知给customer@example.com" → skill: "send_notification", params: {{"to": "customer@example.com", "template": "order_shipped", "context": {{"order_id": "xxx", "tracking": "xxx", "carrier": "xxx", "eta": "xxx"}}}}
-
-请严格按照以下JSON格式返回，不要添加任何其他文字说明：
-{{
-  "intent": "用户意图的简短描述",
-  "skill": "要调用的技能名称",
-  "params": {{
-    "参数名": "参数值"
-  }},
-  "response_template": "给用户的回复模板，可以用{{result}}表示结果"
-}}
-
-只返回JSON，不要有任何其他内容。"""
-            }]
-        )
+    默认返回完整调试信息（执行结果、计划步骤、用量明细、错误堆栈）；include_debug=false 时只返回精简的调试摘要。
+    """
+    return await _process_chat(user_input, user_id, session_id, _want_debug(include_debug))
 
-        # Step 2: 解析AI返回的计划
-        plan_text = response.content[0].text
-
-        # 提取JSON（更健壮的处理）
-        # 移除可能的markdown代码块标记
-        plan_text = plan_text.strip()
-        if "```json" in plan_text:
-            plan_text = plan_text.split("```json")[1].split("```")[0]
-        elif "```" in plan_text:
-            plan_text = plan_text.split("```")[1].split("```")[0]
-
-        # 尝试找到JSON对象
-        plan_text = plan_text.strip()
-
-        # 如果文本中有其他内容，尝试提取{}之间的内容
-        if not plan_text.startswith("{"):
-            import re
-            json_match = re.search(r'\{.*\}', plan_text, re.DOTALL)
-            if json_match:
-                plan_text = json_match.group(0)
-
-        plan = json.loads(plan_text)
-
-        # Step 3: 执行技能
-        skill_name = plan["skill"]
-        params = plan["params"]
-
-        if skill_name in SKILLS:
-            result = SKILLS[skill_name](**params)
-        else:
-            result = {"error": "技能不存在"}
-
-        # Step 4: 生成用户响应
-        final_response = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=500,
-            messages=[{
-                "role": "user",
-                "content": f"""执行结果：{json.dumps(result, ensure_ascii=False)}
-
-使用这个模板回复用户：{plan['response_template']}"""
-            }]
-        )
 
-        user_message = final_response.content[0].text
-
-        # Step 5: 计算执行时间和成本
-        execution_time_ms = (time.time() - start_time) * 1000
-
-        # 估算LLM成本（简化版，实际需要根据token数计算）
-        # Claude Sonnet 4: input $3/M tokens, output $15/M tokens
-        # 这里用粗略估算
-        llm_cost = 0.001  # 假设每次调用约0.001美元
-
-        # Step 6: 记录决策（使用新的Database类）
-        db.save_decision(
-            user_input=user_input,
-            intent=plan["intent"],
-            action=skill_name,
-            result=result,
-            user_id=user_id,
-            success=True,
-            execution_time_ms=execution_time_ms,
-            llm_cost=llm_cost
-        )
+def _want_debug(include_debug: Optional[bool]) -> bool:
+    """请求未指定 include_debug 时使用 CHAT_DEBUG_DEFAULT"""
+    return CHAT_DEBUG_DEFAULT if include_debug is None else include_debug
 
-        logger.info(f"请求处理成功: intent={plan['intent']}, skill={skill_name}, time={execution_time_ms:.0f}ms")
 
-        return ChatResponse(
-            success=True,
-            message=user_message,
-            debug={
-                "intent": plan["intent"],
-                "skill": skill_name,
-                "result": result,
-                "execution_time_ms": round(execution_time_ms, 2),
-                "llm_cost": llm_cost
-            }
-        )
+async def _process_chat(user_input: str, user_id: str, session_id: Optional[str] = None, include_debug: bool = False) -> ChatResponse:
+    """处理单条对话（/chat 和 /chat/batch 共用），系统错误也以 ChatResponse 返回"""
+    start_time = time.time()
+    logger.info(f"收到用户请求: user_id={user_id}, session_id={session_id}, input={user_input}")
+
+    try:
+        # 意图识别 → 执行计划 → 生成回复（快速路径下本地渲染回复）
+        with deadline_scope(REQUEST_DEADLINE_SECONDS):
+            history = await _load_history(session_id)
+            result = await orchestrator.process(user_input, history=history)
+        await _remember(session_id, user_id, user_input, result["response"])
+        debug = await _save_chat_result(user_input, user_id, result, start_time)
 
-    except json.JSONDecodeError as e:
-        # JSON解析失败
-        logger.error(f"JSON解析失败: {str(e)}")
-        execution_time_ms = (time.time() - start_time) * 1000
-        db.save_decision(
-            user_input=user_input,
-            intent="解析失败",
-            action="none",
-            result={"error": str(e)},
-            user_id=user_id,
-            success=False,
-            execution_time_ms=execution_time_ms
-        )
-        return ChatResponse(
-            success=False,
-            error=f"JSON解析失败: {str(e)}",
-            message="抱歉，我在理解您的请求时遇到了问题，请重新描述。",
-            debug={
-                "raw_response": plan_text if 'plan_text' in locals() else "未获取到响应",
-                "error_detail": str(e)
-            }
-        )
-    except KeyError as e:
-        # 缺少必需的字段
-        logger.error(f"AI返回的计划缺少必需字段: {str(e)}")
-        execution_time_ms = (time.time() - start_time) * 1000
-        db.save_decision(
-            user_input=user_input,
-            intent="字段缺失",
-            action="none",
-            result={"error": str(e)},
-            user_id=user_id,
-            success=False,
-            execution_time_ms=execution_time_ms
-        )
         return ChatResponse(
-            success=False,
-            error=f"AI返回的计划缺少必需字段: {str(e)}",
-            message="抱歉，处理出现异常，请稍后重试。",
-            debug={
-                "plan": plan if 'plan' in locals() else "未解析计划"
-            }
+            success=result["success"],
+            message=result["response"],
+            error=result["plan"].get("error"),
+            debug=debug if include_debug else _lean_debug(debug)
         )
+
     except Exception as e:
-        # 其他错误
-        import traceback
-        logger.error(f"未知错误: {str(e)}\n{traceback.format_exc()}")
-        execution_time_ms = (time.time() - start_time) * 1000
-        db.save_decision(
-            user_input=user_input,
-            intent="系统错误",
-            action="none",
-            result={"error": str(e)},
-            user_id=user_id,
-            success=False,
-            execution_time_ms=execution_time_ms
-        )
+        await _save_chat_error(user_input, user_id, e, start_time)
         return ChatResponse(
             success=False,
             error=str(e),
             message="抱歉，系统出现错误，请稍后重试。",
-            debug={
-                "traceback": traceback.format_exc()
-            }
+            debug={"traceback": traceback.format_exc()} if include_debug else None
         )
 
+
+@app.api_route("/chat/stream", methods=["GET", "POST"])
+async def chat_stream(user_input: str, user_id: str = "default", session_id: Optional[str] = None, include_debug: Optional[bool] = None):
+    """
+    流式对话接口（Server-Sent Events）
+
+    按发生顺序推送事件：plan（计划已生成）、step_start / step_end（步骤进度）、
+    token（回复文本片段）、done（完成，附带与 /chat 相同的调试信息）、error（系统错误）。
+    """
+    start_time = time.time()
+    include_debug = _want_debug(include_debug)
+    logger.info(f"收到流式请求: user_id={user_id}, input={user_input}")
+
+    async def event_stream():
+        try:
+            with deadline_scope(REQUEST_DEADLINE_SECONDS):
+                history = await _load_history(session_id)
+                async for event in orchestrator.process_stream(user_input, history=history):
+                    event_type = event.pop("type")
+                    if event_type != "done":
+                        yield _sse(event_type, event)
+                        continue
+
+                    await _remember(session_id, user_id, user_input, event["response"])
+                    debug = await _save_chat_result(user_input, user_id, event, start_time)
+                    yield _sse("done", {
+                        "success": event["success"],
+                        "message": event["response"],
+                        "error": event["plan"].get("error"),
+                        "debug": debug if include_debug else _lean_debug(debug)
+                    })
+
+        except Exception as e:
+            await _save_chat_error(user_input, user_id, e, start_time)
+            yield _sse("error", {
+                "success": False,
+                "error": str(e),
+                "message": "抱歉，系统出现错误，请稍后重试。"
+            })
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# 批量对话：并发上限（单批请求可以要求更小的值）
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+
+
+@app.post("/chat/batch")
+async def chat_batch(batch: ChatBatchRequest):
+    """
+    批量对话接口（NDJSON流式返回）
+
+    各条请求在信号量限制下并发处理（LLM调用和技能调用都在其中），
+    每完成一条立即输出一行JSON，顺序为完成顺序，用 index 对应请求中的位置。
+    """
+    if len(batch.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"单批最多 {BATCH_MAX_ITEMS} 条请求")
+
+    concurrency = min(batch.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY)
+    semaphore = asyncio.Semaphore(concurrency)
+    logger.info(f"收到批量请求: {len(batch.items)} 条, 并发 {concurrency}")
+
+    async def run_item(index: int, item: ChatRequest) -> Dict[str, Any]:
+        async with semaphore:
+            start_time = time.time()
+            try:
+                response = await _process_chat(item.user_input, item.user_id or "default", item.session_id, batch.include_debug)
+                line = {
+                    "index": index,
+                    "success": response.success,
+                    "message": response.message,
+                    "error": response.error
+                }
+                if batch.include_debug:
+                    line["debug"] = response.debug
+            except Exception as e:
+                logger.error(f"批量请求第 {index} 条失败: {e}")
+                line = {"index": index, "success": False, "message": None, "error": str(e)}
+            line["execution_time_ms"] = round((time.time() - start_time) * 1000, 2)
+            return line
+
+    async def result_stream():
+        tasks = [asyncio.create_task(run_item(i, item)) for i, item in enumerate(batch.items)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json_codec.dumps(await next_done) + "\n"
+        finally:
+            # 客户端断开时取消尚未完成的请求
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+
 @app.get("/")
 def root():
     """健康检查接口"""
@@ -325,6 +585,7 @@ def metrics():
         stats = db.get_today_stats()
         recent_logs = db.get_recent_decisions(limit=10)
         intent_dist = db.get_intent_distribution(days=7)
+        llm_usage = db.get_today_llm_usage()
 
         # 生成告警
         alerts = []
@@ -348,11 +609,27 @@ def metrics():
             "response_delta": 0.0,
             "today_cost": stats["today_cost"],
             "cost_delta": 0.0,
+            "llm_usage": llm_usage,
             "alerts": alerts,
             "recent_logs": recent_logs,
             "hourly_stats": [],  # 需要额外查询
             "intent_distribution": intent_dist,
-            "sop_stats": []  # Day 16-17 实现
+            "sop_stats": [],  # Day 16-17 实现
+            "plan_cache": orchestrator.plan_cache.stats() if orchestrator.plan_cache else None,
+            "rule_router": orchestrator.rule_router.stats() if orchestrator.rule_router else None,
+            "skill_cache": orchestrator.skill_cache.stats() if orchestrator.skill_cache else None,
+            "prefetch": orchestrator.prefetch_stats.stats() if orchestrator.speculative_prefetch else None,
+            "plan_failures": db.get_plan_failure_stats(),
+            "prompt_compaction": orchestrator.result_compactor.stats(),
+            "model_routing": orchestrator.model_router.stats() if orchestrator.model_router else None,
+            "model_tiers": db.get_model_tier_stats(),
+            "conversation_memory": conversation_memory.stats() if conversation_memory else None,
+            "http_pool": http_transport.stats(),
+            "resilience": skill_resilience.stats() if skill_resilience else None,
+            "single_flight": skill_single_flight.stats() if skill_single_flight else None,
+            "batch_loader": batch_loader_stats() if batch_loader_stats else None,
+            "inventory_cache": inventory_cache.stats() if inventory_cache else None,
+            "conditional_get": skill_conditional_get.stats() if skill_conditional_get else None
         }
     except Exception as e:
         logger.error(f"获取指标失败: {str(e)}")
@@ -0,0 +1,138 @@
+"""
+app/model_router.py - 规划/回复的模型分级
+
+大部分请求是简单查询，不需要大模型的延迟：
+- 规划先用小模型，计划校验失败、引用了不存在的技能、模型自报把握不足（confidence 低于阈值）
+  或调用出错时才升级到大模型重新规划
+- 回复按意图类别选模型：纯查询和失败说明用小模型，涉及写操作的用大模型
+"""
+from typing import Dict, Any, List, Optional, Tuple
+import threading
+
+SMALL_MODEL = "claude-3-5-haiku-20241022"
+LARGE_MODEL = "claude-sonnet-4-20250514"
+
+TIER_SMALL = "small"
+TIER_LARGE = "large"
+
+# 意图类别：lookup 只调用只读技能，action 包含写操作，failed 规划失败或没有步骤
+INTENT_LOOKUP = "lookup"
+INTENT_ACTION = "action"
+INTENT_FAILED = "failed"
+
+# 升级原因
+ESCALATE_INVALID = "invalid_plan"
+ESCALATE_UNKNOWN_SKILL = "unknown_skill"
+ESCALATE_LOW_CONFIDENCE = "low_confidence"
+ESCALATE_ERROR = "error"
+
+
+class ModelRouter:
+    """模型分级路由（累计各级调用次数、延迟和升级原因）"""
+
+    def __init__(
+        self,
+        small_model: str = SMALL_MODEL,
+        large_model: str = LARGE_MODEL,
+        confidence_threshold: float = 0.7,
+        response_models: Optional[Dict[str, str]] = None
+    ):
+        """
+        初始化模型路由
+
+        Args:
+            small_model: 先尝试的规划模型
+            large_model: 升级后使用的规划模型
+            confidence_threshold: 小模型计划的 confidence 低于该值时升级（未报告 confidence 视为有把握）
+            response_models: 按意图类别覆盖回复模型 {类别: 模型}
+        """
+        self.small_model = small_model
+        self.large_model = large_model
+        self.confidence_threshold = confidence_threshold
+        self.response_models = {
+            INTENT_LOOKUP: small_model,
+            INTENT_FAILED: small_model,
+            INTENT_ACTION: large_model,
+            **(response_models or {})
+        }
+        self._lock = threading.Lock()
+        self.plans = 0
+        self.escalations: Dict[str, int] = {}
+        self.tiers: Dict[str, Dict[str, float]] = {}
+        self.responses: Dict[str, int] = {}
+
+    def plan_tiers(self) -> List[Tuple[str, str]]:
+        """规划依次尝试的 (级别, 模型)"""
+        if self.small_model == self.large_model:
+            return [(TIER_LARGE, self.large_model)]
+        return [(TIER_SMALL, self.small_model), (TIER_LARGE, self.large_model)]
+
+    def is_low_confidence(self, plan: Dict[str, Any]) -> bool:
+        """计划自报的把握是否低于阈值"""
+        confidence = plan.get("confidence")
+        return confidence is not None and confidence < self.confidence_threshold
+
+    @staticmethod
+    def classify(plan: Dict[str, Any], read_only_skills: set) -> str:
+        """
+        按计划判断意图类别
+
+        Args:
+            plan: 执行计划
+            read_only_skills: 只读技能名集合
+
+        Returns:
+            lookup / action / failed
+        """
+        steps = plan.get("steps", [])
+        if "error" in plan or not steps:
+            return INTENT_FAILED
+        if all(step.get("skill") in read_only_skills for step in steps):
+            return INTENT_LOOKUP
+        return INTENT_ACTION
+
+    def response_model(self, plan: Dict[str, Any], read_only_skills: set) -> str:
+        """按意图类别选择回复模型"""
+        intent_class = self.classify(plan, read_only_skills)
+        with self._lock:
+            self.responses[intent_class] = self.responses.get(intent_class, 0) + 1
+        return self.response_models.get(intent_class, self.large_model)
+
+    def record_plan(self, tier_latency_ms: Dict[str, float], escalation: Optional[str]) -> None:
+        """
+        记录一次LLM规划
+
+        Args:
+            tier_latency_ms: 各级模型的规划耗时 {级别: 毫秒}
+            escalation: 升级原因（未升级为None）
+        """
+        with self._lock:
+            self.plans += 1
+            if escalation:
+                self.escalations[escalation] = self.escalations.get(escalation, 0) + 1
+            for tier, latency in tier_latency_ms.items():
+                entry = self.tiers.setdefault(tier, {"calls": 0, "total_ms": 0.0})
+                entry["calls"] += 1
+                entry["total_ms"] += latency
+
+    def stats(self) -> Dict[str, Any]:
+        """分级统计（供 /metrics 使用）"""
+        with self._lock:
+            escalated = sum(self.escalations.values())
+            return {
+                "small_model": self.small_model,
+                "large_model": self.large_model,
+                "confidence_threshold": self.confidence_threshold,
+                "plans": self.plans,
+                "escalations": escalated,
+                "escalation_rate": escalated / self.plans if self.plans else 0.0,
+                "escalation_reasons": dict(self.escalations),
+                "tiers": {
+                    tier: {
+                        "calls": entry["calls"],
+                        "avg_latency_ms": round(entry["total_ms"] / entry["calls"], 2) if entry["calls"] else 0.0
+                    }
+                    for tier, entry in self.tiers.items()
+                },
+                "responses_by_intent": dict(self.responses)
+            }
@@ -25,7 +25,7 @@ class ChatResponse(BaseModel):
     """聊天响应模型"""
     success: bool = Field(..., description="是否成功")
     message: str = Field(..., description="给用户的回复消息")
-    debug: Optional[Dict[str, Any]] = Field(default=None, description="调试信息")
+    debug: Optional[Dict[str, Any]] = Field(default=None, description="调试信息（include_debug=false 时只有摘要）")
     error: Optional[str] = Field(default=None, description="错误信息")
 
     class Config:
@@ -42,6 +42,24 @@ class ChatResponse(BaseModel):
         }
 
 
+class ChatBatchRequest(BaseModel):
+    """批量聊天请求模型"""
+    items: List[ChatRequest] = Field(..., description="聊天请求列表", min_length=1)
+    concurrency: Optional[int] = Field(default=None, description="并发数（不超过服务端上限）", ge=1)
+    include_debug: bool = Field(default=False, description="是否在每条结果中附带调试信息")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "items": [
+                    {"user_input": "查询订单12345的状态", "user_id": "user_001"},
+                    {"user_input": "产品A还有库存吗", "user_id": "user_002"}
+                ],
+                "concurrency": 4
+            }
+        }
+
+
 # ============ AI 计划模型 ============
 
 class AIPlan(BaseModel):
@@ -6,8 +6,9 @@ app/notification_skill.py - 邮件通知技能（Day 5）
 2. SMTP模式 - 标准邮件服务器
 3. SendGrid模式 - 第三方邮件服务（可选）
 """
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Generator, Optional, Tuple
 from datetime import datetime
+import asyncio
 import logging
 import os
 import smtplib
@@ -20,6 +21,64 @@ logger = logging.getLogger(__name__)
 class NotificationSkill:
     """邮件通知技能"""
 
+    # 通知邮件模板
+    TEMPLATES = {
+        "order_delay": {
+            "subject": "订单配送延迟通知",
+            "content": """尊敬的客户：
+
+您好！您的订单 {order_id} 因{reason}出现配送延迟。
+
+订单详情：
+- 订单号：{order_id}
+- 下单时间：{create_time}
+- 原预计送达：{original_eta}
+- 新预计送达：{new_eta}
+
+我们深表歉意，并已为您准备了{compensation}作为补偿。
+
+如有任何疑问，请随时联系我们。
+
+祝好！
+客服团队"""
+        },
+        "out_of_stock": {
+            "subject": "商品缺货通知",
+            "content": """尊敬的客户：
+
+您好！您订购的商品 {product_name} 目前库存不足。
+
+订单详情：
+- 订单号：{order_id}
+- 商品：{product_name}
+- 数量：{quantity}
+
+我们正在加急补货，预计{restock_date}到货。
+届时将优先为您发货。
+
+感谢您的理解与支持！
+
+祝好！
+客服团队"""
+        },
+        "order_shipped": {
+            "subject": "订单已发货",
+            "content": """尊敬的客户：
+
+您好！您的订单 {order_id} 已发货。
+
+物流信息：
+- 物流公司：{carrier}
+- 物流单号：{tracking}
+- 预计送达：{eta}
+
+您可以通过物流单号查询配送进度。
+
+祝好！
+客服团队"""
+        }
+    }
+
     def __init__(
         self,
         mode: str = "mock",  # mock, smtp, sendgrid
@@ -88,6 +147,23 @@ class NotificationSkill:
                 "error": f"不支持的邮件模式: {self.mode}"
             }
 
+    async def asend_email(
+        self,
+        to: str,
+        subject: str,
+        content: str,
+        content_type: str = "plain"
+    ) -> Dict[str, Any]:
+        """
+        send_email 的异步版本
+
+        smtplib/SendGrid SDK 都是阻塞IO，放到线程池执行，避免阻塞事件循环；
+        Mock模式没有IO，直接执行。
+        """
+        if self.mode == "mock":
+            return self.send_email(to, subject, content, content_type)
+        return await asyncio.to_thread(self.send_email, to, subject, content, content_type)
+
     def _send_mock_email(
         self,
         to: str,
@@ -244,64 +320,37 @@ class NotificationSkill:
         Returns:
             发送结果
         """
-        templates = {
-            "order_delay": {
-                "subject": "订单配送延迟通知",
-                "content": """尊敬的客户：
-
-您好！您的订单 {order_id} 因{reason}出现配送延迟。
-
-订单详情：
-- 订单号：{order_id}
-- 下单时间：{create_time}
-- 原预计送达：{original_eta}
-- 新预计送达：{new_eta}
-
-我们深表歉意，并已为您准备了{compensation}作为补偿。
-
-如有任何疑问，请随时联系我们。
-
-祝好！
-客服团队"""
-            },
-            "out_of_stock": {
-                "subject": "商品缺货通知",
-                "content": """尊敬的客户：
-
-您好！您订购的商品 {product_name} 目前库存不足。
-
-订单详情：
-- 订单号：{order_id}
-- 商品：{product_name}
-- 数量：{quantity}
-
-我们正在加急补货，预计{restock_date}到货。
-届时将优先为您发货。
-
-感谢您的理解与支持！
-
-祝好！
-客服团队"""
-            },
-            "order_shipped": {
-                "subject": "订单已发货",
-                "content": """尊敬的客户：
-
-您好！您的订单 {order_id} 已发货。
-
-物流信息：
-- 物流公司：{carrier}
-- 物流单号：{tracking}
-- 预计送达：{eta}
+        flow = self._notification_flow(to, template, context)
+        try:
+            flow.send(self.send_email(*next(flow)))
+        except StopIteration as stop:
+            return stop.value
 
-您可以通过物流单号查询配送进度。
+    async def asend_notification(
+        self,
+        to: str,
+        template: str,
+        context: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """send_notification 的异步版本"""
+        flow = self._notification_flow(to, template, context)
+        try:
+            flow.send(await self.asend_email(*next(flow)))
+        except StopIteration as stop:
+            return stop.value
 
-祝好！
-客服团队"""
-            }
-        }
+    def _notification_flow(
+        self,
+        to: str,
+        template: str,
+        context: Dict[str, Any]
+    ) -> Generator[Tuple[str, str, str], Dict[str, Any], Dict[str, Any]]:
+        """
+        模板通知流程：校验并渲染模板后 yield (收件人, 主题, 内容)，接收发送结果后返回
 
-        template_data = templates.get(template)
+        模板校验、渲染和结果都在这里，同步/异步版本只负责发送邮件。
+        """
+        template_data = self.TEMPLATES.get(template)
         if not template_data:
             return {
                 "success": False,
@@ -313,7 +362,7 @@ class NotificationSkill:
         content = template_data["content"].format(**context)
 
         # 发送邮件
-        return self.send_email(to, subject, content)
+        return (yield to, subject, content)
 
 
 # 创建全局实例
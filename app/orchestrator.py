@@ -7,30 +7,114 @@ app/orchestrator.py - AI编排器（Day 6）
 3. 技能执行和结果聚合
 4. 响应生成
 """
-from typing import Dict, Any, List, Callable, Optional
-from anthropic import Anthropic
+from typing import Dict, Any, List, Callable, Optional, AsyncIterator
+from anthropic import AsyncAnthropic
+import asyncio
 import json
 import logging
 import os
 from datetime import datetime
 import re
+import string
+import time
+
+from app import json_codec
+from app.deadline import DeadlineExceeded, clamp_timeout, expired, remaining
+from app.entities import ENTITY_PATTERNS, extract_entities
+from app.llm_usage import UsageTracker
+from app.model_router import ModelRouter, ESCALATE_ERROR, ESCALATE_INVALID, ESCALATE_LOW_CONFIDENCE, ESCALATE_UNKNOWN_SKILL
+from app.plan_schema import PLAN_TOOL_NAME, PlanValidationError, UnknownSkillError, build_params_model, build_plan_tool, validate_plan
+from app.plan_cache import PlanCache
+from app.prefetch import SpeculativePrefetch, PrefetchStats
+from app.result_compactor import ResultCompactor, Projection
+from app.rule_router import RuleRouter
+from app.skill_cache import SkillCache, KeyFunc, MISS
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MODEL = "claude-sonnet-4-20250514"
+
+# 计划不合法时把错误反馈给模型修正的次数
+PLAN_REPAIR_ATTEMPTS = 1
+
+# LLM调用的默认超时（秒），设置了请求截止时间时按剩余时间收紧
+LLM_TIMEOUT = 60.0
+
+# 截止时间已到、未执行的步骤的错误信息
+DEADLINE_SKIP_ERROR = "请求截止时间已到，步骤未执行"
+
+# 依赖的步骤失败、未执行的步骤的错误信息
+DEPENDENCY_SKIP_ERROR = "依赖的步骤 {steps} 失败，步骤未执行"
+
+
+def _elapsed_ms(start: float) -> float:
+    """从 time.perf_counter() 起点到现在的毫秒数"""
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+class _TemplateFormatter(string.Formatter):
+    """回复模板渲染器：列表/字典字段转为可读文本，缺失字段直接报错（由调用方降级）"""
+
+    def format_field(self, value: Any, format_spec: str) -> str:
+        if isinstance(value, (dict, list)):
+            return json_codec.dumps(value)
+        if value is None:
+            return "无"
+        return super().format_field(value, format_spec)
+
 
 class AIOrchestrator:
     """AI编排器 - 系统的大脑"""
 
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        fast_path: bool = False,
+        plan_cache: Optional[PlanCache] = None,
+        rule_router: Optional[RuleRouter] = None,
+        base_url: Optional[str] = None,
+        max_parallel_steps: int = 4,
+        skill_cache: Optional[SkillCache] = None,
+        speculative_prefetch: bool = False,
+        result_compactor: Optional[ResultCompactor] = None,
+        model_router: Optional[ModelRouter] = None
+    ):
         """
         初始化编排器
 
         Args:
             api_key: Claude API密钥
+            fast_path: 是否启用快速路径（单步骤只读意图本地渲染回复，跳过generate_response）
+            plan_cache: 参数化计划缓存（可选，None表示每次都调用LLM规划）
+            rule_router: 规则预路由（可选，意图明确的高频查询不调用LLM规划）
+            base_url: Messages API地址（可选，例如指向 fake_llm_server.py 做离线测试）
+            max_parallel_steps: 计划中相互独立的步骤最多同时执行的数量
+            skill_cache: 技能结果缓存（可选，None表示每次都调用技能）
+            speculative_prefetch: 是否在LLM规划期间按输入中的实体预取只读技能结果
+            result_compactor: 回复提示词的执行结果压缩器（可选，默认使用1500 token预算）
+            model_router: 模型分级路由（可选，None表示规划和回复都使用 plan_model / response_model）
         """
-        self.client = Anthropic(api_key=api_key)
+        self.client = AsyncAnthropic(api_key=api_key, base_url=base_url)
+        self.fast_path = fast_path
+        self.max_parallel_steps = max(1, max_parallel_steps)
+        self.plan_model = DEFAULT_MODEL
+        self.response_model = DEFAULT_MODEL
+        self.plan_cache = plan_cache
+        self.rule_router = rule_router
+        self.skill_cache = skill_cache
+        self.speculative_prefetch = speculative_prefetch
+        self.prefetch_skills: Dict[str, str] = {}  # 可预取的技能 -> 实体类型
+        self.prefetch_stats = PrefetchStats()
+        self.result_compactor = result_compactor or ResultCompactor()
+        self.model_router = model_router
         self.skills: Dict[str, Callable] = {}
+        self.async_skills: Dict[str, Callable] = {}
+        self.read_only_skills: set = set()
         self.skill_descriptions: Dict[str, str] = {}
+        self.skill_parameters: Dict[str, Dict[str, str]] = {}
+        self._params_models: Dict[str, Any] = {}
+        self._planner_system = self._build_planner_system()
+        self._planner_tools = self._build_planner_tools()
         logger.info("AIOrchestrator initialized")
 
     def register_skill(
@@ -38,7 +122,16 @@ class AIOrchestrator:
         name: str,
         func: Callable,
         description: str,
-        parameters: Optional[Dict[str, str]] = None
+        parameters: Optional[Dict[str, str]] = None,
+        async_func: Optional[Callable] = None,
+        read_only: bool = False,
+        keywords: Optional[List[str]] = None,
+        response_template: Optional[str] = None,
+        cache_ttl: Optional[float] = None,
+        cache_key: Optional[KeyFunc] = None,
+        invalidates: Optional[List[str]] = None,
+        prefetch: bool = False,
+        result_fields: Optional[Projection] = None
     ) -> None:
         """
         注册技能
@@ -48,8 +141,25 @@ class AIOrchestrator:
             func: 技能函数
             description: 技能描述（供AI理解）
             parameters: 参数说明 {"param_name": "param_description"}
+            async_func: 技能的异步版本（可选，未提供时同步函数在线程池中执行）
+            read_only: 是否为只读查询技能（只读技能可走快速路径）
+            keywords: 规则预路由关键词（只读、单个实体参数的技能可由规则直接路由）
+            response_template: 规则路由生成计划时使用的回复模板
+            cache_ttl: 结果缓存有效期（秒，只读技能使用；需要编排器配置了 skill_cache）
+            cache_key: 结果缓存的键函数 params -> 可哈希值（默认按参数值）
+            invalidates: 执行后需要失效结果缓存的技能名称列表（写操作技能使用）
+            prefetch: LLM规划期间是否按输入中的实体预取（只读、唯一参数为实体类型的技能）
+            result_fields: 生成回复时保留的结果字段（投影规则，None表示保留全部字段）
         """
         self.skills[name] = func
+        if async_func:
+            self.async_skills[name] = async_func
+        else:
+            self.async_skills.pop(name, None)
+        if read_only:
+            self.read_only_skills.add(name)
+        else:
+            self.read_only_skills.discard(name)
 
         # 构建完整描述
         full_description = f"{name}: {description}"
@@ -58,25 +168,87 @@ class AIOrchestrator:
             full_description += f" - 参数: {params_str}"
 
         self.skill_descriptions[name] = full_description
+        self.skill_parameters[name] = dict(parameters or {})
+        self._params_models[name] = build_params_model(name, self.skill_parameters[name])
+        self._planner_system = self._build_planner_system()
+        self._planner_tools = self._build_planner_tools()
+
+        if self.rule_router is not None:
+            self.rule_router.add_skill(name, description, parameters, keywords, response_template, read_only)
+
+        self.result_compactor.set_projection(name, result_fields)
+
+        param_names = list(parameters or {})
+        if prefetch and read_only and len(param_names) == 1 and param_names[0] in ENTITY_PATTERNS:
+            self.prefetch_skills[name] = param_names[0]
+        else:
+            self.prefetch_skills.pop(name, None)
+
+        if self.skill_cache is not None:
+            self.skill_cache.register(
+                name, param_names,
+                ttl_seconds=cache_ttl if read_only else None,
+                key_func=cache_key,
+                invalidates=invalidates
+            )
+
+        # 技能注册表变化后，缓存的计划可能引用了旧技能或旧参数
+        if self.plan_cache is not None:
+            self.plan_cache.clear()
         logger.info(f"Registered skill: {name}")
 
     def get_skill_list(self) -> str:
         """获取技能列表的文本描述"""
         return "\n".join([f"- {desc}" for desc in self.skill_descriptions.values()])
 
-    def analyze_intent(self, user_input: str) -> Dict[str, Any]:
+    async def _call_skill(self, name: str, params: Dict[str, Any]) -> Any:
         """
-        分析用户意图并生成执行计划
+        调用技能，不阻塞事件循环
+
+        可缓存的只读技能先查结果缓存；写操作技能执行后失效它声明的缓存。
 
         Args:
-            user_input: 用户输入
+            name: 技能名称
+            params: 技能参数
 
         Returns:
-            执行计划字典
+            技能执行结果
+        """
+        cache = self.skill_cache
+        if cache is not None and cache.is_cacheable(name):
+            result, generation = cache.get(name, params)
+            if result is not MISS:
+                return result
+            result = await self._invoke_skill(name, params)
+            cache.put(name, params, result, generation)
+            return result
+
+        result = None
+        try:
+            result = await self._invoke_skill(name, params)
+            return result
+        finally:
+            # 写操作失败时也可能已部分生效，同样失效缓存
+            if cache is not None:
+                cache.invalidate_for(name, params, result)
+
+    async def _invoke_skill(self, name: str, params: Dict[str, Any]) -> Any:
+        """直接执行技能（优先使用异步版本，同步函数在线程池中执行）"""
+        if name in self.async_skills:
+            return await self.async_skills[name](**params)
+        return await asyncio.to_thread(self.skills[name], **params)
+
+    def _build_planner_system(self) -> List[Dict[str, Any]]:
         """
-        prompt = f"""你是企业AI助手的编排器。分析用户请求并生成执行计划。
+        构建规划用的系统提示词（注册技能时预先生成）
 
-用户输入："{user_input}"
+        内容只依赖技能目录，标记 cache_control 后由Anthropic提示缓存复用（连同前面的工具定义），
+        每次规划只需按缓存价格计费这部分输入。
+
+        Returns:
+            messages.create 的 system 参数
+        """
+        text = f"""你是企业AI助手的编排器。分析用户请求并生成执行计划。
 
 可用技能：
 {self.get_skill_list()}
@@ -84,26 +256,17 @@ class AIOrchestrator:
 重要提示：
 - 产品ID是单个字母或数字，例如用户说"产品A"时，product_id应该是"A"
 - 订单号是完整的数字字符串
-- 如果任务需要多个步骤，请按顺序列出
+- 如果任务需要多个步骤，请按顺序列出；相互独立的查询步骤会并行执行
+- 如果某一步需要前面步骤的结果，用 "$字段名" 或 "$stepN_result" 引用，或用 "depends_on": [步骤号] 声明依赖
 - 每个步骤只调用一个技能
+- final_response_template 可以用 {{字段名}} 引用最后一步技能返回结果中的字段，例如 {{status}}、{{stock}}
+- confidence 填写对计划正确性的把握（0-1），请求含义不明确或找不到合适的技能时给出较低的值
 
-请严格按照以下JSON格式返回执行计划：
-{{
-  "intent": "用户意图的简短描述",
-  "steps": [
-    {{
-      "step": 1,
-      "skill": "技能名称",
-      "params": {{"参数名": "参数值"}},
-      "description": "这一步做什么"
-    }}
-  ],
-  "final_response_template": "给用户的回复模板"
-}}
+通过 {PLAN_TOOL_NAME} 工具提交执行计划（intent、steps、final_response_template、confidence）。
 
 示例：
 用户: "查询产品A的库存"
-→ {{"intent": "查询库存", "steps": [{{"step": 1, "skill": "query_inventory", "params": {{"product_id": "A"}}, "description": "查询产品A库存"}}]}}
+→ {{"intent": "查询库存", "steps": [{{"step": 1, "skill": "query_inventory", "params": {{"product_id": "A"}}, "description": "查询产品A库存"}}], "final_response_template": "{{product_name}}当前库存{{stock}}件，状态：{{status}}，所在仓库：{{warehouse}}"}}
 
 用户: "订单12345延迟了，发个道歉邮件给客户"
 → {{"intent": "处理延迟订单", "steps": [
@@ -111,52 +274,222 @@ class AIOrchestrator:
     {{"step": 2, "skill": "send_notification", "params": {{"to": "客户邮箱", "template": "order_delay", "context": {{}}}}, "description": "发送道歉邮件"}}
 ]}}
 
-只返回JSON，不要有任何其他内容。"""
+必须调用 {PLAN_TOOL_NAME} 工具，不要输出其他内容。"""
+        return [{"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}]
 
-        try:
-            response = self.client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=2000,
-                messages=[{"role": "user", "content": prompt}]
-            )
+    def _build_planner_tools(self) -> List[Dict[str, Any]]:
+        """构建规划用的 submit_plan 工具（参数schema由技能元数据生成，位于提示缓存前缀内）"""
+        return [build_plan_tool({
+            name: {"description": self.skill_descriptions[name], "parameters": parameters}
+            for name, parameters in self.skill_parameters.items()
+        })]
 
-            plan_text = response.content[0].text.strip()
+    async def analyze_intent(
+        self,
+        user_input: str,
+        usage: Optional[UsageTracker] = None,
+        prefetch: Optional[SpeculativePrefetch] = None,
+        history: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        分析用户意图并生成执行计划
 
-            # 提取JSON（处理可能的markdown代码块）
-            if not plan_text.startswith("{"):
-                json_match = re.search(r'\{.*\}', plan_text, re.DOTALL)
-                if json_match:
-                    plan_text = json_match.group(0)
+        LLM规划通过 submit_plan 工具提交结构化计划，并按技能参数schema校验；
+        不合法时把错误反馈给模型修正一次。配置了模型路由时先用小模型规划，
+        计划不合法、引用未知技能、把握不足或调用出错时升级到大模型。
 
-            plan = json.loads(plan_text)
-            logger.info(f"Intent analyzed: {plan.get('intent')}, Steps: {len(plan.get('steps', []))}")
-            return plan
+        Args:
+            user_input: 用户输入
+            usage: 用量统计（可选，记录到 plan 阶段）
+            prefetch: 投机预取（可选，需要调用LLM规划时先启动预取）
+            history: 会话上下文（可选，ConversationMemory.load 的返回值，放在用户消息中，不影响提示缓存）
+
+        Returns:
+            执行计划字典（plan_source 标明来源：rule / cache / llm；LLM规划时 plan_format 为 tool / text，
+            model_routing 为使用的模型级别、升级原因和各级耗时）
+        """
+        if self.rule_router is not None:
+            routed_plan = self.rule_router.route(user_input)
+            if routed_plan is not None:
+                logger.info(f"Rule routed: {routed_plan['steps'][0]['skill']}")
+                return routed_plan
+
+        # 有会话上下文且输入中没有实体时（例如"它到哪了"），计划依赖上下文，不读写计划缓存
+        use_plan_cache = self.plan_cache is not None and not (history and not extract_entities(user_input))
+
+        if use_plan_cache:
+            cached_plan = self.plan_cache.get(user_input)
+            if cached_plan is not None:
+                cached_plan["plan_source"] = "cache"
+                logger.info(f"Plan cache hit: {cached_plan.get('intent')}")
+                return cached_plan
+
+        if prefetch is not None:
+            prefetch.start(user_input)
+
+        plan_format = "tool"
+        routing: Dict[str, Any] = {"plan_latency_ms": {}, "escalation": None}
+
+        async def request_plan(model: str, repair_attempts: int) -> Dict[str, Any]:
+            nonlocal plan_format
+            content = f"用户输入：\"{user_input}\""
+            if history:
+                content = f"对话上下文（用于理解指代和省略的订单号等）：\n{history}\n\n{content}"
+            messages: List[Dict[str, Any]] = [{"role": "user", "content": content}]
+            for attempt in range(repair_attempts + 1):
+                # 静态前缀（工具定义 + 系统指令 + 技能目录）走提示缓存，每次只发送很短的用户输入
+                response = await self.client.messages.create(
+                    model=model,
+                    max_tokens=2000,
+                    system=self._planner_system,
+                    tools=self._planner_tools,
+                    tool_choice={"type": "tool", "name": PLAN_TOOL_NAME},
+                    messages=messages,
+                    timeout=clamp_timeout(LLM_TIMEOUT)
+                )
+                if usage is not None:
+                    usage.record("plan", model, response.usage)
+
+                tool_use = next((block for block in response.content if getattr(block, "type", None) == "tool_use"), None)
+                try:
+                    if tool_use is not None:
+                        plan_format = "tool"
+                        raw_plan = tool_use.input
+                    else:
+                        # 不支持 tool use 的模型或代理：退回到从文本中解析JSON
+                        plan_format = "text"
+                        raw_plan = self._parse_plan_text(response.content[0].text)
+                    return validate_plan(raw_plan, self._params_models)
+                except (PlanValidationError, json.JSONDecodeError) as e:
+                    if attempt == repair_attempts:
+                        raise
+                    # 把错误反馈给模型修正一次，不让整个请求失败
+                    logger.warning(f"Invalid plan, asking model to repair: {e}")
+                    messages = messages + [
+                        {"role": "assistant", "content": response.content},
+                        {"role": "user", "content": [{
+                            "type": "tool_result", "tool_use_id": tool_use.id, "content": f"计划无效：{e}", "is_error": True
+                        }] if tool_use is not None else f"计划无效：{e}。请修正后重新提交。"}
+                    ]
+
+        # 模型分级：先用小模型规划，不合格时升级到大模型（大模型才做修正重试）
+        tiers = self.model_router.plan_tiers() if self.model_router is not None else [(None, self.plan_model)]
+        try:
+            for index, (tier, model) in enumerate(tiers):
+                last_tier = index == len(tiers) - 1
+                routing.update(tier=tier, model=model)
+                stage_start = time.perf_counter()
+                try:
+                    plan = await request_plan(model, PLAN_REPAIR_ATTEMPTS if last_tier else 0)
+                except DeadlineExceeded:
+                    raise
+                except Exception as e:
+                    if last_tier:
+                        raise
+                    if isinstance(e, UnknownSkillError):
+                        routing["escalation"] = ESCALATE_UNKNOWN_SKILL
+                    elif isinstance(e, (PlanValidationError, json.JSONDecodeError)):
+                        routing["escalation"] = ESCALATE_INVALID
+                    else:
+                        routing["escalation"] = ESCALATE_ERROR
+                    logger.info(f"Escalating plan from {model} ({routing['escalation']}): {e}")
+                    continue
+                finally:
+                    if tier is not None:
+                        routing["plan_latency_ms"][tier] = _elapsed_ms(stage_start)
+
+                if not last_tier and self.model_router.is_low_confidence(plan):
+                    routing["escalation"] = ESCALATE_LOW_CONFIDENCE
+                    logger.info(f"Escalating plan from {model}: confidence {plan.get('confidence')}")
+                    continue
+                break
 
+            logger.info(f"Intent analyzed: {plan.get('intent')}, Steps: {len(plan.get('steps', []))}")
+            if use_plan_cache:
+                self.plan_cache.put(user_input, plan)
+            plan["plan_source"] = "llm"
+            plan["plan_format"] = plan_format
+            return self._with_routing(plan, routing)
+
+        except DeadlineExceeded as e:
+            logger.error(f"Intent analysis deadline exceeded: {e}")
+            return self._with_routing({
+                "intent": "请求超时",
+                "steps": [],
+                "error": str(e),
+                "plan_format": plan_format
+            }, routing)
         except json.JSONDecodeError as e:
-            logger.error(f"JSON parsing error: {e}, text: {plan_text[:200]}")
-            return {
+            logger.error(f"JSON parsing error: {e}")
+            return self._with_routing({
                 "intent": "解析失败",
                 "steps": [],
-                "error": f"无法解析AI响应: {str(e)}"
-            }
+                "error": f"无法解析AI响应: {str(e)}",
+                "plan_format": plan_format
+            }, routing)
+        except PlanValidationError as e:
+            logger.error(f"Plan validation error: {e}")
+            return self._with_routing({
+                "intent": "计划校验失败",
+                "steps": [],
+                "error": f"计划不合法: {str(e)}",
+                "plan_format": plan_format
+            }, routing)
         except Exception as e:
             logger.error(f"Intent analysis error: {e}")
-            return {
+            return self._with_routing({
                 "intent": "分析失败",
                 "steps": [],
-                "error": str(e)
-            }
+                "error": str(e),
+                "plan_format": plan_format
+            }, routing)
 
-    def execute_plan(self, plan: Dict[str, Any]) -> Dict[str, Any]:
+    def _with_routing(self, plan: Dict[str, Any], routing: Dict[str, Any]) -> Dict[str, Any]:
+        """记录LLM规划使用的模型级别、升级原因和各级耗时（配置了模型路由时）"""
+        if self.model_router is None:
+            return plan
+        self.model_router.record_plan(routing["plan_latency_ms"], routing["escalation"])
+        plan["model_routing"] = {
+            "plan_tier": routing.get("tier"),
+            "plan_model": routing.get("model"),
+            "escalation": routing["escalation"],
+            "plan_latency_ms": routing["plan_latency_ms"]
+        }
+        return plan
+
+    @staticmethod
+    def _parse_plan_text(plan_text: str) -> Any:
+        """从文本回复中解析计划JSON（处理可能的markdown代码块）"""
+        plan_text = plan_text.strip()
+        if not plan_text.startswith("{"):
+            json_match = re.search(r'\{.*\}', plan_text, re.DOTALL)
+            if json_match:
+                plan_text = json_match.group(0)
+        return json_codec.loads(plan_text)
+
+    async def execute_plan(
+        self,
+        plan: Dict[str, Any],
+        on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+        prefetch: Optional[SpeculativePrefetch] = None
+    ) -> Dict[str, Any]:
         """
         执行计划
 
+        按步骤依赖关系构建DAG，相互独立的步骤并发执行（最多 max_parallel_steps 个），
+        总耗时取决于关键路径而不是所有步骤之和。results 仍按计划中的步骤顺序返回。
+        每个步骤只能从它依赖的步骤的输出中取动态参数；依赖的步骤失败时跳过该步骤。
+
         Args:
             plan: 执行计划
+            on_event: 步骤进度回调（可选），每个步骤开始/结束时收到 step_start/step_end 事件
+            prefetch: 投机预取（可选），参数相同的只读步骤直接使用预取结果
 
         Returns:
             执行结果
         """
+        emit = on_event or (lambda event: None)
+
         if "error" in plan:
             return {
                 "success": False,
@@ -165,61 +498,144 @@ class AIOrchestrator:
             }
 
         steps = plan.get("steps", [])
-        results = []
-        context = {}  # 存储步骤间的上下文数据
+        outputs: List[Dict[str, Any]] = [{} for _ in steps]  # 每个步骤写入上下文的数据
+        dependencies = self._build_dependencies(steps)
+        semaphore = asyncio.Semaphore(self.max_parallel_steps)
+        tasks: List[asyncio.Task] = []
+
+        async def run_step(index: int, step_info: Dict[str, Any]) -> Dict[str, Any]:
+            # 等待依赖的步骤完成
+            dependency_results = []
+            if dependencies[index]:
+                dependency_results = await asyncio.gather(*(tasks[i] for i in dependencies[index]))
 
-        for step_info in steps:
             step_num = step_info.get("step", 0)
             skill_name = step_info.get("skill")
             params = step_info.get("params", {})
             description = step_info.get("description", "")
 
             logger.info(f"Executing step {step_num}: {skill_name} - {description}")
+            emit({"type": "step_start", "step": step_num, "skill": skill_name, "description": description})
 
             # 检查技能是否存在
             if skill_name not in self.skills:
                 logger.warning(f"Skill not found: {skill_name}")
-                results.append({
+                emit({"type": "step_end", "step": step_num, "skill": skill_name, "success": False, "error": f"技能不存在: {skill_name}"})
+                return {
                     "step": step_num,
                     "skill": skill_name,
                     "success": False,
                     "error": f"技能不存在: {skill_name}"
-                })
-                continue
+                }
 
-            # 参数替换：从上下文中获取动态值
+            # 截止时间已到：不再发起新的技能调用
+            if expired():
+                logger.warning(f"Step {step_num} skipped: deadline exceeded")
+                emit({"type": "step_end", "step": step_num, "skill": skill_name, "success": False, "error": DEADLINE_SKIP_ERROR})
+                return {
+                    "step": step_num,
+                    "skill": skill_name,
+                    "success": False,
+                    "error": DEADLINE_SKIP_ERROR,
+                    "skipped": True
+                }
+
+            # 依赖的步骤失败：参数可能取不到，写操作也不应在失败的前置步骤之后执行
+            failed = [r["step"] for r in dependency_results if not r.get("success", False)]
+            if failed:
+                error = DEPENDENCY_SKIP_ERROR.format(steps=", ".join(str(n) for n in failed))
+                logger.warning(f"Step {step_num} skipped: {error}")
+                emit({"type": "step_end", "step": step_num, "skill": skill_name, "success": False, "error": error})
+                return {
+                    "step": step_num,
+                    "skill": skill_name,
+                    "success": False,
+                    "error": error,
+                    "skipped": True
+                }
+
+            # 参数替换：按计划顺序合并依赖步骤的输出，从中获取动态值（不读取并发执行中的无关步骤）
+            context = {}
+            for i in dependencies[index]:
+                context.update(outputs[i])
             resolved_params = self._resolve_params(params, context)
 
             # 执行技能
             try:
-                skill_func = self.skills[skill_name]
-                result = skill_func(**resolved_params)
+                async with semaphore:
+                    result = MISS
+                    if prefetch is not None:
+                        if skill_name in self.read_only_skills:
+                            result = await prefetch.take(skill_name, resolved_params)
+                        else:
+                            # 写操作之后预取的结果可能已过期
+                            prefetch.discard()
+                    if result is MISS:
+                        left = remaining()
+                        if left is None:
+                            result = await self._call_skill(skill_name, resolved_params)
+                        else:
+                            # 技能自身没有超时（或超时比剩余时间长）时，最多等到截止时间
+                            result = await asyncio.wait_for(self._call_skill(skill_name, resolved_params), max(left, 0))
 
                 # 存储结果到上下文
-                context[f"step{step_num}_result"] = result
+                output = outputs[index]
+                output[f"step{step_num}_result"] = result
                 if isinstance(result, dict):
                     # 常用字段也存入上下文
                     for key in ["order_id", "customer_email", "product_id", "tracking"]:
                         if key in result:
-                            context[key] = result[key]
+                            output[key] = result[key]
 
-                results.append({
+                step_success = result.get("success", True) if isinstance(result, dict) else True
+                logger.info(f"Step {step_num} completed successfully")
+                emit({
+                    "type": "step_end",
                     "step": step_num,
                     "skill": skill_name,
-                    "success": result.get("success", True) if isinstance(result, dict) else True,
+                    "success": step_success,
+                    "error": result.get("error") if isinstance(result, dict) else None
+                })
+                return {
+                    "step": step_num,
+                    "skill": skill_name,
+                    "success": step_success,
                     "result": result,
                     "description": description
-                })
-                logger.info(f"Step {step_num} completed successfully")
+                }
+
+            except asyncio.TimeoutError:
+                logger.error(f"Step {step_num} timed out: deadline exceeded")
+                emit({"type": "step_end", "step": step_num, "skill": skill_name, "success": False, "error": "请求超时"})
+                return {
+                    "step": step_num,
+                    "skill": skill_name,
+                    "success": False,
+                    "error": "请求超时"
+                }
 
             except Exception as e:
                 logger.error(f"Step {step_num} failed: {e}")
-                results.append({
+                emit({"type": "step_end", "step": step_num, "skill": skill_name, "success": False, "error": str(e)})
+                return {
                     "step": step_num,
                     "skill": skill_name,
                     "success": False,
                     "error": str(e)
-                })
+                }
+
+        # 依赖只指向前面的步骤，按顺序创建任务即可保证被依赖的任务已存在
+        for index, step_info in enumerate(steps):
+            tasks.append(asyncio.create_task(run_step(index, step_info)))
+        try:
+            results = list(await asyncio.gather(*tasks))
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        context = {}
+        for output in outputs:
+            context.update(output)
 
         return {
             "success": all(r.get("success", False) for r in results),
@@ -227,6 +643,54 @@ class AIOrchestrator:
             "context": context
         }
 
+    def _build_dependencies(self, steps: List[Dict[str, Any]]) -> List[List[int]]:
+        """
+        推断计划中步骤之间的依赖关系（返回每个步骤依赖的步骤下标）
+
+        - "depends_on": [步骤号] 显式声明依赖
+        - 参数 "$stepN_result" 依赖第N步；其他 "$字段名" 可能来自任意前面的步骤，依赖前面所有步骤
+        - 非只读技能（写操作）与前后步骤保持原有顺序，只读步骤之间才会并行
+
+        只允许依赖前面的步骤，保证依赖关系无环。
+
+        Args:
+            steps: 计划步骤列表
+
+        Returns:
+            每个步骤依赖的前面步骤下标列表
+        """
+        dependencies: List[List[int]] = []
+        step_index: Dict[Any, int] = {}  # 步骤号 -> 最近一次出现的下标
+        last_write: Optional[int] = None
+
+        for index, step_info in enumerate(steps):
+            deps = set()
+            declared = step_info.get("depends_on") or []
+            if not isinstance(declared, list):
+                declared = [declared]
+            for step_num in declared:
+                if step_num in step_index:
+                    deps.add(step_index[step_num])
+
+            for value in (step_info.get("params") or {}).values():
+                if not (isinstance(value, str) and value.startswith("$")):
+                    continue
+                match = re.fullmatch(r"\$step(\d+)_result", value)
+                if match and int(match.group(1)) in step_index:
+                    deps.add(step_index[int(match.group(1))])
+                else:
+                    deps.update(range(index))
+
+            if step_info.get("skill") not in self.read_only_skills:
+                deps.update(range(index))
+                last_write = index
+            elif last_write is not None:
+                deps.add(last_write)
+
+            dependencies.append(sorted(deps))
+            step_index[step_info.get("step", 0)] = index
+        return dependencies
+
     def _resolve_params(
         self,
         params: Dict[str, Any],
@@ -252,24 +716,58 @@ class AIOrchestrator:
                 resolved[key] = value
         return resolved
 
-    def generate_response(
+    def _build_response_prompt(
         self,
         user_input: str,
         plan: Dict[str, Any],
-        execution_result: Dict[str, Any]
+        execution_result: Dict[str, Any],
+        usage: Optional[UsageTracker] = None
     ) -> str:
         """
-        生成用户友好的响应
+        构建生成回复用的提示词
+
+        详细数据经过 result_compactor 投影、截断，控制在token预算内。
 
         Args:
             user_input: 用户输入
             plan: 执行计划
             execution_result: 执行结果
+            usage: 用量统计（可选，记录压缩节省的token数）
 
         Returns:
-            响应文本
+            提示词文本
         """
-        # 准备结果摘要
+        results_summary = self._summarize_results(execution_result)
+
+        compacted = self.result_compactor.compact(execution_result.get("results", []))
+        if usage is not None:
+            usage.record_compaction("response", compacted["original_tokens"], compacted["compacted_tokens"])
+
+        prompt = f"""根据执行结果，生成一个友好的回复给用户。
+
+用户输入："{user_input}"
+
+执行计划：{plan.get('intent')}
+
+执行结果：
+{chr(10).join(results_summary)}
+
+详细数据：
+{compacted["text"]}
+
+要求：
+1. 用自然语言总结执行结果
+2. 重点突出用户关心的信息（订单状态、库存数量等）
+3. 如果有错误，友好地告知用户
+4. 不要包含技术细节（如step、skill等）
+5. 保持简洁，3-5句话
+
+直接返回回复内容，不要有多余的格式。"""
+        return prompt
+
+    @staticmethod
+    def _summarize_results(execution_result: Dict[str, Any]) -> List[str]:
+        """每个步骤一行的结果摘要"""
         results_summary = []
         for result in execution_result.get("results", []):
             step = result.get("step")
@@ -290,77 +788,313 @@ class AIOrchestrator:
                 summary += f"失败 - {result.get('error', '未知错误')}"
 
             results_summary.append(summary)
+        return results_summary
+
+    def _partial_response(self, plan: Dict[str, Any], execution_result: Dict[str, Any]) -> str:
+        """截止时间已到时的部分回复：不再调用LLM，直接返回已完成步骤的摘要"""
+        lines = [f"处理时间已超出限制，以下是目前的处理结果（{plan.get('intent')}）："]
+        lines.extend(self._summarize_results(execution_result))
+        return "\n".join(lines)
+
+    def _select_response_model(self, plan: Dict[str, Any]) -> str:
+        """回复模型：配置了模型路由时按意图类别选择"""
+        if self.model_router is None:
+            return self.response_model
+        return self.model_router.response_model(plan, self.read_only_skills)
+
+    def _fallback_response(self, plan: Dict[str, Any], execution_result: Dict[str, Any]) -> str:
+        """LLM不可用时的降级回复：返回简单的结果摘要"""
+        if execution_result.get("success"):
+            return f"已完成您的请求：{plan.get('intent')}"
+        else:
+            return f"处理请求时遇到问题：{plan.get('intent')}"
+
+    async def generate_response(
+        self,
+        user_input: str,
+        plan: Dict[str, Any],
+        execution_result: Dict[str, Any],
+        usage: Optional[UsageTracker] = None
+    ) -> str:
+        """
+        生成用户友好的响应
 
-        prompt = f"""根据执行结果，生成一个友好的回复给用户。
-
-用户输入："{user_input}"
-
-执行计划：{plan.get('intent')}
-
-执行结果：
-{chr(10).join(results_summary)}
-
-详细数据：
-{json.dumps(execution_result.get('results', []), ensure_ascii=False, indent=2)}
+        Args:
+            user_input: 用户输入
+            plan: 执行计划
+            execution_result: 执行结果
+            usage: 用量统计（可选，记录到 response 阶段）
 
-要求：
-1. 用自然语言总结执行结果
-2. 重点突出用户关心的信息（订单状态、库存数量等）
-3. 如果有错误，友好地告知用户
-4. 不要包含技术细节（如step、skill等）
-5. 保持简洁，3-5句话
+        Returns:
+            响应文本（请求截止时间已到时不调用LLM，返回已完成步骤的摘要）
+        """
+        if expired():
+            return self._partial_response(plan, execution_result)
+        prompt = self._build_response_prompt(user_input, plan, execution_result, usage)
 
-直接返回回复内容，不要有多余的格式。"""
+        model = self._select_response_model(plan)
 
         try:
-            response = self.client.messages.create(
-                model="claude-sonnet-4-20250514",
+            response = await self.client.messages.create(
+                model=model,
                 max_tokens=1000,
-                messages=[{"role": "user", "content": prompt}]
+                messages=[{"role": "user", "content": prompt}],
+                timeout=clamp_timeout(LLM_TIMEOUT)
             )
+            if usage is not None:
+                usage.record("response", model, response.usage)
             return response.content[0].text.strip()
 
+        except DeadlineExceeded:
+            return self._partial_response(plan, execution_result)
         except Exception as e:
             logger.error(f"Response generation error: {e}")
-            # 降级：返回简单的结果摘要
-            if execution_result.get("success"):
-                return f"已完成您的请求：{plan.get('intent')}"
-            else:
-                return f"处理请求时遇到问题：{plan.get('intent')}"
+            return self._fallback_response(plan, execution_result)
 
-    def process(self, user_input: str) -> Dict[str, Any]:
+    async def stream_response(
+        self,
+        user_input: str,
+        plan: Dict[str, Any],
+        execution_result: Dict[str, Any],
+        usage: Optional[UsageTracker] = None
+    ) -> AsyncIterator[str]:
+        """
+        流式生成用户友好的响应（generate_response 的流式版本）
+
+        Args:
+            user_input: 用户输入
+            plan: 执行计划
+            execution_result: 执行结果
+            usage: 用量统计（可选，记录到 response 阶段）
+
+        Yields:
+            回复文本片段
+        """
+        if expired():
+            yield self._partial_response(plan, execution_result)
+            return
+        prompt = self._build_response_prompt(user_input, plan, execution_result, usage)
+        emitted = False
+        model = self._select_response_model(plan)
+
+        try:
+            async with self.client.messages.stream(
+                model=model,
+                max_tokens=1000,
+                messages=[{"role": "user", "content": prompt}],
+                timeout=clamp_timeout(LLM_TIMEOUT)
+            ) as stream:
+                async for text in stream.text_stream:
+                    emitted = True
+                    yield text
+                # 流结束后最终消息中才有完整的 usage
+                if usage is not None:
+                    final_message = await stream.get_final_message()
+                    usage.record("response", model, final_message.usage)
+
+        except DeadlineExceeded:
+            yield self._partial_response(plan, execution_result)
+        except Exception as e:
+            logger.error(f"Response streaming error: {e}")
+            # 已经输出部分内容时不再追加降级文本
+            if not emitted:
+                yield self._fallback_response(plan, execution_result)
+
+    def render_fast_response(
+        self,
+        plan: Dict[str, Any],
+        execution_result: Dict[str, Any]
+    ) -> Optional[str]:
+        """
+        快速路径：用计划中的 final_response_template 和技能结果在本地渲染回复
+
+        仅适用于单步骤、只读技能且执行成功的计划；模板缺失或引用了结果中
+        不存在的字段时返回None，由调用方降级到 generate_response。
+
+        Args:
+            plan: 执行计划
+            execution_result: 执行结果
+
+        Returns:
+            渲染后的回复文本，不满足条件时返回None
+        """
+        steps = plan.get("steps", [])
+        results = execution_result.get("results", [])
+        template = plan.get("final_response_template")
+
+        if len(steps) != 1 or len(results) != 1 or not template:
+            return None
+        if steps[0].get("skill") not in self.read_only_skills:
+            return None
+
+        step_result = results[0]
+        data = step_result.get("result")
+        if not step_result.get("success") or not isinstance(data, dict):
+            return None
+
+        try:
+            return _TemplateFormatter().format(template, **data).strip()
+        except (KeyError, IndexError, ValueError, AttributeError) as e:
+            logger.info(f"Fast path template not renderable ({e}), falling back to LLM")
+            return None
+
+    @staticmethod
+    def _model_routing(plan: Dict[str, Any], usage: UsageTracker, timings: Dict[str, float]) -> Dict[str, Any]:
+        """汇总本次请求的模型分级信息（规划级别、升级原因、回复模型及各自耗时）"""
+        routing = dict(plan.get("model_routing") or {})
+        response_usage = usage.stage("response")
+        if response_usage is not None:
+            routing["response_model"] = response_usage["model"]
+            routing["response_latency_ms"] = timings.get("response")
+        return routing
+
+    def _new_prefetch(self) -> Optional[SpeculativePrefetch]:
+        """为单个请求创建投机预取（未启用或没有可预取的技能时返回None）"""
+        if not self.speculative_prefetch or not self.prefetch_skills:
+            return None
+        return SpeculativePrefetch(self._call_skill, self.prefetch_skills, self.prefetch_stats)
+
+    async def process(
+        self,
+        user_input: str,
+        fast_path: Optional[bool] = None,
+        history: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         处理用户输入的完整流程
 
         Args:
             user_input: 用户输入
+            fast_path: 是否启用快速路径（None表示使用编排器默认设置）
+            history: 会话上下文（可选，注入规划提示词）
 
         Returns:
-            处理结果
+            处理结果（llm_usage 为按阶段统计的token与成本，prompt_compaction 为回复提示词压缩节省的token，
+            timings_ms 为各阶段耗时，model_routing 为规划/回复使用的模型，deadline_exceeded 表示回复阶段前请求截止时间已到、返回的是部分回复）
         """
-        start_time = datetime.now()
+        async for event in self._run(user_input, fast_path, history, stream=False):
+            pass
+        return {key: value for key, value in event.items() if key != "type"}
 
-        # 1. 分析意图
-        plan = self.analyze_intent(user_input)
+    async def process_stream(
+        self,
+        user_input: str,
+        fast_path: Optional[bool] = None,
+        history: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流式处理用户输入，按发生顺序产出进度事件
 
-        # 2. 执行计划
-        execution_result = self.execute_plan(plan)
+        事件类型：
+        - plan: 执行计划已生成
+        - step_start / step_end: 步骤开始/结束
+        - token: 回复文本片段
+        - done: 处理完成，内容与 process 的返回值相同
 
-        # 3. 生成响应
-        response = self.generate_response(user_input, plan, execution_result)
+        Args:
+            user_input: 用户输入
+            fast_path: 是否启用快速路径（None表示使用编排器默认设置）
+            history: 会话上下文（可选，注入规划提示词）
 
-        end_time = datetime.now()
-        execution_time = (end_time - start_time).total_seconds() * 1000
+        Yields:
+            事件字典（type字段为事件类型）
+        """
+        async for event in self._run(user_input, fast_path, history, stream=True):
+            yield event
 
-        return {
+    async def _run(
+        self,
+        user_input: str,
+        fast_path: Optional[bool],
+        history: Optional[str],
+        stream: bool
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        process / process_stream 共用的流程：规划、执行、生成回复，记录各阶段耗时和用量
+
+        只有回复生成不同：stream 为 True 时步骤事件经队列实时转发、回复按片段产出 token 事件，
+        否则直接执行计划、一次生成完整回复。最后产出 done 事件（内容即 process 的返回值）。
+        """
+        start_time = datetime.now()
+        if fast_path is None:
+            fast_path = self.fast_path
+        usage = UsageTracker()
+        timings: Dict[str, float] = {}
+
+        prefetch = self._new_prefetch()
+        try:
+            # 1. 分析意图（需要LLM规划时同时预取输入中实体对应的查询）
+            stage_start = time.perf_counter()
+            plan = await self.analyze_intent(user_input, usage, prefetch, history)
+            timings["plan"] = _elapsed_ms(stage_start)
+            yield {
+                "type": "plan",
+                "intent": plan.get("intent"),
+                "steps": plan.get("steps", []),
+                "error": plan.get("error")
+            }
+
+            # 2. 执行计划（流式处理时步骤事件经队列实时转发）
+            stage_start = time.perf_counter()
+            if stream:
+                events: asyncio.Queue = asyncio.Queue()
+
+                async def run_plan() -> Dict[str, Any]:
+                    try:
+                        return await self.execute_plan(plan, on_event=events.put_nowait, prefetch=prefetch)
+                    finally:
+                        events.put_nowait(None)
+
+                task = asyncio.create_task(run_plan())
+                try:
+                    while (event := await events.get()) is not None:
+                        yield event
+                    execution_result = await task
+                finally:
+                    if not task.done():
+                        task.cancel()
+            else:
+                execution_result = await self.execute_plan(plan, prefetch=prefetch)
+            timings["execute"] = _elapsed_ms(stage_start)
+        finally:
+            if prefetch is not None:
+                prefetch.discard()
+
+        # 3. 生成响应（快速路径命中时跳过第二次LLM调用；截止时间已到时返回部分回复）
+        deadline_exceeded = expired()
+        stage_start = time.perf_counter()
+        response = self.render_fast_response(plan, execution_result) if fast_path else None
+        used_fast_path = response is not None
+        if used_fast_path:
+            if stream:
+                yield {"type": "token", "text": response}
+        elif stream:
+            chunks = []
+            async for text in self.stream_response(user_input, plan, execution_result, usage):
+                chunks.append(text)
+                yield {"type": "token", "text": text}
+            response = "".join(chunks).strip()
+        else:
+            response = await self.generate_response(user_input, plan, execution_result, usage)
+        timings["response"] = _elapsed_ms(stage_start)
+
+        execution_time = (datetime.now() - start_time).total_seconds() * 1000
+
+        yield {
+            "type": "done",
             "success": execution_result.get("success", False),
             "response": response,
             "plan": plan,
             "execution_result": execution_result,
+            "fast_path": used_fast_path,
+            "deadline_exceeded": deadline_exceeded,
+            "model_routing": self._model_routing(plan, usage, timings),
+            "llm_usage": usage.summary(),
+            "prompt_compaction": usage.compaction,
+            "timings_ms": timings,
             "execution_time_ms": execution_time
         }
 
-
 if __name__ == "__main__":
     # 测试代码
     from dotenv import load_dotenv
@@ -401,7 +1135,7 @@ if __name__ == "__main__":
 
     # 测试单步骤
     print("\n测试1: 单步骤任务")
-    result = orchestrator.process("查询订单12345")
+    result = asyncio.run(orchestrator.process("查询订单12345"))
     print(f"响应: {result['response']}")
     print(f"执行时间: {result['execution_time_ms']:.0f}ms")
 
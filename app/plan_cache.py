@@ -0,0 +1,203 @@
+"""
+app/plan_cache.py - 参数化计划缓存
+
+同一种问法只是ID不同（"查询订单12345的状态" / "查询订单888的状态"）时，
+执行计划的结构完全相同。缓存以"去掉实体后的输入模板"为键：
+- 写入时把计划参数中的实体值替换为槽位标记
+- 命中时把本次输入的实体值重新绑定到槽位上
+这样同一问法只需调用一次LLM规划。
+"""
+from typing import Dict, Any, Optional, Tuple, Callable
+from collections import OrderedDict
+import copy
+import logging
+import re
+import threading
+import time
+
+from app.entities import extract_entities
+
+logger = logging.getLogger(__name__)
+
+_SLOT_MARKER_RE = re.compile(r"<<(\w+)>>")
+
+# 短于该长度的实体值（如产品ID "A"）只做整值替换，不在长文本中做子串替换
+_MIN_SUBSTRING_SLOT_LEN = 3
+
+
+class PlanCache:
+    """LRU + TTL 的参数化计划缓存"""
+
+    def __init__(
+        self,
+        max_size: int = 512,
+        ttl_seconds: float = 600.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        初始化计划缓存
+
+        Args:
+            max_size: 最多缓存的模板数（超出时淘汰最久未使用的）
+            ttl_seconds: 缓存有效期（秒）
+            clock: 时钟函数（测试时可替换）
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.uncacheable = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(user_input: str) -> Tuple[str, Dict[str, str]]:
+        """
+        把用户输入归一化为模板，并提取槽位值
+
+        Args:
+            user_input: 用户输入
+
+        Returns:
+            (模板, {槽位名: 实体值})，例如 ("查询订单<<order_id_0>>的状态", {"order_id_0": "12345"})
+        """
+        text = " ".join(user_input.split())
+        slots: Dict[str, str] = {}
+        counters: Dict[str, int] = {}
+        parts = []
+        last = 0
+        for entity in extract_entities(text):
+            index = counters.get(entity.kind, 0)
+            counters[entity.kind] = index + 1
+            slot = f"{entity.kind}_{index}"
+            slots[slot] = entity.value
+            parts.append(text[last:entity.start])
+            parts.append(f"<<{slot}>>")
+            last = entity.end
+        parts.append(text[last:])
+        return "".join(parts), slots
+
+    def get(self, user_input: str) -> Optional[Dict[str, Any]]:
+        """
+        查询缓存，命中时返回绑定了本次实体值的计划副本
+
+        Args:
+            user_input: 用户输入
+
+        Returns:
+            执行计划，未命中返回None
+        """
+        key, slots = self.make_key(user_input)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, template_plan = entry
+            if self._clock() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        return self._bind(template_plan, slots)
+
+    def put(self, user_input: str, plan: Dict[str, Any]) -> bool:
+        """
+        写入缓存
+
+        计划出错、或输入中的实体值没有原样出现在计划里（无法可靠地重新绑定）时不缓存。
+
+        Args:
+            user_input: 用户输入
+            plan: LLM生成的执行计划
+
+        Returns:
+            是否写入成功
+        """
+        if "error" in plan or not plan.get("steps"):
+            return False
+
+        key, slots = self.make_key(user_input)
+        used: set = set()
+        template_plan = self._parameterize(plan, slots, used)
+        if used != set(slots):
+            with self._lock:
+                self.uncacheable += 1
+            logger.debug(f"Plan not cacheable, unbound slots: {set(slots) - used}")
+            return False
+
+        with self._lock:
+            self._entries[key] = (self._clock(), template_plan)
+            self._entries.move_to_end(key)
+            self.stores += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return True
+
+    def clear(self) -> None:
+        """清空缓存（技能注册表变化时调用）"""
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计（供 /metrics 使用）"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "stores": self.stores,
+                "uncacheable": self.uncacheable,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
+
+    def _parameterize(self, value: Any, slots: Dict[str, str], used: set) -> Any:
+        """把计划中的实体值替换为槽位标记，used 记录实际用到的槽位"""
+        if isinstance(value, dict):
+            return {k: self._parameterize(v, slots, used) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._parameterize(v, slots, used) for v in value]
+        if not isinstance(value, str):
+            return value
+
+        for slot, slot_value in slots.items():
+            if value == slot_value:
+                used.add(slot)
+                return f"<<{slot}>>"
+        # 较长的实体值（订单号、物流单号）在描述、模板等文本中也做替换，长的优先；
+        # 要求前后不是字母数字，避免 "00012345" 中的 "12345" 被误当成槽位
+        for slot, slot_value in sorted(slots.items(), key=lambda item: -len(item[1])):
+            if len(slot_value) < _MIN_SUBSTRING_SLOT_LEN:
+                continue
+            pattern = rf"(?<![A-Za-z0-9]){re.escape(slot_value)}(?![A-Za-z0-9])"
+            value, count = re.subn(pattern, f"<<{slot}>>", value)
+            if count:
+                used.add(slot)
+        return value
+
+    def _bind(self, value: Any, slots: Dict[str, str]) -> Any:
+        """把槽位标记替换为本次的实体值（返回新对象，不修改缓存内容）"""
+        if isinstance(value, dict):
+            return {k: self._bind(v, slots) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._bind(v, slots) for v in value]
+        if isinstance(value, str):
+            return _SLOT_MARKER_RE.sub(lambda m: slots.get(m.group(1), m.group(0)), value)
+        return copy.deepcopy(value)
@@ -0,0 +1,182 @@
+"""
+app/plan_schema.py - 执行计划的工具定义与校验
+
+规划不再让LLM输出自由文本再用正则抽取JSON，而是通过 Messages API 的 tool use
+强制调用 submit_plan 工具提交计划：
+- 工具的 input_schema 由 register_skill 的技能元数据自动生成（技能名、参数、必填项）
+- 返回的计划用 pydantic 模型校验，技能参数按每个技能生成的模型校验
+"""
+from typing import Dict, Any, List, Optional, Type
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, create_model
+
+from app import json_codec
+
+PLAN_TOOL_NAME = "submit_plan"
+
+
+class PlanStep(BaseModel):
+    """计划中的一个步骤"""
+    step: int
+    skill: str
+    params: Dict[str, Any] = Field(default_factory=dict)
+    description: str = ""
+    depends_on: Optional[List[int]] = None
+
+
+class Plan(BaseModel):
+    """执行计划"""
+    intent: str
+    steps: List[PlanStep] = Field(default_factory=list)
+    final_response_template: Optional[str] = None
+    confidence: Optional[float] = Field(default=None, ge=0, le=1)
+
+
+class PlanValidationError(ValueError):
+    """计划不符合工具定义（技能不存在、缺少必填参数、多余参数...）"""
+
+
+class UnknownSkillError(PlanValidationError):
+    """计划引用了未注册的技能"""
+
+
+def required_params(parameters: Dict[str, str]) -> List[str]:
+    """必填参数：说明中不含"可选"的参数"""
+    return [name for name, desc in parameters.items() if "可选" not in desc]
+
+
+def build_params_model(skill: str, parameters: Dict[str, str]) -> Type[BaseModel]:
+    """
+    为技能生成参数校验模型
+
+    参数值可以是字面量，也可以是 "$字段名" 引用，所以不限制类型，只校验必填项和多余参数。
+
+    Args:
+        skill: 技能名称
+        parameters: 参数说明 {"param_name": "param_description"}
+
+    Returns:
+        pydantic 模型类
+    """
+    required = set(required_params(parameters))
+    fields = {
+        name: (Any, ... if name in required else None)
+        for name in parameters
+    }
+    return create_model(f"{skill}_params", __config__=ConfigDict(extra="forbid"), **fields)
+
+
+def build_plan_tool(skills: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    根据技能目录生成 submit_plan 工具定义
+
+    Args:
+        skills: {技能名: {"description": 描述, "parameters": 参数说明}}
+
+    Returns:
+        messages.create 的 tools 列表中的一项
+    """
+    step_variants = []
+    for name, meta in skills.items():
+        parameters = meta["parameters"]
+        step_variants.append({
+            "type": "object",
+            "description": meta["description"],
+            "properties": {
+                "step": {"type": "integer", "description": "步骤序号，从1开始"},
+                "skill": {"type": "string", "enum": [name]},
+                "params": {
+                    "type": "object",
+                    "properties": {param: {"description": desc} for param, desc in parameters.items()},
+                    "required": required_params(parameters),
+                    "additionalProperties": False
+                },
+                "description": {"type": "string", "description": "这一步做什么"},
+                "depends_on": {"type": "array", "items": {"type": "integer"}, "description": "依赖的步骤序号"}
+            },
+            "required": ["step", "skill", "params"]
+        })
+
+    return {
+        "name": PLAN_TOOL_NAME,
+        "description": "提交执行计划。每个步骤调用一个已注册的技能。",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "intent": {"type": "string", "description": "用户意图的简短描述"},
+                "steps": {"type": "array", "items": {"anyOf": step_variants}},
+                "final_response_template": {
+                    "type": "string",
+                    "description": "给用户的回复模板，可用 {字段名} 引用最后一步技能返回结果中的字段"
+                },
+                "confidence": {
+                    "type": "number",
+                    "minimum": 0,
+                    "maximum": 1,
+                    "description": "对计划正确性的把握（0-1），请求含义不明确或技能难以匹配时给出较低的值"
+                }
+            },
+            "required": ["intent", "steps"]
+        }
+    }
+
+
+def validate_plan(data: Any, params_models: Dict[str, Type[BaseModel]]) -> Dict[str, Any]:
+    """
+    校验LLM提交的计划
+
+    Args:
+        data: 工具调用的 input（或从文本中解析出的JSON）
+        params_models: {技能名: 参数校验模型}
+
+    Returns:
+        规范化后的计划字典（与原有计划格式相同）
+
+    Raises:
+        PlanValidationError: 计划不合法，消息可直接反馈给LLM修正
+    """
+    try:
+        plan = Plan.model_validate(data)
+    except ValidationError as e:
+        raise PlanValidationError(_format_errors(e)) from None
+
+    steps = []
+    for step in plan.steps:
+        model = params_models.get(step.skill)
+        if model is None:
+            raise UnknownSkillError(f"步骤{step.step}: 技能不存在: {step.skill}")
+        try:
+            params = model.model_validate(step.params)
+        except ValidationError as e:
+            raise PlanValidationError(f"步骤{step.step}（{step.skill}）参数错误: {_format_errors(e)}") from None
+
+        step_dict = {
+            "step": step.step,
+            "skill": step.skill,
+            "params": params.model_dump(exclude_unset=True),
+            "description": step.description
+        }
+        if step.depends_on:
+            step_dict["depends_on"] = step.depends_on
+        steps.append(step_dict)
+
+    result: Dict[str, Any] = {"intent": plan.intent, "steps": steps}
+    if plan.final_response_template:
+        result["final_response_template"] = plan.final_response_template
+    if plan.confidence is not None:
+        result["confidence"] = plan.confidence
+    return result
+
+
+def _format_errors(error: ValidationError) -> str:
+    """把 pydantic 错误整理为简短的中文说明"""
+    messages = []
+    for item in error.errors():
+        location = ".".join(str(part) for part in item["loc"]) or "计划"
+        if item["type"] == "missing":
+            messages.append(f"缺少 {location}")
+        elif item["type"] == "extra_forbidden":
+            messages.append(f"不支持的参数 {location}")
+        else:
+            messages.append(f"{location}: {item['msg']}（收到 {json_codec.dumps(item.get('input'))[:50]}）")
+    return "；".join(messages)
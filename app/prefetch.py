@@ -0,0 +1,139 @@
+"""
+app/prefetch.py - 规划期间的投机预取
+
+LLM规划需要1~3秒，期间执行器空闲。而输入里往往已经有明确的订单号、物流单号、产品ID：
+- 规划开始时从原始输入中抽取实体，并发调用对应的只读技能
+- execute_plan 遇到参数相同的步骤时直接使用预取结果（还没返回就等它返回）
+- 计划没用到的结果在请求结束时丢弃，计入浪费的调用
+"""
+from typing import Dict, Any, Tuple, Callable, Awaitable
+import asyncio
+import logging
+import threading
+
+from app.entities import extract_entities
+from app.skill_cache import MISS
+
+logger = logging.getLogger(__name__)
+
+SkillCaller = Callable[[str, Dict[str, Any]], Awaitable[Any]]
+
+
+class PrefetchStats:
+    """预取统计（所有请求累计）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.launched = 0
+        self.used = 0
+        self.wasted = 0
+        self.failed = 0
+
+    def add(self, **counts: int) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def stats(self) -> Dict[str, Any]:
+        """预取统计（供 /metrics 使用）"""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "launched": self.launched,
+                "used": self.used,
+                "wasted": self.wasted,
+                "failed": self.failed,
+                "hit_rate": self.used / self.launched if self.launched else 0.0
+            }
+
+
+class SpeculativePrefetch:
+    """单个请求的投机预取"""
+
+    def __init__(
+        self,
+        call_skill: SkillCaller,
+        skills: Dict[str, str],
+        stats: PrefetchStats,
+        max_calls: int = 4
+    ):
+        """
+        Args:
+            call_skill: 调用技能的协程函数 (name, params) -> result
+            skills: 可预取的技能 {技能名: 实体类型}（实体类型即技能唯一的参数名）
+            stats: 累计统计
+            max_calls: 单个请求最多预取的调用数
+        """
+        self._call_skill = call_skill
+        self._skills = skills
+        self._stats = stats
+        self._max_calls = max_calls
+        self._tasks: Dict[Tuple[str, str, str], asyncio.Task] = {}
+
+    def start(self, user_input: str) -> int:
+        """
+        从输入中抽取实体，启动对应技能的预取
+
+        Args:
+            user_input: 用户输入
+
+        Returns:
+            启动的预取调用数
+        """
+        for entity in extract_entities(user_input):
+            for skill, kind in self._skills.items():
+                if kind != entity.kind:
+                    continue
+                key = (skill, kind, entity.value)
+                if key in self._tasks or len(self._tasks) >= self._max_calls:
+                    continue
+                task = asyncio.create_task(self._call_skill(skill, {kind: entity.value}))
+                task.add_done_callback(_retrieve_exception)
+                self._tasks[key] = task
+
+        if self._tasks:
+            self._stats.add(requests=1, launched=len(self._tasks))
+            logger.info(f"Prefetching {len(self._tasks)} skill calls: {[key[0] for key in self._tasks]}")
+        return len(self._tasks)
+
+    async def take(self, skill: str, params: Dict[str, Any]) -> Any:
+        """
+        取出与计划步骤匹配的预取结果（每个结果只能取一次）
+
+        Args:
+            skill: 技能名称
+            params: 解析后的步骤参数
+
+        Returns:
+            预取结果；没有匹配的预取或预取失败时返回 MISS，由调用方正常调用技能
+        """
+        if len(params) != 1:
+            return MISS
+        (kind, value), = params.items()
+        task = self._tasks.pop((skill, kind, str(value)), None)
+        if task is None:
+            return MISS
+        try:
+            result = await task
+        except Exception as e:
+            logger.warning(f"Prefetch {skill}({value}) failed: {e}")
+            self._stats.add(failed=1)
+            return MISS
+        self._stats.add(used=1)
+        return result
+
+    def discard(self) -> None:
+        """丢弃所有未使用的预取结果（请求结束时，或计划中执行写操作前）"""
+        if not self._tasks:
+            return
+        for task in self._tasks.values():
+            task.cancel()
+        self._stats.add(wasted=len(self._tasks))
+        self._tasks.clear()
+
+
+def _retrieve_exception(task: asyncio.Task) -> None:
+    """取走被丢弃任务的异常，避免 "Task exception was never retrieved" 警告"""
+    if not task.cancelled():
+        task.exception()
@@ -0,0 +1,279 @@
+"""
+app/resilience.py - 技能HTTP调用的重试与熔断
+
+上游系统故障时，每个请求都要等满超时才返回"无法连接"，占住工作线程和事件循环任务：
+- 幂等的 GET 请求遇到连接错误、超时或 502/503/504 时按指数退避（带随机抖动）重试
+- 每个上游（ORDER_API_BASE / INVENTORY_API_BASE / LOGISTICS_API_BASE）一个熔断器：
+  连续失败达到阈值后打开，打开期间直接失败；冷却时间过后进入半开状态放行少量探测请求，
+  探测成功则关闭，失败则重新打开；探测请求被取消或因截止时间中止时归还探测名额
+"""
+from typing import Dict, Any, Awaitable, Callable, Optional
+import asyncio
+import logging
+import random
+import threading
+import time
+
+import httpx
+
+from app.deadline import DeadlineExceeded, remaining
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# 可以重试的方法和状态码
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+RETRYABLE_STATUS = (502, 503, 504)
+
+
+class CircuitOpenError(httpx.ConnectError):
+    """熔断器打开，请求未发出（按连接失败处理，复用技能流程中的"无法连接"分支）"""
+
+
+class CircuitBreaker:
+    """单个上游的熔断器（线程安全：同步技能在线程池中调用）"""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        初始化熔断器
+
+        Args:
+            name: 上游名称（地址）
+            failure_threshold: 连续失败多少次后打开
+            recovery_timeout: 打开后多久进入半开状态（秒）
+            half_open_max_calls: 半开状态同时放行的探测请求数
+            clock: 时钟函数（测试中可替换）
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._half_open_round = 0  # 每次进入半开状态加一，归还探测名额时核对
+        self.consecutive_failures = 0
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == STATE_OPEN and self._clock() - self._opened_at >= self.recovery_timeout:
+            self._state = STATE_HALF_OPEN
+            self._half_open_calls = 0
+            self._half_open_round += 1
+        return self._state
+
+    def before_call(self) -> Optional[int]:
+        """
+        请求前检查
+
+        Returns:
+            半开状态下占用的探测名额（请求结束后交给 release_probe），关闭状态返回None
+
+        Raises:
+            CircuitOpenError: 熔断器打开（或半开状态的探测名额已用完）
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == STATE_CLOSED:
+                return None
+            if state == STATE_HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return self._half_open_round
+            self.rejected += 1
+        raise CircuitOpenError(f"上游 {self.name} 熔断中")
+
+    def release_probe(self, probe: Optional[int]) -> None:
+        """
+        请求结束时调用：探测请求没有记录成功或失败（被取消、请求截止时间已到）时归还探测名额
+
+        记录过结果的探测会让熔断器离开半开状态，这里不再处理；
+        否则熔断器会一直停在半开状态，拒绝之后的所有请求。
+        """
+        if probe is None:
+            return
+        with self._lock:
+            if self._state == STATE_HALF_OPEN and self._half_open_round == probe and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != STATE_CLOSED:
+                logger.info(f"Circuit closed: {self.name}")
+            self._state = STATE_CLOSED
+            self.consecutive_failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            if self._state == STATE_HALF_OPEN or (
+                self._state == STATE_CLOSED and self.consecutive_failures >= self.failure_threshold
+            ):
+                logger.warning(f"Circuit opened: {self.name} ({self.consecutive_failures} consecutive failures)")
+                self._state = STATE_OPEN
+                self._opened_at = self._clock()
+                self.times_opened += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self.consecutive_failures,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected
+            }
+
+
+class ResilienceManager:
+    """按上游管理熔断器，执行带重试的HTTP请求"""
+
+    def __init__(
+        self,
+        max_retries: int = 2,
+        base_delay: float = 0.1,
+        max_delay: float = 1.0,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0
+    ):
+        """
+        初始化重试与熔断配置
+
+        Args:
+            max_retries: 幂等请求的最大重试次数
+            base_delay: 第一次重试前的退避上限（秒），之后每次翻倍
+            max_delay: 单次退避的最大值（秒）
+            failure_threshold: 熔断器连续失败阈值
+            recovery_timeout: 熔断器打开后的冷却时间（秒）
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._retries: Dict[str, int] = {}
+        self._rng = random.Random()
+
+    def breaker(self, upstream: str) -> CircuitBreaker:
+        """上游对应的熔断器"""
+        upstream = upstream.rstrip("/")
+        with self._lock:
+            breaker = self._breakers.get(upstream)
+            if breaker is None:
+                breaker = CircuitBreaker(upstream, self.failure_threshold, self.recovery_timeout)
+                self._breakers[upstream] = breaker
+            return breaker
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次重试前的等待时间（指数退避 + 全抖动）"""
+        return self._rng.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def execute(self, upstream: str, method: str, send: Callable[[], httpx.Response]) -> httpx.Response:
+        """同步执行请求（重试 + 熔断）"""
+        breaker = self.breaker(upstream)
+        attempt = 0
+        while True:
+            probe = breaker.before_call()
+            try:
+                response = send()
+            except httpx.TransportError as e:
+                delay = self._on_error(upstream, breaker, method, attempt, e)
+            else:
+                delay = self._on_response(upstream, breaker, method, attempt, response)
+                if delay is None:
+                    return response
+            finally:
+                # 被取消（CancelledError）或截止时间已到时没有记录结果，归还探测名额
+                breaker.release_probe(probe)
+            time.sleep(delay)
+            attempt += 1
+
+    async def aexecute(self, upstream: str, method: str, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        """异步执行请求（重试 + 熔断），退避期间不阻塞事件循环"""
+        breaker = self.breaker(upstream)
+        attempt = 0
+        while True:
+            probe = breaker.before_call()
+            try:
+                response = await send()
+            except httpx.TransportError as e:
+                delay = self._on_error(upstream, breaker, method, attempt, e)
+            else:
+                delay = self._on_response(upstream, breaker, method, attempt, response)
+                if delay is None:
+                    return response
+            finally:
+                # 被取消（CancelledError）或截止时间已到时没有记录结果，归还探测名额
+                breaker.release_probe(probe)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _on_error(self, upstream: str, breaker: CircuitBreaker, method: str, attempt: int, error: Exception) -> float:
+        """请求异常：记录失败，可以重试时返回退避时间，否则重新抛出"""
+        if isinstance(error.__cause__, DeadlineExceeded):
+            # 请求截止时间已到，请求没有发出，不算上游故障
+            raise error
+        breaker.record_failure()
+        delay = self._retry_delay(upstream, method, attempt)
+        if delay is None:
+            raise error
+        logger.warning(f"Retrying {method} {upstream} after {type(error).__name__} (attempt {attempt + 1})")
+        return delay
+
+    def _on_response(self, upstream: str, breaker: CircuitBreaker, method: str, attempt: int, response: httpx.Response) -> Optional[float]:
+        """收到响应：5xx记为失败，可重试的状态码返回退避时间，否则返回None"""
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        if response.status_code not in RETRYABLE_STATUS:
+            return None
+        delay = self._retry_delay(upstream, method, attempt)
+        if delay is not None:
+            logger.warning(f"Retrying {method} {upstream} after HTTP {response.status_code} (attempt {attempt + 1})")
+        return delay
+
+    def _retry_delay(self, upstream: str, method: str, attempt: int) -> Optional[float]:
+        """是否重试：幂等方法、未超过次数、退避后仍在请求截止时间之内"""
+        if method.upper() not in IDEMPOTENT_METHODS or attempt >= self.max_retries:
+            return None
+        delay = self.backoff(attempt)
+        left = remaining()
+        if left is not None and left <= delay:
+            return None
+        with self._lock:
+            self._retries[upstream.rstrip("/")] = self._retries.get(upstream.rstrip("/"), 0) + 1
+        return delay
+
+    def stats(self) -> Dict[str, Any]:
+        """各上游的熔断状态和重试次数（供 /metrics 使用）"""
+        with self._lock:
+            breakers = dict(self._breakers)
+            retries = dict(self._retries)
+        return {
+            "max_retries": self.max_retries,
+            "failure_threshold": self.failure_threshold,
+            "recovery_timeout": self.recovery_timeout,
+            "upstreams": {
+                upstream: {**breaker.stats(), "retries": retries.get(upstream, 0)}
+                for upstream, breaker in breakers.items()
+            }
+        }
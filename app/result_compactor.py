@@ -0,0 +1,169 @@
+"""
+app/result_compactor.py - 回复提示词的执行结果压缩
+
+generate_response 原来把完整的执行结果 json.dumps(indent=2) 放进提示词：
+物流的全部 history、客户的全部订单、整份报表数据都会计入输入token，拖慢回复。
+压缩分三步：
+1. 按技能投影：只保留回答问题需要的字段（register_skill 时声明，未声明的技能保留全部字段）
+2. 截断长列表（保留开头和最后一条，中间注明省略条数）和长文本
+3. 整体超出token预算时逐级收紧截断，最后硬截断
+"""
+from typing import Dict, Any, List, Optional, Union
+import math
+import threading
+
+from app import json_codec
+
+# 投影规则：字段名列表；元素也可以是 {字段名: 子规则}，对嵌套对象（或对象列表的每一项）继续投影
+Projection = List[Union[str, Dict[str, Any]]]
+
+# 投影时始终保留的字段
+ALWAYS_KEEP = ("success", "error", "message")
+
+# 逐级收紧的截断参数：(列表最多保留条数, 文本最大长度)
+COMPACTION_LEVELS = ((5, 200), (3, 100), (1, 60), (0, 40))
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数（UTF-8字节数 / 4，与 fake_llm_server 的估算一致）"""
+    return max(1, math.ceil(len(text.encode("utf-8")) / 4)) if text else 0
+
+
+def project(value: Any, projection: Optional[Projection]) -> Any:
+    """
+    按投影规则保留字段
+
+    Args:
+        value: 技能返回结果
+        projection: 投影规则（None表示不投影）
+
+    Returns:
+        投影后的新对象
+    """
+    if projection is None:
+        return value
+    if isinstance(value, list):
+        return [project(item, projection) for item in value]
+    if not isinstance(value, dict):
+        return value
+
+    result = {key: value[key] for key in ALWAYS_KEEP if key in value}
+    for field in projection:
+        if isinstance(field, dict):
+            for name, sub_projection in field.items():
+                if name in value:
+                    result[name] = project(value[name], sub_projection)
+        elif field in value:
+            result[field] = value[field]
+    return result
+
+
+def truncate(value: Any, max_items: int, max_str_len: int) -> Any:
+    """
+    截断长列表和长文本
+
+    列表超过 max_items 条时保留前 max_items-1 条和最后一条（物流轨迹等最新的一条通常在最后），
+    中间用说明文字注明省略的条数。
+
+    Args:
+        value: 任意JSON值
+        max_items: 列表最多保留的条数
+        max_str_len: 文本最大长度
+
+    Returns:
+        截断后的新对象
+    """
+    if isinstance(value, dict):
+        return {key: truncate(item, max_items, max_str_len) for key, item in value.items()}
+    if isinstance(value, list):
+        if len(value) <= max_items:
+            return [truncate(item, max_items, max_str_len) for item in value]
+        note = f"...（共{len(value)}条，省略{len(value) - max_items}条）"
+        if max_items == 0:
+            return [note]
+        kept = value[:max_items - 1]
+        return [truncate(item, max_items, max_str_len) for item in kept] + [note, truncate(value[-1], max_items, max_str_len)]
+    if isinstance(value, str) and len(value) > max_str_len:
+        return value[:max_str_len] + "..."
+    return value
+
+
+class ResultCompactor:
+    """执行结果压缩器（累计节省的token数）"""
+
+    def __init__(self, token_budget: int = 1500):
+        """
+        初始化结果压缩器
+
+        Args:
+            token_budget: 提示词中"详细数据"部分的token上限
+        """
+        self.token_budget = token_budget
+        self.projections: Dict[str, Projection] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.original_tokens = 0
+        self.compacted_tokens = 0
+
+    def set_projection(self, skill: str, projection: Optional[Projection]) -> None:
+        """设置技能结果的投影规则（None表示保留全部字段）"""
+        if projection is None:
+            self.projections.pop(skill, None)
+        else:
+            self.projections[skill] = projection
+
+    def compact(self, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        压缩执行结果
+
+        Args:
+            results: execution_result["results"]
+
+        Returns:
+            {"text": 压缩后的JSON文本, "original_tokens": 原始token数,
+             "compacted_tokens": 压缩后token数, "saved_tokens": 节省的token数}
+        """
+        original_tokens = estimate_tokens(json_codec.dumps(results, indent=True))
+
+        projected = []
+        for entry in results:
+            entry = dict(entry)
+            if "result" in entry:
+                entry["result"] = project(entry["result"], self.projections.get(entry.get("skill")))
+            projected.append(entry)
+
+        text = ""
+        for max_items, max_str_len in COMPACTION_LEVELS:
+            text = json_codec.dumps(truncate(projected, max_items, max_str_len))
+            if estimate_tokens(text) <= self.token_budget:
+                break
+        else:
+            # 仍超出预算：按字节比例硬截断
+            max_chars = max(0, len(text) * self.token_budget // estimate_tokens(text))
+            text = text[:max_chars] + "...（数据过长已截断）"
+
+        compacted_tokens = estimate_tokens(text)
+        with self._lock:
+            self.requests += 1
+            self.original_tokens += original_tokens
+            self.compacted_tokens += compacted_tokens
+
+        return {
+            "text": text,
+            "original_tokens": original_tokens,
+            "compacted_tokens": compacted_tokens,
+            "saved_tokens": max(0, original_tokens - compacted_tokens)
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """压缩统计（供 /metrics 使用）"""
+        with self._lock:
+            saved = max(0, self.original_tokens - self.compacted_tokens)
+            return {
+                "token_budget": self.token_budget,
+                "requests": self.requests,
+                "original_tokens": self.original_tokens,
+                "compacted_tokens": self.compacted_tokens,
+                "saved_tokens": saved,
+                "savings_rate": saved / self.original_tokens if self.original_tokens else 0.0
+            }
@@ -0,0 +1,184 @@
+"""
+app/rule_router.py - 规则预路由
+
+在LLM规划之前，用正则和关键词识别意图明确的高频查询（"订单12345"、"产品A库存"、
+"SF1234567890到哪了"...），直接生成单步骤计划，省掉一次LLM往返。
+
+规则由 register_skill 的元数据生成：只读技能 + 唯一必填参数是可识别的实体类型 +
+声明了路由关键词。拿不准的请求一律交给LLM。
+"""
+from typing import Dict, Any, List, Optional, NamedTuple, Tuple
+from collections import deque
+import logging
+import re
+import threading
+
+from app.entities import ENTITY_PATTERNS, extract_entities
+
+logger = logging.getLogger(__name__)
+
+# 出现这些词说明是写操作或多步骤任务，不走规则
+BLOCK_KEYWORDS: Tuple[str, ...] = (
+    "取消", "修改", "更新", "改成", "创建", "审批", "批准", "发送", "邮件", "通知",
+    "道歉", "补偿", "然后", "并且", "同时", "如果", "为什么", "怎么办"
+)
+
+_BLOCK_RE = re.compile("|".join(re.escape(k) for k in BLOCK_KEYWORDS))
+
+
+class RouteRule(NamedTuple):
+    """单个技能的路由规则"""
+    skill: str
+    description: str
+    param: str
+    keywords: Tuple[str, ...]
+    response_template: Optional[str]
+
+
+class RuleRouter:
+    """基于规则的意图预路由"""
+
+    def __init__(self):
+        self.rules: Dict[str, RouteRule] = {}
+        self._keyword_re: Optional[re.Pattern] = None
+        self._keyword_owners: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self.total = 0
+        self.routed = 0
+        self.routed_by_skill: Dict[str, int] = {}
+        self.recent_misses: deque = deque(maxlen=20)  # 最近未命中的输入，用于补充规则
+
+    def add_skill(
+        self,
+        name: str,
+        description: str,
+        parameters: Optional[Dict[str, str]] = None,
+        keywords: Optional[List[str]] = None,
+        response_template: Optional[str] = None,
+        read_only: bool = False
+    ) -> bool:
+        """
+        根据技能元数据生成路由规则（register_skill 时调用）
+
+        Args:
+            name: 技能名称
+            description: 技能描述（作为计划的intent）
+            parameters: 参数说明，说明中含"可选"的参数视为非必填
+            keywords: 路由关键词
+            response_template: 计划的 final_response_template
+            read_only: 是否为只读技能
+
+        Returns:
+            是否生成了规则（不满足条件时移除该技能已有的规则）
+        """
+        required = [p for p, desc in (parameters or {}).items() if "可选" not in desc]
+        routable = read_only and keywords and len(required) == 1 and required[0] in ENTITY_PATTERNS
+
+        with self._lock:
+            if routable:
+                self.rules[name] = RouteRule(name, description, required[0], tuple(keywords), response_template)
+            else:
+                self.rules.pop(name, None)
+            self._keyword_re = None  # 下次路由时重新编译
+        return bool(routable)
+
+    def _compile(self) -> None:
+        """把所有规则的关键词编译为一个正则（长词优先）"""
+        owners: Dict[str, set] = {}
+        for rule in self.rules.values():
+            for keyword in rule.keywords:
+                owners.setdefault(keyword, set()).add(rule.skill)
+        self._keyword_owners = owners
+        if owners:
+            alternation = "|".join(re.escape(k) for k in sorted(owners, key=len, reverse=True))
+            self._keyword_re = re.compile(alternation)
+        else:
+            self._keyword_re = re.compile(r"(?!)")
+
+    def route(self, user_input: str) -> Optional[Dict[str, Any]]:
+        """
+        尝试用规则生成执行计划
+
+        只有在输入恰好包含一个实体、命中的关键词全部属于同一个技能、且该技能的参数
+        正好是这个实体类型时才路由。
+
+        Args:
+            user_input: 用户输入
+
+        Returns:
+            执行计划，无法确定时返回None（交给LLM）
+        """
+        with self._lock:
+            self.total += 1
+            if self._keyword_re is None:
+                self._compile()
+            keyword_re, owners, rules = self._keyword_re, self._keyword_owners, self.rules
+
+        match = self._match(user_input, keyword_re, owners, rules)
+        if match is None:
+            with self._lock:
+                self.recent_misses.append(user_input)
+            return None
+
+        rule, entity_value = match
+        with self._lock:
+            self.routed += 1
+            self.routed_by_skill[rule.skill] = self.routed_by_skill.get(rule.skill, 0) + 1
+
+        plan = {
+            "intent": rule.description,
+            "steps": [{
+                "step": 1,
+                "skill": rule.skill,
+                "params": {rule.param: entity_value},
+                "description": rule.description
+            }],
+            "plan_source": "rule"
+        }
+        if rule.response_template:
+            plan["final_response_template"] = rule.response_template
+        return plan
+
+    @staticmethod
+    def _match(
+        user_input: str,
+        keyword_re: re.Pattern,
+        owners: Dict[str, set],
+        rules: Dict[str, RouteRule]
+    ) -> Optional[Tuple[RouteRule, str]]:
+        """返回唯一匹配的规则和实体值"""
+        if _BLOCK_RE.search(user_input):
+            return None
+
+        entities = extract_entities(user_input)
+        if len(entities) != 1:
+            return None
+
+        matched_keywords = {m.group() for m in keyword_re.finditer(user_input)}
+        if not matched_keywords:
+            return None
+
+        candidates = {
+            name for name, rule in rules.items()
+            if rule.param == entities[0].kind and matched_keywords & set(rule.keywords)
+        }
+        if len(candidates) != 1:
+            return None
+
+        # 命中了其他技能独有的关键词（如"订单12345的物流"），说明是组合意图
+        skill = candidates.pop()
+        if any(skill not in owners[keyword] for keyword in matched_keywords):
+            return None
+        return rules[skill], entities[0].value
+
+    def stats(self) -> Dict[str, Any]:
+        """路由统计（供 /metrics 使用），coverage 为规则路由的请求占比"""
+        with self._lock:
+            return {
+                "rules": len(self.rules),
+                "total": self.total,
+                "routed": self.routed,
+                "coverage": self.routed / self.total if self.total else 0.0,
+                "routed_by_skill": dict(self.routed_by_skill),
+                "recent_misses": list(self.recent_misses)
+            }
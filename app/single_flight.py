@@ -0,0 +1,140 @@
+"""
+app/single_flight.py - 相同只读技能调用的请求合并（single-flight）
+
+故障或大促期间，大量并发对话查询同一个订单、商品或运单号，每个请求都各自发一次GET。
+合并后同一个键（技能 + 上游 + 参数）同时只有一个请求在执行，其余调用等待并共享它的解析结果：
+- 同步调用（线程池中执行）通过 concurrent.futures.Future 等待
+- 异步调用在当前事件循环上共享一个 Task（Task 不随某个调用方取消而取消）
+上游QPS因此与不同键的数量相当，而不是与并发用户数相当。
+只合并正在执行的请求，不缓存已完成的结果（短期缓存见 app/skill_cache.py）。
+"""
+from typing import Dict, Any, Awaitable, Callable, Hashable, Tuple
+import asyncio
+import concurrent.futures
+import copy
+import threading
+
+
+class SingleFlight:
+    """按键合并并发中的相同调用（线程安全）"""
+
+    def __init__(self, enabled: bool = True):
+        """
+        初始化请求合并
+
+        Args:
+            enabled: 是否启用（关闭时每次调用都直接执行）
+        """
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, concurrent.futures.Future] = {}
+        self._async_calls: Dict[Tuple[Hashable, asyncio.AbstractEventLoop], asyncio.Task] = {}
+        self._executed: Dict[str, int] = {}
+        self._collapsed: Dict[str, int] = {}
+
+    @staticmethod
+    def _name(key: Hashable) -> str:
+        """统计用的名称（键的第一个元素，如技能方法名）"""
+        return str(key[0]) if isinstance(key, tuple) and key else str(key)
+
+    def _count(self, counter: Dict[str, int], key: Hashable) -> None:
+        name = self._name(key)
+        counter[name] = counter.get(name, 0) + 1
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        同步执行：同一个键已有调用在执行时等待它的结果，否则由当前线程执行
+
+        Args:
+            key: 合并键
+            fn: 实际执行的调用
+
+        Returns:
+            调用结果（等待方拿到的是副本，避免多个请求修改同一个对象）
+        """
+        if not self.enabled:
+            return fn()
+
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = concurrent.futures.Future()
+                self._calls[key] = future
+                self._count(self._executed, key)
+            else:
+                self._count(self._collapsed, key)
+
+        if not leader:
+            return copy.deepcopy(future.result())
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        异步执行：同一事件循环上相同键的调用共享一个 Task
+
+        某个调用方被取消（如步骤超时）不会取消共享的 Task，其余调用方照常拿到结果。
+
+        Args:
+            key: 合并键
+            fn: 返回协程的函数
+
+        Returns:
+            调用结果（等待方拿到的是副本）
+        """
+        if not self.enabled:
+            return await fn()
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            task = self._async_calls.get((key, loop))
+            leader = task is None
+            if leader:
+                task = loop.create_task(fn())
+                self._async_calls[(key, loop)] = task
+                task.add_done_callback(lambda done: self._finish(key, loop, done))
+                self._count(self._executed, key)
+            else:
+                self._count(self._collapsed, key)
+
+        result = await asyncio.shield(task)
+        return result if leader else copy.deepcopy(result)
+
+    def _finish(self, key: Hashable, loop: asyncio.AbstractEventLoop, task: asyncio.Task) -> None:
+        """Task 完成后移除，并取出异常（所有调用方都已取消时避免"异常未被获取"的警告）"""
+        with self._lock:
+            if self._async_calls.get((key, loop)) is task:
+                del self._async_calls[(key, loop)]
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        """合并统计（供 /metrics 使用）：executed 为实际执行次数，collapsed 为被合并的调用数"""
+        with self._lock:
+            names = sorted(set(self._executed) | set(self._collapsed))
+            by_name = {
+                name: {"executed": self._executed.get(name, 0), "collapsed": self._collapsed.get(name, 0)}
+                for name in names
+            }
+            in_flight = len(self._calls) + len(self._async_calls)
+        executed = sum(entry["executed"] for entry in by_name.values())
+        collapsed = sum(entry["collapsed"] for entry in by_name.values())
+        return {
+            "enabled": self.enabled,
+            "executed": executed,
+            "collapsed": collapsed,
+            "collapse_rate": round(collapsed / (executed + collapsed), 4) if executed + collapsed else 0.0,
+            "in_flight": in_flight,
+            "by_skill": by_name
+        }
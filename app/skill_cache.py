@@ -0,0 +1,234 @@
+"""
+app/skill_cache.py - 技能结果缓存
+
+只读技能（查订单、查库存、查促销、查客户...）在短时间内被反复调用时，
+直接复用上一次的结果，不再请求上游API。
+- 可缓存的技能在注册时声明TTL和键函数（默认按技能的参数取值作为键）
+- 写操作技能声明会让哪些技能的缓存失效，执行后按参数精确失效，参数不足时整个技能失效
+- 所有技能共用一个LRU，总条目数有上限
+"""
+from typing import Dict, Any, Optional, Tuple, Callable, List, Hashable
+from collections import OrderedDict
+import copy
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+KeyFunc = Callable[[Dict[str, Any]], Hashable]
+
+MISS = object()  # get 未命中时返回的哨兵值
+
+
+class _SkillPolicy:
+    """单个技能的缓存策略和统计"""
+
+    def __init__(self, ttl_seconds: float, key_func: KeyFunc):
+        self.ttl_seconds = ttl_seconds
+        self.key_func = key_func
+        self.generation = 0  # 每次失效加一，避免失效前发出的请求把旧结果写回缓存
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.invalidations = 0
+
+
+class SkillCache:
+    """LRU + 按技能TTL 的技能结果缓存"""
+
+    def __init__(self, max_size: int = 2048, clock: Callable[[], float] = time.monotonic):
+        """
+        初始化技能结果缓存
+
+        Args:
+            max_size: 所有技能合计最多缓存的结果数（超出时淘汰最久未使用的）
+            clock: 时钟函数（测试时可替换）
+        """
+        self.max_size = max_size
+        self._clock = clock
+        self._policies: Dict[str, _SkillPolicy] = {}
+        self._invalidates: Dict[str, List[str]] = {}
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def param_key(param_names: List[str]) -> KeyFunc:
+        """默认键函数：按参数名顺序取参数值"""
+        names = tuple(param_names)
+        return lambda params: tuple(_freeze(params.get(name)) for name in names)
+
+    def register(
+        self,
+        name: str,
+        param_names: List[str],
+        ttl_seconds: Optional[float] = None,
+        key_func: Optional[KeyFunc] = None,
+        invalidates: Optional[List[str]] = None
+    ) -> None:
+        """
+        登记技能的缓存策略（重复注册时覆盖，并清掉该技能已缓存的结果）
+
+        Args:
+            name: 技能名称
+            param_names: 技能参数名（默认键函数和按参数失效都用它）
+            ttl_seconds: 结果有效期（秒），None表示不缓存
+            key_func: 自定义键函数 params -> 可哈希值
+            invalidates: 执行后需要失效的技能名称列表（写操作技能使用）
+        """
+        with self._lock:
+            self._drop_skill(name)
+            if ttl_seconds:
+                self._policies[name] = _SkillPolicy(ttl_seconds, key_func or self.param_key(param_names))
+            else:
+                self._policies.pop(name, None)
+            if invalidates:
+                self._invalidates[name] = list(invalidates)
+            else:
+                self._invalidates.pop(name, None)
+
+    def is_cacheable(self, name: str) -> bool:
+        return name in self._policies
+
+    def get(self, name: str, params: Dict[str, Any]) -> Tuple[Any, int]:
+        """
+        查询缓存
+
+        Args:
+            name: 技能名称
+            params: 技能参数
+
+        Returns:
+            (结果副本 或 未命中时的 MISS, 当前失效代数)，代数在 put 时原样传回
+        """
+        policy = self._policies[name]
+        key = (name, policy.key_func(params))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, result = entry
+                if self._clock() - stored_at <= policy.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    policy.hits += 1
+                    return copy.deepcopy(result), policy.generation
+                del self._entries[key]
+                self.expirations += 1
+            policy.misses += 1
+            return MISS, policy.generation
+
+    def put(self, name: str, params: Dict[str, Any], result: Any, generation: int) -> bool:
+        """
+        写入缓存（失败的结果不缓存；查询期间技能被失效过时也不缓存）
+
+        Args:
+            name: 技能名称
+            params: 技能参数
+            result: 技能执行结果
+            generation: get 时返回的失效代数
+
+        Returns:
+            是否写入成功
+        """
+        if isinstance(result, dict) and not result.get("success", True):
+            return False
+        policy = self._policies[name]
+        key = (name, policy.key_func(params))
+        with self._lock:
+            if policy.generation != generation:
+                return False
+            self._entries[key] = (self._clock(), copy.deepcopy(result))
+            self._entries.move_to_end(key)
+            policy.stores += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return True
+
+    def invalidate_for(self, name: str, params: Dict[str, Any], result: Any = None) -> None:
+        """
+        写操作技能执行后，失效它声明的技能缓存
+
+        被失效技能的键参数都能从本次参数（或返回结果）中取到时只失效对应条目，
+        否则失效该技能的全部条目。
+
+        Args:
+            name: 执行的技能名称
+            params: 技能参数
+            result: 技能执行结果（其中的字段也可用于定位键）
+        """
+        targets = self._invalidates.get(name)
+        if not targets:
+            return
+        values = {**(result if isinstance(result, dict) else {}), **params}
+        with self._lock:
+            for target in targets:
+                policy = self._policies.get(target)
+                if policy is None:
+                    continue
+                policy.generation += 1
+                policy.invalidations += 1
+                try:
+                    key = (target, policy.key_func(_StrictParams(values)))
+                except KeyError:
+                    self._drop_skill(target)
+                    continue
+                self._entries.pop(key, None)
+        logger.debug(f"{name} invalidated skill cache: {targets}")
+
+    def clear(self) -> None:
+        """清空所有缓存结果"""
+        with self._lock:
+            self._entries.clear()
+            for policy in self._policies.values():
+                policy.generation += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计（供 /metrics 使用）"""
+        with self._lock:
+            skills = {}
+            total_hits = total_lookups = 0
+            for name, policy in self._policies.items():
+                lookups = policy.hits + policy.misses
+                total_hits += policy.hits
+                total_lookups += lookups
+                skills[name] = {
+                    "ttl_seconds": policy.ttl_seconds,
+                    "hits": policy.hits,
+                    "misses": policy.misses,
+                    "hit_rate": policy.hits / lookups if lookups else 0.0,
+                    "stores": policy.stores,
+                    "invalidations": policy.invalidations
+                }
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": total_hits,
+                "misses": total_lookups - total_hits,
+                "hit_rate": total_hits / total_lookups if total_lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "skills": skills
+            }
+
+    def _drop_skill(self, name: str) -> None:
+        """删除某个技能的全部条目（调用方持有锁）"""
+        for key in [key for key in self._entries if key[0] == name]:
+            del self._entries[key]
+
+
+class _StrictParams(dict):
+    """按参数失效时使用：键函数取不到的参数抛 KeyError，而不是当作 None"""
+
+    def get(self, key, default=None):
+        return self[key]
+
+
+def _freeze(value: Any) -> Hashable:
+    """把参数值转成可哈希的形式"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
@@ -2,12 +2,26 @@
 app/skills_real.py - 真实技能库（Day 4）
 
 通过HTTP API对接内部系统
+
+每个技能方法都提供同步版本（如 get_order）和异步版本（如 aget_order），
+两者共享同一个流程实现（_get_order_flow），业务逻辑只写一份。
 """
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Callable, List, Optional, Generator, NamedTuple, Tuple
 from datetime import datetime
+import asyncio
 import httpx
 import logging
 import os
+import threading
+
+from app.batch_loader import BatchLoader
+from app.conditional_get import ConditionalGetCache, ValidatedResponse
+from app.deadline import clamp_timeout, detached, DeadlineExceeded
+from app.http_transport import HTTPTransportManager, http_transport
+from app.inventory_cache import InventoryCache, MISS, parse_bound, parse_field_bounds
+from app.json_codec import CodecResponse
+from app.resilience import ResilienceManager
+from app.single_flight import SingleFlight
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -20,17 +34,253 @@ LOGISTICS_API_BASE = os.getenv("LOGISTICS_API_BASE", "http://localhost:9000")
 
 # HTTP超时配置
 DEFAULT_TIMEOUT = 10.0  # 10秒超时
-MAX_RETRIES = 2  # 最多重试2次
+CONNECT_TIMEOUT = float(os.getenv("SKILL_CONNECT_TIMEOUT", "3"))  # 建立连接的超时（上游宕机时不必等满10秒）
+MAX_RETRIES = int(os.getenv("SKILL_MAX_RETRIES", "2"))  # 幂等GET请求最多重试2次
+
+# 所有技能共用的重试与熔断配置（每个上游地址一个熔断器）
+skill_resilience = ResilienceManager(
+    max_retries=MAX_RETRIES,
+    base_delay=float(os.getenv("SKILL_RETRY_BASE_DELAY", "0.1")),
+    max_delay=float(os.getenv("SKILL_RETRY_MAX_DELAY", "1.0")),
+    failure_threshold=int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5")),
+    recovery_timeout=float(os.getenv("BREAKER_RECOVERY_SECONDS", "30"))
+)
+
+# 所有技能共用的请求合并：相同参数的并发只读查询只发一次上游请求
+skill_single_flight = SingleFlight(enabled=os.getenv("SKILL_SINGLE_FLIGHT", "true").lower() == "true")
+
+# 条件请求：按URL缓存上游的 ETag/Last-Modified 和解析结果，未变化的资源只需一个无响应体的304
+skill_conditional_get = ConditionalGetCache(
+    max_entries=int(os.getenv("SKILL_CONDITIONAL_CACHE_SIZE", "2048")),
+    enabled=os.getenv("SKILL_CONDITIONAL_GET", "true").lower() == "true"
+)
+
+# 批量查询：窗口内的单条查询合并为一次 /api/batch/* 请求（上游没有批量接口时自动逐个走单条查询接口）
+BATCH_LOADER_ENABLED = os.getenv("SKILL_BATCH_LOADER", "true").lower() == "true"
+BATCH_WINDOW = float(os.getenv("SKILL_BATCH_WINDOW_MS", "2")) / 1000
+BATCH_MAX_SIZE = int(os.getenv("SKILL_BATCH_MAX_SIZE", "50"))
+
+# 库存查询缓存：按字段时效 stale-while-revalidate（字段=新鲜期/最大过期时间，单位秒）
+inventory_cache = InventoryCache(
+    field_bounds=parse_field_bounds(os.getenv(
+        "INVENTORY_FIELD_STALENESS",
+        "stock=2/10,available=2/10,reserved=2/10,status=5/30,warehouse_address=3600/86400"
+    )),
+    default_bound=parse_bound(os.getenv("INVENTORY_DEFAULT_STALENESS", "30/300")),
+    max_size=int(os.getenv("INVENTORY_CACHE_SIZE", "1024")),
+    enabled=os.getenv("INVENTORY_CACHE_ENABLED", "true").lower() == "true"
+)
+
+
+class HTTPCall(NamedTuple):
+    """技能流程发出的一次HTTP请求"""
+    method: str
+    url: str
+    params: Optional[Dict[str, Any]] = None
+
+
+# 技能流程：yield HTTPCall，接收 httpx.Response（或被抛入请求异常），最终 return 结果字典
+SkillFlow = Generator[HTTPCall, httpx.Response, Dict[str, Any]]
+# 批量查询流程：最终 return {ID: 单条结果}
+BatchFlow = Generator[HTTPCall, httpx.Response, Dict[str, Dict[str, Any]]]
+
+
+class BaseSkill:
+    """
+    真实API技能基类
+
+    子类把每个技能写成流程生成器，由 _run（同步客户端）或 _arun（异步客户端）驱动。
+    请求异常会被抛回流程内部，因此流程里原有的 try/except 错误处理对两种模式都生效。
+    每次请求的超时按请求截止时间收紧（见 app/deadline.py）。
+    HTTP客户端来自共享连接池（见 app/http_transport.py），同一上游的技能复用连接；
+    请求经过重试与熔断（见 app/resilience.py），熔断打开时按连接失败处理；
+    GET请求带上次的 ETag/Last-Modified，304 时复用已解析的结果（见 app/conditional_get.py）；
+    交给流程的响应用 app/json_codec.py 解码。
+    get_order 和补货、退款等写操作的结果交给库存缓存，写操作后失效涉及的商品（见 app/inventory_cache.py）。
+    只读查询通过 _run_shared/_arun_shared 合并相同参数的并发调用（见 app/single_flight.py），
+    不同ID的查询可以再经过批量加载器合并成一次批量请求（见 app/batch_loader.py）。
+    """
+
+    def __init__(
+        self,
+        api_base: str,
+        timeout: float = DEFAULT_TIMEOUT,
+        transport: Optional[HTTPTransportManager] = None,
+        resilience: Optional[ResilienceManager] = None
+    ):
+        self.api_base = api_base.rstrip("/")
+        self.timeout = timeout
+        self.transport = transport or http_transport
+        self.resilience = resilience or skill_resilience
+        self.single_flight = skill_single_flight
+        self.conditional_get = skill_conditional_get
+        self.inventory_cache = inventory_cache
+        logger.info(f"{type(self).__name__} initialized with API: {self.api_base}")
+
+    @property
+    def client(self) -> httpx.Client:
+        """同步HTTP客户端"""
+        return self.transport.client(self.api_base)
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        """异步HTTP客户端（连接池不能跨事件循环复用，按当前事件循环获取）"""
+        return self.transport.async_client(self.api_base)
+
+    def _request_timeout(self) -> httpx.Timeout:
+        """本次HTTP请求的超时：默认超时与请求剩余时间取较小值，建立连接最多等 CONNECT_TIMEOUT"""
+        try:
+            timeout = clamp_timeout(self.timeout)
+        except DeadlineExceeded as e:
+            # 按超时处理，复用各技能流程中的"请求超时"分支
+            raise httpx.TimeoutException(str(e)) from e
+        return httpx.Timeout(timeout, connect=min(timeout, CONNECT_TIMEOUT))
+
+    def _send(self, call: HTTPCall) -> httpx.Response:
+        """同步发送一次请求（条件请求 + 重试 + 熔断），响应体由 json_codec 解码"""
+        headers = self.conditional_get.request_headers(call.method, call.url, call.params)
+        response = self.resilience.execute(
+            self.api_base, call.method,
+            lambda: self.client.request(call.method, call.url, params=call.params, headers=headers, timeout=self._request_timeout())
+        )
+        return CodecResponse.wrap(self.conditional_get.process(call.method, call.url, call.params, response))
+
+    async def _asend(self, call: HTTPCall) -> httpx.Response:
+        """异步发送一次请求（条件请求 + 重试 + 熔断），响应体由 json_codec 解码"""
+        headers = self.conditional_get.request_headers(call.method, call.url, call.params)
+        response = await self.resilience.aexecute(
+            self.api_base, call.method,
+            lambda: self.async_client.request(call.method, call.url, params=call.params, headers=headers, timeout=self._request_timeout())
+        )
+        return CodecResponse.wrap(self.conditional_get.process(call.method, call.url, call.params, response))
+
+    def _run(self, flow: SkillFlow) -> Dict[str, Any]:
+        """同步驱动技能流程"""
+        try:
+            call = next(flow)
+            while True:
+                try:
+                    response = self._send(call)
+                except Exception as e:
+                    call = flow.throw(e)
+                else:
+                    call = flow.send(response)
+        except StopIteration as stop:
+            return stop.value
+
+    async def _arun(self, flow: SkillFlow) -> Dict[str, Any]:
+        """异步驱动技能流程，等待HTTP响应期间不阻塞事件循环"""
+        try:
+            call = next(flow)
+            while True:
+                try:
+                    response = await self._asend(call)
+                except Exception as e:
+                    call = flow.throw(e)
+                else:
+                    call = flow.send(response)
+        except StopIteration as stop:
+            return stop.value
+
+    def _notify_inventory(self, name: str, params: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        把技能结果交给库存缓存：get_order 记住订单包含的商品，补货申请、退款等写操作后失效涉及的商品
 
+        在技能层调用，直接调用技能（不经过编排器）时同样生效。
+        """
+        self.inventory_cache.on_skill_result(name, params, result)
+        return result
+
+    def _flight_key(self, key: Tuple[Any, ...]) -> Tuple[Any, ...]:
+        """合并键：技能方法名 + 上游地址 + 参数（同一上游的不同技能实例也能合并）"""
+        return (key[0], self.api_base) + tuple(key[1:])
+
+    def _run_shared(
+        self,
+        key: Tuple[Any, ...],
+        flow: Callable[[], SkillFlow],
+        loader: Optional[BatchLoader] = None
+    ) -> Dict[str, Any]:
+        """同步驱动只读流程，相同键的并发调用共享一次请求和解析结果；启用批量加载时交给加载器"""
+        if loader is not None and loader.enabled:
+            return self.single_flight.do(self._flight_key(key), lambda: loader.load(key[1]))
+        return self.single_flight.do(self._flight_key(key), lambda: self._run(flow()))
+
+    async def _arun_shared(
+        self,
+        key: Tuple[Any, ...],
+        flow: Callable[[], SkillFlow],
+        loader: Optional[BatchLoader] = None
+    ) -> Dict[str, Any]:
+        """_run_shared 的异步版本"""
+        if loader is not None and loader.enabled:
+            return await self.single_flight.ado(self._flight_key(key), lambda: loader.aload(key[1]))
+        return await self.single_flight.ado(self._flight_key(key), lambda: self._arun(flow()))
+
+    def _loader(self, name: str, batch_fn: Callable, abatch_fn: Callable) -> BatchLoader:
+        """创建该技能的批量加载器（配置来自环境变量）"""
+        return BatchLoader(name, batch_fn, abatch_fn, window=BATCH_WINDOW, max_batch_size=BATCH_MAX_SIZE, enabled=BATCH_LOADER_ENABLED)
+
+    def _batch_flow(self, resource: str, ids: List[str], item_flow: Callable[[str], SkillFlow]) -> BatchFlow:
+        """
+        批量查询流程：一次请求 /api/batch/{resource}?ids=...，按ID返回与单条查询相同格式的结果
+
+        每个ID的结果由单条查询流程解析（找到的记录按已解析的200、缺失的按404、请求异常原样抛入），
+        结果格式和错误处理只写一份。只有一个ID时直接走单条查询接口；
+        批量接口返回非200（上游没有批量接口、5xx等）时逐个走单条查询接口。
+        """
+        ids = list(dict.fromkeys(ids))
+        if len(ids) == 1:
+            result = yield from item_flow(ids[0])
+            return {ids[0]: result}
 
-class OrderSkill:
+        try:
+            response = yield HTTPCall("GET", f"{self.api_base}/api/batch/{resource}", {"ids": ",".join(ids)})
+        except Exception as e:
+            return {item_id: self._complete_flow(item_flow(item_id), error=e) for item_id in ids}
+
+        if response.status_code != 200:
+            logger.warning(f"Batch {resource} returned HTTP {response.status_code}, falling back to single lookups")
+            results = {}
+            for item_id in ids:
+                results[item_id] = yield from item_flow(item_id)
+            return results
+        items = response.json().get("items", {})
+        logger.info(f"Batch fetched {resource}: {len(items)}/{len(ids)} found")
+        return {
+            item_id: self._complete_flow(
+                item_flow(item_id),
+                ValidatedResponse(items[item_id], response) if item_id in items else httpx.Response(404)
+            )
+            for item_id in ids
+        }
+
+    @staticmethod
+    def _complete_flow(flow: SkillFlow, response: Optional[httpx.Response] = None, error: Optional[Exception] = None) -> Dict[str, Any]:
+        """用批量请求拿到的响应（或异常）完成一个单条查询流程"""
+        next(flow)
+        try:
+            if error is not None:
+                flow.throw(error)
+            else:
+                flow.send(response)
+        except StopIteration as stop:
+            return stop.value
+        raise RuntimeError("单条查询流程发出了多于一次请求")
+
+
+class OrderSkill(BaseSkill):
     """订单技能 - 真实API对接版本"""
 
-    def __init__(self, api_base: str = ORDER_API_BASE, timeout: float = DEFAULT_TIMEOUT):
-        self.api_base = api_base.rstrip("/")
-        self.timeout = timeout
-        self.client = httpx.Client(timeout=timeout)
-        logger.info(f"OrderSkill initialized with API: {self.api_base}")
+    def __init__(
+        self,
+        api_base: str = ORDER_API_BASE,
+        timeout: float = DEFAULT_TIMEOUT,
+        transport: Optional[HTTPTransportManager] = None,
+        resilience: Optional[ResilienceManager] = None
+    ):
+        super().__init__(api_base, timeout, transport, resilience)
+        self.order_loader = self._loader("get_order", self.get_orders_batch, self.aget_orders_batch)
 
     def get_order(self, order_id: str) -> Dict[str, Any]:
         """
@@ -42,11 +292,36 @@ class OrderSkill:
         Returns:
             订单详情字典，包含订单状态、客户信息、商品等
         """
+        result = self._run_shared(("get_order", order_id), lambda: self._get_order_flow(order_id), self.order_loader)
+        return self._notify_inventory("get_order", {"order_id": order_id}, result)
+
+    async def aget_order(self, order_id: str) -> Dict[str, Any]:
+        """get_order 的异步版本"""
+        result = await self._arun_shared(("get_order", order_id), lambda: self._get_order_flow(order_id), self.order_loader)
+        return self._notify_inventory("get_order", {"order_id": order_id}, result)
+
+    def get_orders_batch(self, order_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        批量查询订单（一次请求）
+
+        Args:
+            order_ids: 订单ID列表
+
+        Returns:
+            {ID: 与 get_order 格式相同的结果}
+        """
+        return self._run(self._batch_flow("orders", order_ids, self._get_order_flow))
+
+    async def aget_orders_batch(self, order_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """get_orders_batch 的异步版本"""
+        return await self._arun(self._batch_flow("orders", order_ids, self._get_order_flow))
+
+    def _get_order_flow(self, order_id: str) -> SkillFlow:
         url = f"{self.api_base}/api/orders/{order_id}"
         logger.info(f"Fetching order: {order_id} from {url}")
 
         try:
-            response = self.client.get(url)
+            response = yield HTTPCall("GET", url)
 
             if response.status_code == 200:
                 data = response.json()
@@ -108,11 +383,18 @@ class OrderSkill:
         Returns:
             订单列表
         """
+        return self._run(self._list_orders_flow(status))
+
+    async def alist_orders(self, status: Optional[str] = None) -> Dict[str, Any]:
+        """list_orders 的异步版本"""
+        return await self._arun(self._list_orders_flow(status))
+
+    def _list_orders_flow(self, status: Optional[str] = None) -> SkillFlow:
         url = f"{self.api_base}/api/orders"
         params = {"status": status} if status else {}
 
         try:
-            response = self.client.get(url, params=params)
+            response = yield HTTPCall("GET", url, params)
             if response.status_code == 200:
                 return {
                     "success": True,
@@ -130,36 +412,103 @@ class OrderSkill:
                 "error": str(e)
             }
 
-    def __del__(self):
-        """清理HTTP客户端"""
-        if hasattr(self, 'client'):
-            self.client.close()
-
 
-class InventorySkill:
+class InventorySkill(BaseSkill):
     """库存技能 - 真实API对接版本"""
 
-    def __init__(self, api_base: str = INVENTORY_API_BASE, timeout: float = DEFAULT_TIMEOUT):
-        self.api_base = api_base.rstrip("/")
-        self.timeout = timeout
-        self.client = httpx.Client(timeout=timeout)
-        logger.info(f"InventorySkill initialized with API: {self.api_base}")
+    def __init__(
+        self,
+        api_base: str = INVENTORY_API_BASE,
+        timeout: float = DEFAULT_TIMEOUT,
+        transport: Optional[HTTPTransportManager] = None,
+        resilience: Optional[ResilienceManager] = None
+    ):
+        super().__init__(api_base, timeout, transport, resilience)
+        self.inventory_loader = self._loader("query_inventory", self.query_inventories_batch, self.aquery_inventories_batch)
+        self.cache = inventory_cache
+        self._refresh_tasks: set = set()
 
     def query_inventory(self, product_id: str) -> Dict[str, Any]:
         """
         查询库存信息
 
+        先查库存缓存：新鲜的直接返回；略微过期的立即返回（带 stale 标记）并在后台线程刷新。
+
         Args:
             product_id: 产品ID
 
         Returns:
             库存详情字典，包含库存数量、仓库位置等
         """
+        if not self.cache.enabled:
+            return self._fetch_inventory(product_id)
+        result, generation, refresh = self.cache.lookup(product_id)
+        if result is MISS:
+            result = self._fetch_inventory(product_id)
+            self.cache.put(product_id, result, generation)
+        elif refresh:
+            threading.Thread(target=self._refresh_inventory, args=(product_id, generation), daemon=True).start()
+        return result
+
+    async def aquery_inventory(self, product_id: str) -> Dict[str, Any]:
+        """query_inventory 的异步版本（后台刷新在当前事件循环上执行）"""
+        if not self.cache.enabled:
+            return await self._afetch_inventory(product_id)
+        result, generation, refresh = self.cache.lookup(product_id)
+        if result is MISS:
+            result = await self._afetch_inventory(product_id)
+            self.cache.put(product_id, result, generation)
+        elif refresh:
+            task = asyncio.get_running_loop().create_task(self._arefresh_inventory(product_id, generation))
+            self._refresh_tasks.add(task)
+            task.add_done_callback(self._refresh_tasks.discard)
+        return result
+
+    def _fetch_inventory(self, product_id: str) -> Dict[str, Any]:
+        return self._run_shared(("query_inventory", product_id), lambda: self._query_inventory_flow(product_id), self.inventory_loader)
+
+    async def _afetch_inventory(self, product_id: str) -> Dict[str, Any]:
+        return await self._arun_shared(("query_inventory", product_id), lambda: self._query_inventory_flow(product_id), self.inventory_loader)
+
+    def _refresh_inventory(self, product_id: str, generation: int) -> None:
+        """后台刷新过期条目（新线程不继承请求的截止时间）"""
+        result = None
+        try:
+            result = self._fetch_inventory(product_id)
+        finally:
+            self.cache.end_refresh(product_id, result, generation)
+
+    async def _arefresh_inventory(self, product_id: str, generation: int) -> None:
+        """_refresh_inventory 的异步版本（不受触发它的请求的截止时间限制）"""
+        result = None
+        try:
+            with detached():
+                result = await self._afetch_inventory(product_id)
+        finally:
+            self.cache.end_refresh(product_id, result, generation)
+
+    def query_inventories_batch(self, product_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        批量查询库存（一次请求）
+
+        Args:
+            product_ids: 产品ID列表
+
+        Returns:
+            {ID: 与 query_inventory 格式相同的结果}
+        """
+        return self._run(self._batch_flow("inventory", product_ids, self._query_inventory_flow))
+
+    async def aquery_inventories_batch(self, product_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """query_inventories_batch 的异步版本"""
+        return await self._arun(self._batch_flow("inventory", product_ids, self._query_inventory_flow))
+
+    def _query_inventory_flow(self, product_id: str) -> SkillFlow:
         url = f"{self.api_base}/api/inventory/{product_id}"
         logger.info(f"Fetching inventory: {product_id} from {url}")
 
         try:
-            response = self.client.get(url)
+            response = yield HTTPCall("GET", url)
 
             if response.status_code == 200:
                 data = response.json()
@@ -222,11 +571,18 @@ class InventorySkill:
         Returns:
             库存列表
         """
+        return self._run(self._list_inventory_flow(status))
+
+    async def alist_inventory(self, status: Optional[str] = None) -> Dict[str, Any]:
+        """list_inventory 的异步版本"""
+        return await self._arun(self._list_inventory_flow(status))
+
+    def _list_inventory_flow(self, status: Optional[str] = None) -> SkillFlow:
         url = f"{self.api_base}/api/inventory"
         params = {"status": status} if status else {}
 
         try:
-            response = self.client.get(url, params=params)
+            response = yield HTTPCall("GET", url, params)
             if response.status_code == 200:
                 return {
                     "success": True,
@@ -244,20 +600,19 @@ class InventorySkill:
                 "error": str(e)
             }
 
-    def __del__(self):
-        """清理HTTP客户端"""
-        if hasattr(self, 'client'):
-            self.client.close()
 
-
-class LogisticsSkill:
+class LogisticsSkill(BaseSkill):
     """物流技能 - 真实API对接版本"""
 
-    def __init__(self, api_base: str = LOGISTICS_API_BASE, timeout: float = DEFAULT_TIMEOUT):
-        self.api_base = api_base.rstrip("/")
-        self.timeout = timeout
-        self.client = httpx.Client(timeout=timeout)
-        logger.info(f"LogisticsSkill initialized with API: {self.api_base}")
+    def __init__(
+        self,
+        api_base: str = LOGISTICS_API_BASE,
+        timeout: float = DEFAULT_TIMEOUT,
+        transport: Optional[HTTPTransportManager] = None,
+        resilience: Optional[ResilienceManager] = None
+    ):
+        super().__init__(api_base, timeout, transport, resilience)
+        self.logistics_loader = self._loader("query_logistics", self.query_logistics_batch, self.aquery_logistics_batch)
 
     def query_logistics(self, tracking_number: str) -> Dict[str, Any]:
         """
@@ -269,11 +624,34 @@ class LogisticsSkill:
         Returns:
             物流详情字典
         """
+        return self._run_shared(("query_logistics", tracking_number), lambda: self._query_logistics_flow(tracking_number), self.logistics_loader)
+
+    async def aquery_logistics(self, tracking_number: str) -> Dict[str, Any]:
+        """query_logistics 的异步版本"""
+        return await self._arun_shared(("query_logistics", tracking_number), lambda: self._query_logistics_flow(tracking_number), self.logistics_loader)
+
+    def query_logistics_batch(self, tracking_numbers: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        批量查询物流（一次请求）
+
+        Args:
+            tracking_numbers: 物流单号列表
+
+        Returns:
+            {ID: 与 query_logistics 格式相同的结果}
+        """
+        return self._run(self._batch_flow("logistics", tracking_numbers, self._query_logistics_flow))
+
+    async def aquery_logistics_batch(self, tracking_numbers: List[str]) -> Dict[str, Dict[str, Any]]:
+        """query_logistics_batch 的异步版本"""
+        return await self._arun(self._batch_flow("logistics", tracking_numbers, self._query_logistics_flow))
+
+    def _query_logistics_flow(self, tracking_number: str) -> SkillFlow:
         url = f"{self.api_base}/api/logistics/{tracking_number}"
         logger.info(f"Fetching logistics: {tracking_number} from {url}")
 
         try:
-            response = self.client.get(url)
+            response = yield HTTPCall("GET", url)
 
             if response.status_code == 200:
                 data = response.json()
@@ -325,20 +703,18 @@ class LogisticsSkill:
                 "status": "错误"
             }
 
-    def __del__(self):
-        """清理HTTP客户端"""
-        if hasattr(self, 'client'):
-            self.client.close()
 
-
-class PromotionSkill:
+class PromotionSkill(BaseSkill):
     """促销技能 - 真实API对接版本"""
 
-    def __init__(self, api_base: str = ORDER_API_BASE, timeout: float = DEFAULT_TIMEOUT):
-        self.api_base = api_base.rstrip("/")
-        self.timeout = timeout
-        self.client = httpx.Client(timeout=timeout)
-        logger.info(f"PromotionSkill initialized with API: {self.api_base}")
+    def __init__(
+        self,
+        api_base: str = ORDER_API_BASE,
+        timeout: float = DEFAULT_TIMEOUT,
+        transport: Optional[HTTPTransportManager] = None,
+        resilience: Optional[ResilienceManager] = None
+    ):
+        super().__init__(api_base, timeout, transport, resilience)
 
     def query_promotions(self, product_id: Optional[str] = None, status: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -351,6 +727,13 @@ class PromotionSkill:
         Returns:
             促销活动列表
         """
+        return self._run(self._query_promotions_flow(product_id, status))
+
+    async def aquery_promotions(self, product_id: Optional[str] = None, status: Optional[str] = None) -> Dict[str, Any]:
+        """query_promotions 的异步版本"""
+        return await self._arun(self._query_promotions_flow(product_id, status))
+
+    def _query_promotions_flow(self, product_id: Optional[str] = None, status: Optional[str] = None) -> SkillFlow:
         url = f"{self.api_base}/api/promotions"
         params = {}
         if product_id:
@@ -361,7 +744,7 @@ class PromotionSkill:
         logger.info(f"Fetching promotions from {url} with params: {params}")
 
         try:
-            response = self.client.get(url, params=params)
+            response = yield HTTPCall("GET", url, params)
 
             if response.status_code == 200:
                 data = response.json()
@@ -396,20 +779,19 @@ class PromotionSkill:
                 "error": f"未知错误: {str(e)}"
             }
 
-    def __del__(self):
-        """清理HTTP客户端"""
-        if hasattr(self, 'client'):
-            self.client.close()
-
 
-class CustomerSkill:
+class CustomerSkill(BaseSkill):
     """客户信息技能 - 真实API对接版本"""
 
-    def __init__(self, api_base: str = ORDER_API_BASE, timeout: float = DEFAULT_TIMEOUT):
-        self.api_base = api_base.rstrip("/")
-        self.timeout = timeout
-        self.client = httpx.Client(timeout=timeout)
-        logger.info(f"CustomerSkill initialized with API: {self.api_base}")
+    def __init__(
+        self,
+        api_base: str = ORDER_API_BASE,
+        timeout: float = DEFAULT_TIMEOUT,
+        transport: Optional[HTTPTransportManager] = None,
+        resilience: Optional[ResilienceManager] = None
+    ):
+        super().__init__(api_base, timeout, transport, resilience)
+        self.customer_loader = self._loader("get_customer", self.get_customers_batch, self.aget_customers_batch)
 
     def get_customer(self, customer_id: str) -> Dict[str, Any]:
         """
@@ -421,11 +803,34 @@ class CustomerSkill:
         Returns:
             客户详情字典
         """
+        return self._run_shared(("get_customer", customer_id), lambda: self._get_customer_flow(customer_id), self.customer_loader)
+
+    async def aget_customer(self, customer_id: str) -> Dict[str, Any]:
+        """get_customer 的异步版本"""
+        return await self._arun_shared(("get_customer", customer_id), lambda: self._get_customer_flow(customer_id), self.customer_loader)
+
+    def get_customers_batch(self, customer_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        批量查询客户（一次请求）
+
+        Args:
+            customer_ids: 客户ID列表
+
+        Returns:
+            {ID: 与 get_customer 格式相同的结果}
+        """
+        return self._run(self._batch_flow("customers", customer_ids, self._get_customer_flow))
+
+    async def aget_customers_batch(self, customer_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """get_customers_batch 的异步版本"""
+        return await self._arun(self._batch_flow("customers", customer_ids, self._get_customer_flow))
+
+    def _get_customer_flow(self, customer_id: str) -> SkillFlow:
         url = f"{self.api_base}/api/customers/{customer_id}"
         logger.info(f"Fetching customer: {customer_id} from {url}")
 
         try:
-            response = self.client.get(url)
+            response = yield HTTPCall("GET", url)
 
             if response.status_code == 200:
                 data = response.json()
@@ -482,11 +887,18 @@ class CustomerSkill:
         Returns:
             客户订单列表
         """
+        return self._run(self._get_customer_orders_flow(customer_id))
+
+    async def aget_customer_orders(self, customer_id: str) -> Dict[str, Any]:
+        """get_customer_orders 的异步版本"""
+        return await self._arun(self._get_customer_orders_flow(customer_id))
+
+    def _get_customer_orders_flow(self, customer_id: str) -> SkillFlow:
         url = f"{self.api_base}/api/customers/{customer_id}/orders"
         logger.info(f"Fetching orders for customer: {customer_id}")
 
         try:
-            response = self.client.get(url)
+            response = yield HTTPCall("GET", url)
 
             if response.status_code == 200:
                 data = response.json()
@@ -516,20 +928,18 @@ class CustomerSkill:
                 "error": str(e)
             }
 
-    def __del__(self):
-        """清理HTTP客户端"""
-        if hasattr(self, 'client'):
-            self.client.close()
-
 
-class RefundSkill:
+class RefundSkill(BaseSkill):
     """退款处理技能 - 真实API对接版本"""
 
-    def __init__(self, api_base: str = ORDER_API_BASE, timeout: float = DEFAULT_TIMEOUT):
-        self.api_base = api_base.rstrip("/")
-        self.timeout = timeout
-        self.client = httpx.Client(timeout=timeout)
-        logger.info(f"RefundSkill initialized with API: {self.api_base}")
+    def __init__(
+        self,
+        api_base: str = ORDER_API_BASE,
+        timeout: float = DEFAULT_TIMEOUT,
+        transport: Optional[HTTPTransportManager] = None,
+        resilience: Optional[ResilienceManager] = None
+    ):
+        super().__init__(api_base, timeout, transport, resilience)
 
     def get_refund(self, refund_id: str) -> Dict[str, Any]:
         """
@@ -541,11 +951,18 @@ class RefundSkill:
         Returns:
             退款详情字典
         """
+        return self._run(self._get_refund_flow(refund_id))
+
+    async def aget_refund(self, refund_id: str) -> Dict[str, Any]:
+        """get_refund 的异步版本"""
+        return await self._arun(self._get_refund_flow(refund_id))
+
+    def _get_refund_flow(self, refund_id: str) -> SkillFlow:
         url = f"{self.api_base}/api/refunds/{refund_id}"
         logger.info(f"Fetching refund: {refund_id} from {url}")
 
         try:
-            response = self.client.get(url)
+            response = yield HTTPCall("GET", url)
 
             if response.status_code == 200:
                 data = response.json()
@@ -590,6 +1007,15 @@ class RefundSkill:
         Returns:
             创建的退款申请
         """
+        result = self._run(self._create_refund_flow(order_id, reason, amount))
+        return self._notify_inventory("create_refund", {"order_id": order_id, "reason": reason}, result)
+
+    async def acreate_refund(self, order_id: str, reason: str, amount: Optional[float] = None) -> Dict[str, Any]:
+        """create_refund 的异步版本"""
+        result = await self._arun(self._create_refund_flow(order_id, reason, amount))
+        return self._notify_inventory("create_refund", {"order_id": order_id, "reason": reason}, result)
+
+    def _create_refund_flow(self, order_id: str, reason: str, amount: Optional[float] = None) -> SkillFlow:
         url = f"{self.api_base}/api/refunds"
         params = {
             "order_id": order_id,
@@ -601,7 +1027,7 @@ class RefundSkill:
         logger.info(f"Creating refund for order {order_id}: {reason}")
 
         try:
-            response = self.client.post(url, params=params)
+            response = yield HTTPCall("POST", url, params)
 
             if response.status_code == 200:
                 data = response.json()
@@ -641,11 +1067,20 @@ class RefundSkill:
         Returns:
             审批结果
         """
+        result = self._run(self._approve_refund_flow(refund_id))
+        return self._notify_inventory("approve_refund", {"refund_id": refund_id}, result)
+
+    async def aapprove_refund(self, refund_id: str) -> Dict[str, Any]:
+        """approve_refund 的异步版本"""
+        result = await self._arun(self._approve_refund_flow(refund_id))
+        return self._notify_inventory("approve_refund", {"refund_id": refund_id}, result)
+
+    def _approve_refund_flow(self, refund_id: str) -> SkillFlow:
         url = f"{self.api_base}/api/refunds/{refund_id}/approve"
         logger.info(f"Approving refund: {refund_id}")
 
         try:
-            response = self.client.post(url)
+            response = yield HTTPCall("POST", url)
 
             if response.status_code == 200:
                 data = response.json()
@@ -682,20 +1117,18 @@ class RefundSkill:
                 "error": str(e)
             }
 
-    def __del__(self):
-        """清理HTTP客户端"""
-        if hasattr(self, 'client'):
-            self.client.close()
-
 
-class ReplenishmentSkill:
+class ReplenishmentSkill(BaseSkill):
     """补货技能 - 真实API对接版本"""
 
-    def __init__(self, api_base: str = INVENTORY_API_BASE, timeout: float = DEFAULT_TIMEOUT):
-        self.api_base = api_base.rstrip("/")
-        self.timeout = timeout
-        self.client = httpx.Client(timeout=timeout)
-        logger.info(f"ReplenishmentSkill initialized with API: {self.api_base}")
+    def __init__(
+        self,
+        api_base: str = INVENTORY_API_BASE,
+        timeout: float = DEFAULT_TIMEOUT,
+        transport: Optional[HTTPTransportManager] = None,
+        resilience: Optional[ResilienceManager] = None
+    ):
+        super().__init__(api_base, timeout, transport, resilience)
 
     def get_replenishment_suggestion(self, product_id: str) -> Dict[str, Any]:
         """
@@ -707,11 +1140,18 @@ class ReplenishmentSkill:
         Returns:
             补货建议字典
         """
+        return self._run(self._get_replenishment_suggestion_flow(product_id))
+
+    async def aget_replenishment_suggestion(self, product_id: str) -> Dict[str, Any]:
+        """get_replenishment_suggestion 的异步版本"""
+        return await self._arun(self._get_replenishment_suggestion_flow(product_id))
+
+    def _get_replenishment_suggestion_flow(self, product_id: str) -> SkillFlow:
         url = f"{self.api_base}/api/replenishment/suggest/{product_id}"
         logger.info(f"Getting replenishment suggestion for product: {product_id}")
 
         try:
-            response = self.client.get(url)
+            response = yield HTTPCall("GET", url)
 
             if response.status_code == 200:
                 data = response.json()
@@ -755,6 +1195,15 @@ class ReplenishmentSkill:
         Returns:
             创建的补货申请
         """
+        result = self._run(self._create_replenishment_flow(product_id, quantity, priority))
+        return self._notify_inventory("create_replenishment", {"product_id": product_id, "quantity": quantity}, result)
+
+    async def acreate_replenishment(self, product_id: str, quantity: int, priority: str = "正常") -> Dict[str, Any]:
+        """create_replenishment 的异步版本"""
+        result = await self._arun(self._create_replenishment_flow(product_id, quantity, priority))
+        return self._notify_inventory("create_replenishment", {"product_id": product_id, "quantity": quantity}, result)
+
+    def _create_replenishment_flow(self, product_id: str, quantity: int, priority: str = "正常") -> SkillFlow:
         url = f"{self.api_base}/api/replenishment"
         params = {
             "product_id": product_id,
@@ -765,7 +1214,7 @@ class ReplenishmentSkill:
         logger.info(f"Creating replenishment for product {product_id}: {quantity} units, priority: {priority}")
 
         try:
-            response = self.client.post(url, params=params)
+            response = yield HTTPCall("POST", url, params)
 
             if response.status_code == 200:
                 data = response.json()
@@ -805,11 +1254,18 @@ class ReplenishmentSkill:
         Returns:
             补货申请详情
         """
+        return self._run(self._get_replenishment_flow(replenishment_id))
+
+    async def aget_replenishment(self, replenishment_id: str) -> Dict[str, Any]:
+        """get_replenishment 的异步版本"""
+        return await self._arun(self._get_replenishment_flow(replenishment_id))
+
+    def _get_replenishment_flow(self, replenishment_id: str) -> SkillFlow:
         url = f"{self.api_base}/api/replenishment/{replenishment_id}"
         logger.info(f"Fetching replenishment: {replenishment_id}")
 
         try:
-            response = self.client.get(url)
+            response = yield HTTPCall("GET", url)
 
             if response.status_code == 200:
                 data = response.json()
@@ -839,20 +1295,18 @@ class ReplenishmentSkill:
                 "error": str(e)
             }
 
-    def __del__(self):
-        """清理HTTP客户端"""
-        if hasattr(self, 'client'):
-            self.client.close()
-
 
-class ReportSkill:
+class ReportSkill(BaseSkill):
     """报表分析技能 - 真实API对接版本"""
 
-    def __init__(self, api_base: str = ORDER_API_BASE, timeout: float = DEFAULT_TIMEOUT):
-        self.api_base = api_base.rstrip("/")
-        self.timeout = timeout
-        self.client = httpx.Client(timeout=timeout)
-        logger.info(f"ReportSkill initialized with API: {self.api_base}")
+    def __init__(
+        self,
+        api_base: str = ORDER_API_BASE,
+        timeout: float = DEFAULT_TIMEOUT,
+        transport: Optional[HTTPTransportManager] = None,
+        resilience: Optional[ResilienceManager] = None
+    ):
+        super().__init__(api_base, timeout, transport, resilience)
 
     def generate_report(self, report_type: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -866,6 +1320,13 @@ class ReportSkill:
         Returns:
             报表数据
         """
+        return self._run(self._generate_report_flow(report_type, start_date, end_date))
+
+    async def agenerate_report(self, report_type: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> Dict[str, Any]:
+        """generate_report 的异步版本"""
+        return await self._arun(self._generate_report_flow(report_type, start_date, end_date))
+
+    def _generate_report_flow(self, report_type: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> SkillFlow:
         url = f"{self.api_base}/api/reports/{report_type}"
         params = {}
         if start_date:
@@ -876,7 +1337,7 @@ class ReportSkill:
         logger.info(f"Generating report: {report_type}")
 
         try:
-            response = self.client.get(url, params=params)
+            response = yield HTTPCall("GET", url, params)
 
             if response.status_code == 200:
                 data = response.json()
@@ -908,11 +1369,6 @@ class ReportSkill:
                 "error": f"未知错误: {str(e)}"
             }
 
-    def __del__(self):
-        """清理HTTP客户端"""
-        if hasattr(self, 'client'):
-            self.client.close()
-
 
 # 创建全局技能实例
 order_skill = OrderSkill()
@@ -924,6 +1380,13 @@ refund_skill = RefundSkill()
 replenishment_skill = ReplenishmentSkill()
 report_skill = ReportSkill()
 
+
+def batch_loader_stats() -> Dict[str, Any]:
+    """各批量加载器的统计（供 /metrics 使用）"""
+    loaders = (order_skill.order_loader, inventory_skill.inventory_loader, logistics_skill.logistics_loader, customer_skill.customer_loader)
+    return {loader.name: loader.stats() for loader in loaders}
+
+
 # 创建技能字典供main.py使用（保持与Mock版本相同的接口）
 REAL_SKILLS = {
     # 原有技能
@@ -943,6 +1406,23 @@ REAL_SKILLS = {
     "generate_report": report_skill.generate_report,
 }
 
+# 异步版本技能字典（键与REAL_SKILLS一致），供编排器在事件循环中直接await
+ASYNC_REAL_SKILLS = {
+    "get_order": order_skill.aget_order,
+    "query_inventory": inventory_skill.aquery_inventory,
+    "query_logistics": logistics_skill.aquery_logistics,
+    "query_promotions": promotion_skill.aquery_promotions,
+    "get_customer": customer_skill.aget_customer,
+    "get_customer_orders": customer_skill.aget_customer_orders,
+    "get_refund": refund_skill.aget_refund,
+    "create_refund": refund_skill.acreate_refund,
+    "approve_refund": refund_skill.aapprove_refund,
+    "get_replenishment_suggestion": replenishment_skill.aget_replenishment_suggestion,
+    "create_replenishment": replenishment_skill.acreate_replenishment,
+    "get_replenishment": replenishment_skill.aget_replenishment,
+    "generate_report": report_skill.agenerate_report,
+}
+
 
 if __name__ == "__main__":
     # 测试代码
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+benchmarks/bench_async_chat.py - /chat 并发吞吐基准
+
+对比两种LLM调用方式下 /chat 的吞吐：
+1. blocking：LLM调用在事件循环上同步等待（改造前 Anthropic 同步客户端的行为）
+2. async：LLM调用 await 等待（AsyncAnthropic）
+
+LLM用固定延迟的假客户端代替，不消耗API额度；技能调用走真实HTTP，
+请求发往在后台线程启动的 mock_api_server。
+
+运行方式:
+    python benchmarks/bench_async_chat.py --requests 40 --concurrency 20 --llm-latency 0.3
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+PLAN = {
+    "intent": "查询订单",
+    "steps": [{"step": 1, "skill": "get_order", "params": {"order_id": "12345"}, "description": "查询订单信息"}],
+    "final_response_template": "订单{order_id}当前状态：{status}"
+}
+
+
+class FakeMessages:
+    """模拟 client.messages，按固定延迟返回计划或回复"""
+
+    def __init__(self, latency: float, blocking: bool):
+        self.latency = latency
+        self.blocking = blocking
+
+    async def create(self, **kwargs):
+        if self.blocking:
+            time.sleep(self.latency)
+        else:
+            await asyncio.sleep(self.latency)
+        # 规划调用带有 system（缓存的技能目录前缀），回复调用没有
+        text = json.dumps(PLAN, ensure_ascii=False) if "system" in kwargs else "您的订单12345已发货。"
+        return SimpleNamespace(
+            content=[SimpleNamespace(text=text)],
+            usage=SimpleNamespace(input_tokens=0, output_tokens=0)
+        )
+
+
+def start_mock_api() -> int:
+    """在后台线程启动 mock_api_server，返回端口"""
+    import uvicorn
+    import mock_api_server
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(mock_api_server.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return port
+
+
+async def run_load(app, total: int, concurrency: int) -> float:
+    """并发发送 total 个 /chat 请求，返回耗时（秒）"""
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as http:
+        async def one():
+            async with semaphore:
+                response = await http.post("/chat", params={"user_input": "查询订单12345的状态"})
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/chat 并发吞吐基准")
+    parser.add_argument("--requests", type=int, default=40, help="总请求数")
+    parser.add_argument("--concurrency", type=int, default=20, help="并发数")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="每次LLM调用的模拟延迟（秒）")
+    parser.add_argument("--no-fast-path", action="store_true", help="关闭快速路径（每个请求两次LLM调用）")
+    parser.add_argument("--plan-cache", action="store_true", help="开启计划缓存（默认关闭，以便对比LLM调用方式本身）")
+    parser.add_argument("--rule-router", action="store_true", help="开启规则预路由（默认关闭，原因同上）")
+    args = parser.parse_args()
+
+    port = start_mock_api()
+    for name in ("ORDER_API_BASE", "INVENTORY_API_BASE", "LOGISTICS_API_BASE"):
+        os.environ[name] = f"http://127.0.0.1:{port}"
+    os.environ.setdefault("CLAUDE_API_KEY", "sk-ant-bench")
+    os.environ["USE_REAL_SKILLS"] = "true"
+
+    import app.main as main_module
+    from app.database import Database
+
+    main_module.db = Database(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    main_module.orchestrator.fast_path = not args.no_fast_path
+    if not args.plan_cache:
+        main_module.orchestrator.plan_cache = None
+    if not args.rule_router:
+        main_module.orchestrator.rule_router = None
+
+    print("=" * 60)
+    print(f"/chat 并发基准: {args.requests} 请求, 并发 {args.concurrency}, 每次LLM调用延迟 {args.llm_latency}s, 快速路径 {'关' if args.no_fast_path else '开'}")
+    print("=" * 60)
+
+    for mode in ("blocking", "async"):
+        main_module.orchestrator.client = SimpleNamespace(messages=FakeMessages(args.llm_latency, blocking=(mode == "blocking")))
+        if main_module.orchestrator.plan_cache:
+            main_module.orchestrator.plan_cache.clear()
+        elapsed = asyncio.run(run_load(main_module.app, args.requests, args.concurrency))
+        print(f"{mode:>8}: 耗时 {elapsed:6.2f}s  吞吐 {args.requests / elapsed:6.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
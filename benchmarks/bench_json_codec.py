@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+benchmarks/bench_json_codec.py - JSON编解码微基准
+
+对比标准库 json 与 app/json_codec.py 各后端在典型负载上的编解码速度：
+1. logistics：物流查询结果（长 history 数组），技能解析上游响应时解码
+2. batch_orders：/api/batch/orders 的批量响应
+3. chat_debug：带完整调试信息的 /chat 响应，以及精简模式下的同一响应
+4. decision：写入 ai_decisions 的执行结果
+
+不需要启动任何服务。
+
+运行方式:
+    python benchmarks/bench_json_codec.py --number 2000
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+os.environ.setdefault("CLAUDE_API_KEY", "sk-ant-bench")
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+
+def build_payloads():
+    """构造各类典型负载"""
+    import mock_api_server
+    from app.main import _lean_debug
+
+    logistics = dict(mock_api_server.LOGISTICS_DB["SF1234567890"], success=True, query_time="2025-01-22T08:00:00")
+    logistics["history"] = [
+        {"time": f"2025-01-{21 + i // 24:02d} {i % 24:02d}:00", "location": f"深圳分拨中心{i}号线", "status": "运输中"}
+        for i in range(60)
+    ]
+    orders = {f"{i:05d}": dict(mock_api_server.ORDERS_DB["12345"], order_id=f"{i:05d}") for i in range(50)}
+    batch_orders = {"total": len(orders), "items": orders, "missing": [], "query_time": "2025-01-22T08:00:00"}
+
+    steps = [{"step": 1, "skill": "query_logistics", "params": {"tracking": "SF1234567890"}, "description": "查询物流"}]
+    debug = {
+        "intent": "查询物流",
+        "skill": "query_logistics",
+        "result": logistics,
+        "steps": steps,
+        "fast_path": True,
+        "plan_source": "rule",
+        "plan_format": None,
+        "prompt_compaction": {"original_tokens": 1800, "compacted_tokens": 420, "saved_tokens": 1380},
+        "timings_ms": {"plan": 0.4, "skills": 12.5, "response": 0.2},
+        "deadline_exceeded": False,
+        "model_routing": {"plan_model": None, "response_model": None, "escalated": False},
+        "execution_time_ms": 14.2,
+        "llm_cost": 0.0,
+        "llm_usage": {"total": {"calls": 0, "cost": 0.0, "input_tokens": 0, "output_tokens": 0}}
+    }
+    chat_debug = {"success": True, "message": "您的快递正在运输中，预计1月28日送达。", "error": None, "debug": debug}
+    chat_lean = dict(chat_debug, debug=_lean_debug(debug))
+    decision = [{"step": 1, "skill": "query_logistics", "result": logistics}]
+
+    return {
+        "logistics": logistics,
+        "batch_orders": batch_orders,
+        "chat_debug": chat_debug,
+        "chat_lean": chat_lean,
+        "decision": decision
+    }
+
+
+def bench(fn, number: int) -> float:
+    """单次调用的平均耗时（微秒，取3轮中最快的一轮）"""
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON编解码微基准")
+    parser.add_argument("--number", type=int, default=2000, help="每轮调用次数")
+    args = parser.parse_args()
+
+    from app import json_codec
+
+    payloads = build_payloads()
+    backends = ["json"] + (["orjson"] if json_codec.orjson is not None else [])
+
+    print("=" * 72)
+    print(f"JSON编解码微基准: 每轮 {args.number} 次, 单位微秒/次（后端: {', '.join(backends)}）")
+    print("=" * 72)
+    print(f"{'负载':<14}{'字节':>8}{'stdlib编码':>12}{'stdlib解码':>12}" + "".join(f"{b + '编码':>12}{b + '解码':>12}" for b in backends))
+
+    for name, payload in payloads.items():
+        text = json.dumps(payload, ensure_ascii=False)
+        encoded = text.encode("utf-8")
+        row = [
+            bench(lambda: json.dumps(payload, ensure_ascii=False).encode("utf-8"), args.number),
+            bench(lambda: json.loads(encoded), args.number)
+        ]
+        for backend in backends:
+            json_codec.BACKEND = backend
+            row.append(bench(lambda: json_codec.dumps_bytes(payload), args.number))
+            row.append(bench(lambda: json_codec.loads(encoded), args.number))
+        print(f"{name:<14}{len(json_codec.dumps_bytes(payload)):>8}" + "".join(f"{value:>12.1f}" for value in row))
+
+    full = len(json_codec.dumps_bytes(payloads["chat_debug"]))
+    lean = len(json_codec.dumps_bytes(payloads["chat_lean"]))
+    print(f"\n/chat 响应体: 完整调试信息 {full} 字节, 精简模式 {lean} 字节（减少 {1 - lean / full:.0%}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,475 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+benchmarks/loadtest.py - 端到端压测与延迟基准
+
+一条命令启动三个进程并压测：
+1. mock_api_server（内部业务API）
+2. fake_llm_server（模拟Anthropic Messages API，延迟和错误可配置）
+3. app.main（被测后端，ANTHROPIC_BASE_URL 指向 fake_llm_server）
+
+按目标RPS（开环，按固定间隔发出请求，不等待上一个完成）回放一组加权的对话问法，
+统计吞吐、错误率、总延迟以及 plan / execute / response 各阶段的 p50/p95/p99，
+并采样每个进程的CPU和RSS。结果写入JSON文件，便于在不同提交之间对比。
+
+运行方式:
+    python benchmarks/loadtest.py --rps 20 --duration 30 --output results.json
+    python benchmarks/loadtest.py --rps 20 --duration 30 --env PLAN_CACHE_ENABLED=false --compare results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# 默认问法组合：template 中的 {order} 等占位符从 SLOT_VALUES 中随机取值
+DEFAULT_MIX: List[Dict[str, Any]] = [
+    {"name": "order_status", "template": "查询订单{order}的状态", "weight": 25},
+    {"name": "order_shipped", "template": "我的订单{order}发货了吗", "weight": 10},
+    {"name": "inventory", "template": "产品{product}还有多少库存", "weight": 20},
+    {"name": "logistics", "template": "{tracking}到哪了", "weight": 10},
+    {"name": "customer_orders", "template": "客户{customer}的订单", "weight": 5},
+    {"name": "delay_apology", "template": "订单{order}延迟了，发个道歉邮件给客户", "weight": 10},
+    {"name": "replenishment", "template": "帮我看看产品{product}是否需要补货", "weight": 5},
+    {"name": "report", "template": "生成本月的销售报表", "weight": 5},
+    {"name": "free_form", "template": "帮我分析一下订单{order}和产品{product}的情况", "weight": 10},
+]
+
+SLOT_VALUES: Dict[str, List[str]] = {
+    "order": ["12345", "999", "888", "777"],
+    "product": ["A", "B", "C", "D", "E"],
+    "tracking": ["SF1234567890", "YT9876543210", "JD8888999900"],
+    "customer": ["CUST001", "CUST002", "CUST003"],
+}
+
+STAGES = ("plan", "execute", "response")
+
+
+# ============ 进程管理 ============
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ManagedProcess:
+    """以子进程方式运行的uvicorn服务"""
+
+    def __init__(self, name: str, app: str, env: Dict[str, str], log_dir: str):
+        self.name = name
+        self.app = app
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.log_path = os.path.join(log_dir, f"{name}.log")
+        self._env = {**os.environ, **env}
+        self.proc: Optional[subprocess.Popen] = None
+
+    def start(self) -> None:
+        log_file = open(self.log_path, "w", encoding="utf-8")
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", self.app, "--host", "127.0.0.1",
+             "--port", str(self.port), "--log-level", "warning"],
+            cwd=ROOT, env=self._env, stdout=log_file, stderr=subprocess.STDOUT
+        )
+
+    def wait_ready(self, timeout: float = 30) -> None:
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"{self.name} 启动失败，日志: {self.log_path}")
+            try:
+                if httpx.get(f"{self.url}/", timeout=1).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"{self.name} 启动超时，日志: {self.log_path}")
+
+    def stop(self) -> None:
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+
+def read_process_usage(pid: int) -> Optional[Dict[str, float]]:
+    """读取进程累计CPU时间（秒）和RSS（字节），优先用psutil，否则读 /proc"""
+    try:
+        import psutil
+        proc = psutil.Process(pid)
+        cpu = proc.cpu_times()
+        return {"cpu_seconds": cpu.user + cpu.system, "rss_bytes": proc.memory_info().rss}
+    except ImportError:
+        pass
+    except Exception:
+        return None
+
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        ticks = os.sysconf("SC_CLK_TCK")
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / ticks  # utime + stime
+        rss_bytes = int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+        return {"cpu_seconds": cpu_seconds, "rss_bytes": rss_bytes}
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ResourceSampler:
+    """定期采样各进程的CPU和RSS"""
+
+    def __init__(self, processes: List[ManagedProcess], interval: float = 0.5):
+        self.processes = processes
+        self.interval = interval
+        self.samples: Dict[str, List[Dict[str, float]]] = {p.name: [] for p in processes}
+        self._task: Optional[asyncio.Task] = None
+
+    def _sample(self) -> None:
+        now = time.perf_counter()
+        for process in self.processes:
+            usage = read_process_usage(process.proc.pid)
+            if usage:
+                self.samples[process.name].append({"time": now, **usage})
+
+    async def _run(self) -> None:
+        while True:
+            self._sample()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._sample()
+
+    def report(self) -> Dict[str, Any]:
+        result = {}
+        for name, samples in self.samples.items():
+            if len(samples) < 2:
+                result[name] = None
+                continue
+            first, last = samples[0], samples[-1]
+            wall = last["time"] - first["time"]
+            result[name] = {
+                "cpu_percent": round((last["cpu_seconds"] - first["cpu_seconds"]) / wall * 100, 1) if wall > 0 else None,
+                "cpu_seconds": round(last["cpu_seconds"] - first["cpu_seconds"], 3),
+                "rss_mb_max": round(max(s["rss_bytes"] for s in samples) / 2**20, 1),
+                "rss_mb_end": round(last["rss_bytes"] / 2**20, 1),
+            }
+        return result
+
+
+# ============ 负载生成 ============
+
+def render_input(template: str, rng: random.Random) -> str:
+    return template.format(**{slot: rng.choice(values) for slot, values in SLOT_VALUES.items()})
+
+
+async def send_one(client: httpx.AsyncClient, item: Dict[str, Any], user_input: str) -> Dict[str, Any]:
+    """发送一个 /chat 请求并记录结果"""
+    record: Dict[str, Any] = {"name": item["name"]}
+    start = time.perf_counter()
+    try:
+        response = await client.post("/chat", params={"user_input": user_input, "user_id": "loadtest"})
+        record["latency_ms"] = (time.perf_counter() - start) * 1000
+        record["status"] = response.status_code
+        if response.status_code == 200:
+            body = response.json()
+            debug = body.get("debug") or {}
+            record["success"] = bool(body.get("success"))
+            record["timings"] = debug.get("timings_ms") or {}
+            record["plan_source"] = debug.get("plan_source")
+            record["fast_path"] = debug.get("fast_path")
+        else:
+            record["success"] = False
+    except httpx.HTTPError as e:
+        record["latency_ms"] = (time.perf_counter() - start) * 1000
+        record["status"] = None
+        record["success"] = False
+        record["error"] = type(e).__name__
+    return record
+
+
+async def drive(
+    base_url: str,
+    rps: float,
+    duration: float,
+    mix: List[Dict[str, Any]],
+    max_in_flight: int,
+    rng: random.Random
+) -> Dict[str, Any]:
+    """
+    开环压测：按 1/rps 的间隔发出请求，并发数超过 max_in_flight 时丢弃（记为dropped）
+
+    Returns:
+        {"records": [...], "sent": n, "dropped": n, "elapsed": 秒}
+    """
+    weights = [item["weight"] for item in mix]
+    total = int(rps * duration)
+    records: List[Dict[str, Any]] = []
+    tasks: List[asyncio.Task] = []
+    in_flight = 0
+    dropped = 0
+
+    async def tracked(item, user_input):
+        nonlocal in_flight
+        in_flight += 1
+        try:
+            records.append(await send_one(client, item, user_input))
+        finally:
+            in_flight -= 1
+
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        start = time.perf_counter()
+        for i in range(total):
+            delay = start + i / rps - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if in_flight >= max_in_flight:
+                dropped += 1
+                continue
+            item = rng.choices(mix, weights=weights)[0]
+            tasks.append(asyncio.create_task(tracked(item, render_input(item["template"], rng))))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    return {"records": records, "sent": len(tasks), "dropped": dropped, "elapsed": elapsed}
+
+
+# ============ 统计 ============
+
+def percentiles(values: List[float]) -> Optional[Dict[str, float]]:
+    """p50/p95/p99/mean/max（最近秩法）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def pick(p: float) -> float:
+        index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+        return round(ordered[index], 2)
+
+    return {
+        "count": len(ordered),
+        "p50": pick(50),
+        "p95": pick(95),
+        "p99": pick(99),
+        "mean": round(sum(ordered) / len(ordered), 2),
+        "max": round(ordered[-1], 2),
+    }
+
+
+def summarize(run: Dict[str, Any]) -> Dict[str, Any]:
+    records = run["records"]
+    ok = [r for r in records if r["success"]]
+    http_errors = [r for r in records if r["status"] != 200]
+
+    latency = {"total": percentiles([r["latency_ms"] for r in records])}
+    for stage in STAGES:
+        latency[stage] = percentiles([r["timings"][stage] for r in records if r.get("timings", {}).get(stage) is not None])
+
+    by_intent = {}
+    for name in sorted({r["name"] for r in records}):
+        group = [r for r in records if r["name"] == name]
+        stats = percentiles([r["latency_ms"] for r in group])
+        by_intent[name] = {
+            "count": len(group),
+            "error_rate": round(1 - sum(r["success"] for r in group) / len(group), 4),
+            "p50": stats["p50"],
+            "p95": stats["p95"],
+        }
+
+    plan_sources: Dict[str, int] = {}
+    for r in records:
+        if r.get("plan_source"):
+            plan_sources[r["plan_source"]] = plan_sources.get(r["plan_source"], 0) + 1
+
+    completed = len(records)
+    return {
+        "requests": {
+            "sent": run["sent"],
+            "completed": completed,
+            "succeeded": len(ok),
+            "http_errors": len(http_errors),
+            "dropped": run["dropped"],
+            "error_rate": round(1 - len(ok) / completed, 4) if completed else None,
+        },
+        "throughput_rps": round(completed / run["elapsed"], 2) if run["elapsed"] else None,
+        "success_rps": round(len(ok) / run["elapsed"], 2) if run["elapsed"] else None,
+        "latency_ms": latency,
+        "by_intent": by_intent,
+        "plan_sources": plan_sources,
+        "fast_path_ratio": round(sum(1 for r in records if r.get("fast_path")) / completed, 4) if completed else None,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]) -> None:
+    """打印与上一次结果的关键指标对比"""
+    rows = [("throughput_rps", current["throughput_rps"], previous.get("throughput_rps"))]
+    rows.append(("error_rate", current["requests"]["error_rate"], previous.get("requests", {}).get("error_rate")))
+    for stage in ("total",) + STAGES:
+        for p in ("p50", "p95", "p99"):
+            cur = (current["latency_ms"].get(stage) or {}).get(p)
+            prev = ((previous.get("latency_ms") or {}).get(stage) or {}).get(p)
+            rows.append((f"{stage}.{p}_ms", cur, prev))
+
+    print(f"\n对比 {previous.get('meta', {}).get('git_commit')} → {current['meta']['git_commit']}")
+    for name, cur, prev in rows:
+        if cur is None or prev is None:
+            print(f"  {name:<22} {prev!s:>10} → {cur!s:>10}")
+            continue
+        delta = (cur - prev) / prev * 100 if prev else 0.0
+        print(f"  {name:<22} {prev:>10} → {cur:>10}  ({delta:+.1f}%)")
+
+
+# ============ CLI ============
+
+def parse_env(pairs: List[str]) -> Dict[str, str]:
+    env = {}
+    for pair in pairs:
+        key, _, value = pair.partition("=")
+        env[key] = value
+    return env
+
+
+async def run_benchmark(args, app: ManagedProcess, processes: List[ManagedProcess]) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    mix = DEFAULT_MIX
+    if args.mix:
+        with open(args.mix, encoding="utf-8") as f:
+            mix = json.load(f)
+
+    if args.warmup > 0:
+        print(f"预热 {args.warmup}s ...")
+        await drive(app.url, args.rps, args.warmup, mix, args.max_in_flight, rng)
+
+    sampler = ResourceSampler(processes)
+    sampler.start()
+    print(f"压测 {args.duration}s @ {args.rps} RPS ...")
+    run = await drive(app.url, args.rps, args.duration, mix, args.max_in_flight, rng)
+    await sampler.stop()
+
+    result = summarize(run)
+    result["processes"] = sampler.report()
+    result["mix"] = mix
+
+    async with httpx.AsyncClient(timeout=10) as client:
+        metrics = (await client.get(f"{app.url}/metrics")).json()
+        result["app_metrics"] = {key: metrics.get(key) for key in ("plan_cache", "rule_router", "skill_cache", "prefetch", "prompt_compaction", "model_routing", "http_pool", "resilience", "single_flight", "batch_loader", "inventory_cache", "conditional_get", "llm_usage")}
+        fake_llm = next(p for p in processes if p.name == "fake_llm")
+        result["fake_llm_stats"] = (await client.get(f"{fake_llm.url}/_stats")).json()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端压测：app.main + mock_api_server + fake_llm_server")
+    parser.add_argument("--rps", type=float, default=10, help="目标每秒请求数")
+    parser.add_argument("--duration", type=float, default=20, help="压测时长（秒）")
+    parser.add_argument("--warmup", type=float, default=3, help="预热时长（秒，不计入结果）")
+    parser.add_argument("--max-in-flight", type=int, default=200, help="最大并发请求数（超过则丢弃）")
+    parser.add_argument("--mix", help="问法组合JSON文件（[{name, template, weight}]）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--llm-latency-ms", type=float, default=800, help="假LLM首token平均延迟")
+    parser.add_argument("--llm-jitter-ms", type=float, default=200, help="假LLM延迟抖动")
+    parser.add_argument("--llm-dist", default="lognormal", choices=["fixed", "uniform", "normal", "lognormal"])
+    parser.add_argument("--llm-token-ms", type=float, default=5, help="假LLM每个输出token耗时")
+    parser.add_argument("--llm-error-rate", type=float, default=0, help="假LLM 500错误比例")
+    parser.add_argument("--llm-overload-rate", type=float, default=0, help="假LLM 529过载比例")
+    parser.add_argument("--env", action="append", default=[], help="传给 app.main 的环境变量，如 FAST_PATH_MODE=false")
+    parser.add_argument("--output", default="loadtest_results.json", help="结果JSON文件")
+    parser.add_argument("--compare", help="与之前的结果JSON对比")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="loadtest_")
+    mock_api = ManagedProcess("mock_api", "mock_api_server:app", {}, work_dir)
+    fake_llm = ManagedProcess("fake_llm", "fake_llm_server:app", {
+        "FAKE_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "FAKE_LLM_LATENCY_JITTER_MS": str(args.llm_jitter_ms),
+        "FAKE_LLM_LATENCY_DIST": args.llm_dist,
+        "FAKE_LLM_TOKEN_MS": str(args.llm_token_ms),
+        "FAKE_LLM_ERROR_RATE": str(args.llm_error_rate),
+        "FAKE_LLM_OVERLOAD_RATE": str(args.llm_overload_rate),
+        "FAKE_LLM_SEED": str(args.seed),
+    }, work_dir)
+    app_env = {
+        "CLAUDE_API_KEY": "sk-ant-loadtest",
+        "ANTHROPIC_BASE_URL": fake_llm.url,
+        "ORDER_API_BASE": mock_api.url,
+        "INVENTORY_API_BASE": mock_api.url,
+        "LOGISTICS_API_BASE": mock_api.url,
+        "USE_REAL_SKILLS": "true",
+        "SKILL_BATCH_LOADER": "true",  # Mock API Server 提供批量接口
+        "EMAIL_MODE": "mock",
+        "DATABASE_URL": f"sqlite:///{os.path.join(work_dir, 'loadtest.db')}",
+        **parse_env(args.env),
+    }
+    app = ManagedProcess("app", "app.main:app", app_env, work_dir)
+    processes = [mock_api, fake_llm, app]
+
+    try:
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.wait_ready()
+        result = asyncio.run(run_benchmark(args, app, processes))
+    finally:
+        for process in processes:
+            process.stop()
+
+    result = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "git_commit": git_commit(),
+            "args": vars(args),
+            "logs": work_dir,
+        },
+        **result,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    requests = result["requests"]
+    print("=" * 60)
+    print(f"吞吐 {result['throughput_rps']} req/s，成功 {requests['succeeded']}/{requests['completed']}，"
+          f"错误率 {requests['error_rate']}，丢弃 {requests['dropped']}")
+    for stage, stats in result["latency_ms"].items():
+        if stats:
+            print(f"  {stage:<9} p50 {stats['p50']:>8.1f}ms  p95 {stats['p95']:>8.1f}ms  p99 {stats['p99']:>8.1f}ms")
+    for name, stats in result["processes"].items():
+        if stats:
+            print(f"  {name:<9} CPU {stats['cpu_percent']:>5}%  RSS max {stats['rss_mb_max']}MB")
+    print(f"结果已写入 {args.output}（进程日志: {work_dir}）")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,445 @@
+"""
+Fake LLM Server - 模拟 Anthropic Messages API
+用于离线压测和延迟分析，不消耗API额度
+
+- 对已知问法返回确定性的执行计划和回复
+- 可配置延迟分布（首token延迟 + 每个输出片段的延迟）
+- 按文本长度估算token用量，模拟提示缓存（带 cache_control 的 system 前缀）
+- 可按比例注入 500 / 429 / 529(overloaded) 错误
+
+运行方式:
+    uvicorn fake_llm_server:app --port 9100
+    或 python fake_llm_server.py --port 9100 --latency-ms 800 --overload-rate 0.05
+
+让编排器使用它：
+    ANTHROPIC_BASE_URL=http://localhost:9100
+
+运行时调整配置：
+    POST /_config {"latency_ms": 300, "error_rate": 0.1}
+    GET  /_stats
+"""
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import time
+import uuid
+
+from app.entities import extract_entities
+
+app = FastAPI(title="Fake Anthropic Messages API", version="1.0.0")
+
+# ============ 配置 ============
+
+CONFIG: Dict[str, Any] = {
+    # 首token延迟（毫秒）及其分布：fixed / uniform / normal / lognormal
+    "latency_ms": float(os.getenv("FAKE_LLM_LATENCY_MS", "800")),
+    "latency_jitter_ms": float(os.getenv("FAKE_LLM_LATENCY_JITTER_MS", "200")),
+    "latency_dist": os.getenv("FAKE_LLM_LATENCY_DIST", "normal"),
+    # 每个输出token的生成时间（毫秒）
+    "token_ms": float(os.getenv("FAKE_LLM_TOKEN_MS", "5")),
+    # 小模型（模型名含 haiku）的延迟倍数，用于评估模型分级
+    "small_model_latency_factor": float(os.getenv("FAKE_LLM_SMALL_MODEL_FACTOR", "0.4")),
+    # 错误注入比例
+    "error_rate": float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+    "rate_limit_rate": float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", "0")),
+    "overload_rate": float(os.getenv("FAKE_LLM_OVERLOAD_RATE", "0")),
+    # 提示缓存有效期（秒）
+    "cache_ttl": float(os.getenv("FAKE_LLM_CACHE_TTL", "300")),
+    # 随机数种子（延迟采样和错误注入可复现）
+    "seed": int(os.getenv("FAKE_LLM_SEED", "42")),
+}
+
+_rng = random.Random(CONFIG["seed"])
+_prompt_cache: Dict[str, float] = {}  # 缓存前缀哈希 → 过期时间
+
+STATS: Dict[str, Any] = {}
+
+
+def _reset_stats() -> None:
+    STATS.clear()
+    STATS.update({
+        "requests": 0,
+        "streamed": 0,
+        "plan_requests": 0,
+        "response_requests": 0,
+        "tool_use": 0,
+        "models": {},
+        "injected_errors": {"api_error": 0, "rate_limit_error": 0, "overloaded_error": 0},
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "cache_creation_input_tokens": 0,
+        "cache_read_input_tokens": 0,
+    })
+
+
+_reset_stats()
+
+
+# ============ 计划与回复 ============
+
+def _step(skill: str, params: Dict[str, Any], description: str) -> Dict[str, Any]:
+    return {"step": 1, "skill": skill, "params": params, "description": description}
+
+
+def build_plan(user_input: str) -> Dict[str, Any]:
+    """根据问法生成确定性的执行计划"""
+    entities: Dict[str, str] = {}
+    for entity in extract_entities(user_input):
+        entities.setdefault(entity.kind, entity.value)
+
+    order_id = entities.get("order_id")
+    product_id = entities.get("product_id")
+    customer_id = entities.get("customer_id")
+
+    if order_id and ("延迟" in user_input or "道歉" in user_input):
+        return {
+            "intent": "处理延迟订单",
+            "steps": [
+                _step("get_order", {"order_id": order_id}, "查询订单信息"),
+                {**_step("send_notification", {
+                    "to": "$customer_email",
+                    "template": "order_delay",
+                    "context": {
+                        "order_id": order_id,
+                        "reason": "物流繁忙",
+                        "create_time": "见订单详情",
+                        "original_eta": "见订单详情",
+                        "new_eta": "顺延2天",
+                        "compensation": "10元优惠券"
+                    }
+                }, "发送道歉邮件"), "step": 2}
+            ]
+        }
+    if order_id and "取消" in user_input:
+        return {"intent": "取消订单", "steps": [_step("update_order_status", {"order_id": order_id, "status": "已取消"}, "取消订单")]}
+    if order_id and "退款" in user_input:
+        return {"intent": "申请退款", "steps": [_step("create_refund", {"order_id": order_id, "reason": "客户申请"}, "创建退款申请")]}
+    if order_id:
+        return {
+            "intent": "查询订单",
+            "steps": [_step("get_order", {"order_id": order_id}, "查询订单信息")],
+            "final_response_template": "订单{order_id}当前状态：{status}"
+        }
+    if "tracking_number" in entities:
+        return {
+            "intent": "查询物流",
+            "steps": [_step("query_logistics", {"tracking_number": entities["tracking_number"]}, "查询物流信息")],
+            "final_response_template": "物流单号{tracking}（{carrier}）当前状态：{status}"
+        }
+    if product_id and "补货" in user_input:
+        return {"intent": "补货建议", "steps": [_step("get_replenishment_suggestion", {"product_id": product_id}, "获取补货建议")]}
+    if product_id:
+        return {
+            "intent": "查询库存",
+            "steps": [_step("query_inventory", {"product_id": product_id}, "查询库存")],
+            "final_response_template": "{product_name}当前库存{stock}件，状态：{status}，所在仓库：{warehouse}"
+        }
+    if customer_id and "订单" in user_input:
+        return {"intent": "查询客户订单", "steps": [_step("get_customer_orders", {"customer_id": customer_id}, "查询客户订单历史")]}
+    if customer_id:
+        return {
+            "intent": "查询客户",
+            "steps": [_step("get_customer", {"customer_id": customer_id}, "查询客户信息")],
+            "final_response_template": "客户{name}，会员等级：{level}"
+        }
+    if "refund_id" in entities:
+        return {"intent": "查询退款", "steps": [_step("get_refund", {"refund_id": entities["refund_id"]}, "查询退款申请")]}
+    if "replenishment_id" in entities:
+        return {"intent": "查询补货申请", "steps": [_step("get_replenishment", {"replenishment_id": entities["replenishment_id"]}, "查询补货申请")]}
+    if "报表" in user_input or "报告" in user_input:
+        return {"intent": "生成报表", "steps": [_step("generate_report", {"report_type": "sales"}, "生成销售报表")]}
+    if "促销" in user_input or "活动" in user_input:
+        return {"intent": "查询促销", "steps": [_step("query_promotions", {}, "查询促销活动")]}
+    return {"intent": "闲聊", "steps": [], "final_response_template": "您好，请告诉我需要查询的订单、库存或物流信息。"}
+
+
+def build_response(prompt: str) -> str:
+    """根据回复生成提示词生成确定性的回复"""
+    user_input = _search(r'用户输入[:：]\s*"(.*?)"', prompt) or "您的请求"
+    intent = _search(r"执行计划[:：]\s*(.+)", prompt) or "处理"
+    failed = "失败" in (_search(r"执行结果[:：]\s*\n(.+)", prompt) or "")
+    if failed:
+        return f"抱歉，关于「{user_input}」的{intent}没有成功，请稍后再试或联系人工客服。"
+    return f"您好，关于「{user_input}」，{intent}已完成。如需更多帮助请随时告诉我。"
+
+
+def _search(pattern: str, text: str) -> Optional[str]:
+    match = re.search(pattern, text)
+    return match.group(1).strip() if match else None
+
+
+# ============ 请求解析与用量估算 ============
+
+def count_tokens(text: str) -> int:
+    """粗略估算token数（UTF-8字节数 / 4）"""
+    return max(1, math.ceil(len(text.encode("utf-8")) / 4)) if text else 0
+
+
+def _block_text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") for block in content if isinstance(block, dict))
+
+
+def _system_blocks(system: Any) -> List[Dict[str, Any]]:
+    if not system:
+        return []
+    if isinstance(system, str):
+        return [{"type": "text", "text": system}]
+    return list(system)
+
+
+def compute_usage(
+    model: str,
+    system: Any,
+    messages: List[Dict[str, Any]],
+    output_text: str,
+    tools: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, int]:
+    """估算用量：带 cache_control 的 system 块（连同前面的工具定义）按提示缓存计费（首次写入，之后读取）"""
+    tools_text = json.dumps(tools, ensure_ascii=False, sort_keys=True) if tools else ""
+    cached_tokens, uncached_text = 0, ""
+    cache_key = None
+    for block in _system_blocks(system):
+        if block.get("cache_control"):
+            cached_tokens += count_tokens(tools_text + block.get("text", ""))
+            cache_key = hashlib.sha256((model + tools_text + block.get("text", "")).encode("utf-8")).hexdigest()
+            tools_text = ""
+        else:
+            uncached_text += block.get("text", "")
+    uncached_text += tools_text
+    uncached_text += "".join(_block_text(m.get("content", "")) for m in messages)
+
+    cache_creation, cache_read = 0, 0
+    if cache_key:
+        now = time.monotonic()
+        if _prompt_cache.get(cache_key, 0) > now:
+            cache_read = cached_tokens
+        else:
+            cache_creation = cached_tokens
+        _prompt_cache[cache_key] = now + CONFIG["cache_ttl"]
+
+    return {
+        "input_tokens": count_tokens(uncached_text),
+        "output_tokens": count_tokens(output_text),
+        "cache_creation_input_tokens": cache_creation,
+        "cache_read_input_tokens": cache_read,
+    }
+
+
+def sample_latency(model: str = "") -> float:
+    """按配置的分布采样首token延迟（秒），小模型乘以 small_model_latency_factor"""
+    mean, jitter, dist = CONFIG["latency_ms"], CONFIG["latency_jitter_ms"], CONFIG["latency_dist"]
+    if dist == "fixed" or jitter <= 0:
+        value = mean
+    elif dist == "uniform":
+        value = _rng.uniform(mean - jitter, mean + jitter)
+    elif dist == "lognormal":
+        # 长尾分布：中位数约为 mean
+        sigma = math.log1p(jitter / mean) if mean > 0 else 0.5
+        value = mean * math.exp(_rng.gauss(0, sigma))
+    else:
+        value = _rng.gauss(mean, jitter)
+    if "haiku" in model:
+        value *= CONFIG["small_model_latency_factor"]
+    return max(0.0, value) / 1000
+
+
+def inject_error() -> Optional[Tuple[int, str, str]]:
+    """按比例注入错误，返回 (状态码, 错误类型, 消息)"""
+    roll = _rng.random()
+    for rate_key, status, error_type, message in (
+        ("overload_rate", 529, "overloaded_error", "Overloaded"),
+        ("rate_limit_rate", 429, "rate_limit_error", "Number of requests has exceeded your rate limit"),
+        ("error_rate", 500, "api_error", "Internal server error"),
+    ):
+        rate = CONFIG[rate_key]
+        if roll < rate:
+            return status, error_type, message
+        roll -= rate
+    return None
+
+
+def _error_response(status: int, error_type: str, message: str) -> JSONResponse:
+    headers = {"retry-after": "1"} if status == 429 else {}
+    return JSONResponse(
+        status_code=status,
+        content={"type": "error", "error": {"type": error_type, "message": message}},
+        headers=headers
+    )
+
+
+# ============ 接口 ============
+
+@app.get("/")
+def root():
+    """健康检查"""
+    return {"status": "Fake LLM Server Running", "config": CONFIG}
+
+
+@app.post("/v1/messages")
+async def create_message(request: Request):
+    """模拟 Messages API（支持 stream=true）"""
+    body = await request.json()
+    model = body.get("model", "claude-sonnet-4-20250514")
+    system = body.get("system")
+    messages = body.get("messages", [])
+    STATS["requests"] += 1
+    STATS["models"][model] = STATS["models"].get(model, 0) + 1
+
+    injected = inject_error()
+    if injected:
+        STATS["injected_errors"][injected[1]] += 1
+        await asyncio.sleep(sample_latency() / 4)
+        return _error_response(*injected)
+
+    tools = body.get("tools") or []
+    tool_name = (body.get("tool_choice") or {}).get("name") or (tools[0]["name"] if tools else None)
+    system_text = "".join(block.get("text", "") for block in _system_blocks(system))
+    prompt = _block_text(messages[-1].get("content", "")) if messages else ""
+    tool_input = None
+    if "编排器" in system_text or "编排器" in prompt:
+        STATS["plan_requests"] += 1
+        first_prompt = _block_text(messages[0].get("content", "")) if messages else ""
+        user_input = _search(r'用户输入[:：]\s*"(.*?)"', first_prompt) or first_prompt
+        plan = build_plan(user_input)
+        text = json.dumps(plan, ensure_ascii=False)
+        if tool_name:
+            STATS["tool_use"] += 1
+            tool_input = plan
+    else:
+        STATS["response_requests"] += 1
+        text = build_response(prompt)
+
+    usage = compute_usage(model, system, messages, text, tools)
+    for key, value in usage.items():
+        STATS[key] += value
+
+    message_id = f"msg_fake_{uuid.uuid4().hex[:24]}"
+    first_token_delay = sample_latency(model)
+
+    if body.get("stream"):
+        STATS["streamed"] += 1
+        return StreamingResponse(
+            _stream_events(message_id, model, text, usage, first_token_delay),
+            media_type="text/event-stream"
+        )
+
+    await asyncio.sleep(first_token_delay + usage["output_tokens"] * CONFIG["token_ms"] / 1000)
+    if tool_input is not None:
+        return {
+            "id": message_id,
+            "type": "message",
+            "role": "assistant",
+            "model": model,
+            "content": [{"type": "tool_use", "id": f"toolu_fake_{uuid.uuid4().hex[:24]}", "name": tool_name, "input": tool_input}],
+            "stop_reason": "tool_use",
+            "stop_sequence": None,
+            "usage": usage
+        }
+    return {
+        "id": message_id,
+        "type": "message",
+        "role": "assistant",
+        "model": model,
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": usage
+    }
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _stream_events(message_id: str, model: str, text: str, usage: Dict[str, int], first_token_delay: float):
+    """按Anthropic流式事件格式输出"""
+    start_usage = {**usage, "output_tokens": 1}
+    yield _sse("message_start", {"type": "message_start", "message": {
+        "id": message_id, "type": "message", "role": "assistant", "model": model, "content": [],
+        "stop_reason": None, "stop_sequence": None, "usage": start_usage
+    }})
+    yield _sse("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+    await asyncio.sleep(first_token_delay)
+
+    chunk_size = 4
+    for i in range(0, len(text), chunk_size):
+        chunk = text[i:i + chunk_size]
+        yield _sse("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": chunk}})
+        await asyncio.sleep(count_tokens(chunk) * CONFIG["token_ms"] / 1000)
+
+    yield _sse("content_block_stop", {"type": "content_block_stop", "index": 0})
+    yield _sse("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                 "usage": {"output_tokens": usage["output_tokens"]}})
+    yield _sse("message_stop", {"type": "message_stop"})
+
+
+@app.get("/_config")
+def get_config():
+    """查看当前配置"""
+    return CONFIG
+
+
+@app.post("/_config")
+async def update_config(request: Request):
+    """运行时调整配置（只更新传入的字段）"""
+    updates = await request.json()
+    unknown = set(updates) - set(CONFIG)
+    if unknown:
+        return JSONResponse(status_code=400, content={"error": f"未知配置项: {sorted(unknown)}"})
+    for key, value in updates.items():
+        CONFIG[key] = type(CONFIG[key])(value)
+    if "seed" in updates:
+        _rng.seed(CONFIG["seed"])
+    return CONFIG
+
+
+@app.get("/_stats")
+def get_stats():
+    """请求与用量统计"""
+    return STATS
+
+
+@app.post("/_reset")
+def reset():
+    """清空统计和提示缓存"""
+    _reset_stats()
+    _prompt_cache.clear()
+    return {"status": "reset"}
+
+
+if __name__ == "__main__":
+    import argparse
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake Anthropic Messages API")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, help="首token平均延迟（毫秒）")
+    parser.add_argument("--latency-jitter-ms", type=float, help="延迟抖动（毫秒）")
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "normal", "lognormal"])
+    parser.add_argument("--token-ms", type=float, help="每个输出token的生成时间（毫秒）")
+    parser.add_argument("--error-rate", type=float, help="500错误比例")
+    parser.add_argument("--rate-limit-rate", type=float, help="429错误比例")
+    parser.add_argument("--overload-rate", type=float, help="529过载错误比例")
+    args = parser.parse_args()
+
+    for key, value in vars(args).items():
+        if key in CONFIG and value is not None:
+            CONFIG[key] = value
+
+    print("=" * 50)
+    print("Fake LLM Server (Anthropic Messages API)")
+    print("=" * 50)
+    print(f"Starting on http://localhost:{args.port}")
+    print(f"设置 ANTHROPIC_BASE_URL=http://localhost:{args.port} 让编排器使用它")
+    print(f"配置: {CONFIG}")
+    print("=" * 50)
+    uvicorn.run(app, host="0.0.0.0", port=args.port)
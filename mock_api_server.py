@@ -5,11 +5,69 @@ Mock API Server - 模拟内部订单和库存系统API
 运行方式:
     uvicorn mock_api_server:app --port 9000
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
 from datetime import datetime
 from typing import Dict, Any, List
+import hashlib
+import json
 
-app = FastAPI(title="Mock Internal API", version="1.0.0")
+try:
+    import orjson  # 可选：安装了 orjson 时用它序列化响应，否则使用标准库
+except ImportError:
+    orjson = None
+
+
+class MockJSONResponse(JSONResponse):
+    """安装了 orjson 时用 orjson 序列化的 JSONResponse"""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        return super().render(content)
+
+
+def _canonical_json(value: Any) -> bytes:
+    """按键排序的JSON（计算ETag用）"""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+app = FastAPI(title="Mock Internal API", version="1.0.0", default_response_class=MockJSONResponse)
+
+
+def _without_query_time(value: Any) -> Any:
+    """去掉每次请求都会变的 query_time，只按数据内容计算 ETag"""
+    if isinstance(value, dict):
+        return {k: _without_query_time(v) for k, v in value.items() if k != "query_time"}
+    if isinstance(value, list):
+        return [_without_query_time(v) for v in value]
+    return value
+
+
+@app.middleware("http")
+async def conditional_get(request: Request, call_next):
+    """
+    GET接口的ETag支持
+
+    200响应按数据内容（不含 query_time）生成弱ETag；请求的 If-None-Match 匹配时
+    返回没有响应体的304，客户端复用上次的结果。
+    """
+    response = await call_next(request)
+    if request.method != "GET" or response.status_code != 200 or not request.url.path.startswith("/api/"):
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    data = orjson.loads(body) if orjson is not None else json.loads(body)
+    etag = f'W/"{hashlib.sha1(_canonical_json(_without_query_time(data))).hexdigest()[:16]}"'
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers={"ETag": etag})
+
+    headers = {k: v for k, v in response.headers.items() if k.lower() != "content-length"}
+    headers["ETag"] = etag
+    return Response(content=body, status_code=200, headers=headers, media_type=response.media_type)
 
 # 模拟订单数据库
 ORDERS_DB = {
@@ -359,6 +417,7 @@ async def root():
             "refunds": "/api/refunds/{refund_id}",
             "replenishment": "/api/replenishment/{replenishment_id}",
             "reports": "/api/reports/{report_type}",
+            "batch": "/api/batch/{orders|inventory|logistics|customers}?ids=ID1,ID2",
             "health": "/health"
         }
     }
@@ -588,6 +647,66 @@ async def get_customer_orders(customer_id: str) -> Dict[str, Any]:
     }
 
 
+# ==================== 批量查询API ====================
+
+BATCH_MAX_IDS = 100  # 单次批量查询最多的ID数
+
+
+def _batch_lookup(db: Dict[str, Dict[str, Any]], ids: str) -> Dict[str, Any]:
+    """
+    按逗号分隔的ID列表批量查询
+
+    Args:
+        db: 数据表
+        ids: 逗号分隔的ID列表
+
+    Returns:
+        找到的记录（按ID）和不存在的ID
+
+    Raises:
+        HTTPException: ID数量超过上限时返回400
+    """
+    id_list = list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip()))
+    if len(id_list) > BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"单次最多查询 {BATCH_MAX_IDS} 个ID")
+
+    query_time = datetime.now().isoformat()
+    items = {}
+    for item_id in id_list:
+        if item_id in db:
+            items[item_id] = {**db[item_id], "query_time": query_time}
+    return {
+        "total": len(items),
+        "items": items,
+        "missing": [i for i in id_list if i not in items],
+        "query_time": query_time
+    }
+
+
+@app.get("/api/batch/orders")
+async def batch_get_orders(ids: str) -> Dict[str, Any]:
+    """批量获取订单信息（ids: 逗号分隔的订单ID）"""
+    return _batch_lookup(ORDERS_DB, ids)
+
+
+@app.get("/api/batch/inventory")
+async def batch_get_inventory(ids: str) -> Dict[str, Any]:
+    """批量获取库存信息（ids: 逗号分隔的产品ID）"""
+    return _batch_lookup(INVENTORY_DB, ids)
+
+
+@app.get("/api/batch/logistics")
+async def batch_get_logistics(ids: str) -> Dict[str, Any]:
+    """批量获取物流信息（ids: 逗号分隔的物流单号）"""
+    return _batch_lookup(LOGISTICS_DB, ids)
+
+
+@app.get("/api/batch/customers")
+async def batch_get_customers(ids: str) -> Dict[str, Any]:
+    """批量获取客户信息（ids: 逗号分隔的客户ID）"""
+    return _batch_lookup(CUSTOMERS_DB, ids)
+
+
 # ==================== 退款相关API ====================
 
 @app.get("/api/refunds/{refund_id}")
@@ -900,5 +1019,7 @@ if __name__ == "__main__":
     print("  - 退款处理 (/api/refunds)")
     print("  - 智能补货 (/api/replenishment)")
     print("  - 业务报表 (/api/reports)")
+    print("  - 批量查询 (/api/batch/*)")
+    print("  - 条件请求 (GET接口返回ETag，If-None-Match匹配时返回304)")
     print("=" * 50)
     uvicorn.run(app, host="0.0.0.0", port=9000)
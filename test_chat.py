@@ -3,6 +3,8 @@
 """
 测试聊天API
 确保后端正在运行: uvicorn app.main:app --reload
+离线测试（不消耗API额度）: 先运行 python fake_llm_server.py，
+再以 ANTHROPIC_BASE_URL=http://localhost:9100 启动后端
 """
 
 import sys
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试共用的模拟上游
+
+技能测试不启动任何服务：模拟上游作为 transport 挂到 HTTPTransportManager 的 mounts 上，
+技能通过构造参数 transport 使用它（与生产环境共用同一条请求路径）。
+pytest 会自动加载本文件；直接运行测试脚本时 tests/ 在 sys.path 中，同样可以 from conftest import。
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import threading
+from typing import Callable, List, Optional
+import httpx
+from app.http_transport import HTTPTransportManager
+from app.resilience import ResilienceManager
+from app.single_flight import SingleFlight
+
+
+class MockUpstream(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    模拟上游：记录请求路径，响应由 respond 生成（同步、异步请求都支持）
+
+    简单场景直接传入 handler；需要状态的场景继承后重写 respond（异步请求需要不阻塞事件循环时重写 arespond）。
+    """
+
+    def __init__(self, handler: Optional[Callable[[httpx.Request], httpx.Response]] = None):
+        self.handler = handler
+        self.paths: List[str] = []
+        self._lock = threading.Lock()
+
+    @property
+    def calls(self) -> int:
+        """收到的请求数"""
+        return len(self.paths)
+
+    def respond(self, request: httpx.Request) -> httpx.Response:
+        return self.handler(request)
+
+    async def arespond(self, request: httpx.Request) -> httpx.Response:
+        return self.respond(request)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self._record(request)
+        return self.respond(request)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self._record(request)
+        return await self.arespond(request)
+
+    def _record(self, request: httpx.Request) -> None:
+        with self._lock:
+            self.paths.append(request.url.path)
+
+    def transport(self) -> HTTPTransportManager:
+        """所有请求都交给本上游的连接池"""
+        return HTTPTransportManager(mounts={"all://": self})
+
+
+class MockAPIUpstream(MockUpstream):
+    """把请求（包括条件请求头）转发给进程内的 Mock API Server，记录响应状态码"""
+
+    def __init__(self):
+        super().__init__()
+        from fastapi.testclient import TestClient
+        import mock_api_server
+        self.api = TestClient(mock_api_server.app)
+        self.statuses: List[int] = []
+
+    def respond(self, request: httpx.Request) -> httpx.Response:
+        headers = {k: v for k, v in request.headers.items() if k.lower() == "if-none-match"}
+        response = self.api.request(request.method, request.url.path, params=dict(request.url.params), headers=headers)
+        self.statuses.append(response.status_code)
+        return httpx.Response(response.status_code, content=response.content, headers=dict(response.headers))
+
+
+def make_skill(skill_class, upstream: MockUpstream, api_base: str = "http://upstream", resilience: Optional[ResilienceManager] = None):
+    """
+    创建请求发往模拟上游的技能
+
+    每个技能使用独立的请求合并器，默认不重试（重试测试传入自己的 ResilienceManager）。
+    """
+    skill = skill_class(
+        api_base=api_base,
+        transport=upstream.transport(),
+        resilience=resilience or ResilienceManager(max_retries=0)
+    )
+    skill.single_flight = SingleFlight()
+    return skill
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+异步技能测试
+验证同步/异步两种技能调用方式结果一致，且错误处理对两者都生效
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import unittest
+import httpx
+from conftest import MockUpstream
+from app.http_transport import HTTPTransportManager
+from app.skills_real import OrderSkill, InventorySkill
+from app.notification_skill import NotificationSkill
+from app.database import Database
+
+
+def mock_handler(request: httpx.Request) -> httpx.Response:
+    """模拟内部系统API"""
+    if request.url.path == "/api/orders/12345":
+        return httpx.Response(200, json={"status": "已发货", "tracking": "SF1234567890"})
+    if request.url.path == "/api/inventory/A":
+        return httpx.Response(200, json={"stock": 100, "status": "正常"})
+    return httpx.Response(404, json={"detail": "not found"})
+
+
+def mock_transport(handler=mock_handler) -> HTTPTransportManager:
+    """所有上游请求都交给 handler 的连接池"""
+    return MockUpstream(handler).transport()
+
+
+class TestAsyncSkills(unittest.TestCase):
+    """同步/异步技能一致性测试"""
+
+    def new_loop(self):
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        return loop
+
+    def test_order_sync_async_equal(self):
+        """测试订单查询同步/异步结果一致"""
+        skill = OrderSkill(api_base="http://mock", transport=mock_transport())
+        loop = self.new_loop()
+
+        sync_result = skill.get_order("12345")
+        async_result = loop.run_until_complete(skill.aget_order("12345"))
+
+        self.assertTrue(sync_result["success"])
+        self.assertEqual(sync_result, async_result)
+        print("✅ 订单查询同步/异步一致")
+
+    def test_not_found(self):
+        """测试404在异步模式下的处理"""
+        skill = InventorySkill(api_base="http://mock", transport=mock_transport())
+        loop = self.new_loop()
+
+        result = loop.run_until_complete(skill.aquery_inventory("Z"))
+        self.assertFalse(result["success"])
+        self.assertEqual(result["error"], "产品不存在")
+        print("✅ 异步404处理测试通过")
+
+    def test_connect_error(self):
+        """测试连接失败异常被抛回流程处理"""
+        def refuse(request):
+            raise httpx.ConnectError("refused", request=request)
+
+        skill = OrderSkill(api_base="http://mock", transport=mock_transport(refuse))
+        loop = self.new_loop()
+
+        result = loop.run_until_complete(skill.aget_order("12345"))
+        self.assertFalse(result["success"])
+        self.assertEqual(result["status"], "连接失败")
+        print("✅ 异步连接失败处理测试通过")
+
+    def test_async_notification(self):
+        """测试异步模板邮件"""
+        skill = NotificationSkill(mode="mock")
+        result = asyncio.run(skill.asend_notification(
+            to="customer@example.com",
+            template="order_shipped",
+            context={"order_id": "12345", "carrier": "顺丰", "tracking": "SF1", "eta": "明天"}
+        ))
+        self.assertTrue(result["success"])
+        self.assertEqual(result["subject"], "订单已发货")
+        unknown = {"success": False, "error": "未知的模板: nope"}
+        self.assertEqual(asyncio.run(skill.asend_notification("customer@example.com", "nope", {})), unknown)
+        self.assertEqual(skill.send_notification("customer@example.com", "nope", {}), unknown)
+        print("✅ 异步通知邮件测试通过")
+
+    def test_async_save_decision(self):
+        """测试异步保存决策记录"""
+        db = Database(db_path=":memory:")
+        decision_id = asyncio.run(db.asave_decision(
+            user_input="测试输入",
+            intent="测试意图",
+            action="test_action",
+            result={"status": "ok"}
+        ))
+        self.assertGreater(decision_id, 0)
+        self.assertEqual(db.get_recent_decisions(limit=1)[0]["intent"], "测试意图")
+        print("✅ 异步保存决策记录测试通过")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+批量查询测试
+技能请求通过 conftest.MockAPIUpstream 转发给进程内的 Mock API Server，不需要启动服务
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import conftest
+from conftest import make_skill
+from app.batch_loader import BatchLoader
+from app.skills_real import OrderSkill, CustomerSkill
+
+
+class MockAPIUpstream(conftest.MockAPIUpstream):
+    """可以模拟连接失败、批量接口返回指定状态码的 Mock API Server"""
+
+    def __init__(self, fail=False, batch_status=None):
+        super().__init__()
+        self.fail = fail
+        self.batch_status = batch_status
+
+    def respond(self, request):
+        if self.fail:
+            raise httpx.ConnectError("refused", request=request)
+        if self.batch_status and request.url.path.startswith("/api/batch/"):
+            return httpx.Response(self.batch_status, json={"detail": "Not Found"})
+        return super().respond(request)
+
+
+def without_time(result):
+    return {k: v for k, v in result.items() if k != "query_time"}
+
+
+class TestBatchLoader(unittest.TestCase):
+    """窗口内单条查询合并为批量请求"""
+
+    def test_threaded_lookups_batched(self):
+        """线程池中并发查询不同订单只发一次批量请求，结果与逐条查询相同（包括不存在的订单）"""
+        upstream = MockAPIUpstream()
+        skill = make_skill(OrderSkill, upstream)
+        order_ids = ["12345", "999", "888", "777", "404", "12345"]
+        expected = [without_time(skill.get_order(i)) for i in order_ids]
+        upstream.paths.clear()
+
+        skill.order_loader = BatchLoader("get_order", skill.get_orders_batch, skill.aget_orders_batch, window=0.05)
+        with ThreadPoolExecutor(max_workers=len(order_ids)) as pool:
+            results = list(pool.map(skill.get_order, order_ids))
+
+        self.assertEqual([without_time(r) for r in results], expected)
+        self.assertEqual(upstream.paths, ["/api/batch/orders"])
+        stats = skill.order_loader.stats()
+        self.assertEqual((stats["loads"], stats["batches"], stats["largest_batch"]), (5, 1, 5))
+        print("✅ 同步批量查询测试通过")
+
+    def test_async_lookups_batched(self):
+        """异步并发查询按 max_batch_size 分批；只有一个ID时走单条查询接口"""
+        upstream = MockAPIUpstream()
+        skill = make_skill(CustomerSkill, upstream)
+        skill.customer_loader = BatchLoader(
+            "get_customer", skill.get_customers_batch, skill.aget_customers_batch, window=0.05, max_batch_size=2
+        )
+
+        async def run():
+            batched = await asyncio.gather(*(skill.aget_customer(i) for i in ["CUST001", "CUST002", "CUST003"]))
+            single = await skill.aget_customer("CUST001")
+            await skill.transport.aclose()
+            return batched, single
+
+        batched, single = asyncio.run(run())
+        self.assertEqual([r["customer_id"] for r in batched], ["CUST001", "CUST002", "CUST003"])
+        self.assertTrue(all(r["success"] for r in batched + [single]))
+        self.assertEqual(without_time(single), without_time(batched[0]))
+        self.assertEqual(upstream.paths, ["/api/batch/customers", "/api/customers/CUST003", "/api/customers/CUST001"])
+        print("✅ 异步批量查询测试通过")
+
+    def test_batch_failure(self):
+        """批量请求失败时每个ID都按单条查询的错误格式返回"""
+        skill = make_skill(OrderSkill, MockAPIUpstream(fail=True))
+        results = skill.get_orders_batch(["12345", "999"])
+        self.assertEqual({r["status"] for r in results.values()}, {"连接失败"})
+        self.assertEqual(results["999"]["order_id"], "999")
+        print("✅ 批量请求失败测试通过")
+
+    def test_batch_endpoint_missing(self):
+        """上游没有批量接口（404）时逐个走单条查询接口，不把404当成每个订单都不存在"""
+        upstream = MockAPIUpstream(batch_status=404)
+        results = make_skill(OrderSkill, upstream).get_orders_batch(["12345", "999", "404"])
+        self.assertEqual([results[i]["success"] for i in ("12345", "999", "404")], [True, True, False])
+        self.assertEqual(results["404"]["status"], "未找到")
+        self.assertEqual(upstream.paths, ["/api/batch/orders", "/api/orders/12345", "/api/orders/999", "/api/orders/404"])
+        print("✅ 批量接口缺失回退测试通过")
+
+    def test_cancelled_batch_task(self):
+        """批量 Task 执行期间保留引用；Task 被取消时等待的调用方收到异常而不是一直挂起"""
+        started = asyncio.Event()
+
+        async def hang(keys):
+            started.set()
+            await asyncio.sleep(10)
+
+        loader = BatchLoader("get_order", None, hang, window=0.001)
+
+        async def run():
+            callers = [asyncio.create_task(loader.aload(i)) for i in ("12345", "999")]
+            await started.wait()
+            self.assertEqual(len(loader._tasks), 1)
+            next(iter(loader._tasks)).cancel()
+            results = await asyncio.wait_for(asyncio.gather(*callers, return_exceptions=True), 1)
+            await asyncio.sleep(0)
+            return results
+
+        results = asyncio.run(run())
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+        self.assertEqual(loader._tasks, set())
+        print("✅ 批量Task取消测试通过")
+
+    def test_mock_api_batch_endpoint(self):
+        """Mock API Server 批量接口返回找到的记录和不存在的ID，超过上限返回400"""
+        api = MockAPIUpstream().api
+        data = api.get("/api/batch/inventory", params={"ids": "A,B,Z,A"}).json()
+        self.assertEqual(sorted(data["items"]), ["A", "B"])
+        self.assertEqual(data["missing"], ["Z"])
+        too_many = ",".join(str(i) for i in range(101))
+        self.assertEqual(api.get("/api/batch/orders", params={"ids": too_many}).status_code, 400)
+        print("✅ Mock API批量接口测试通过")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+批量对话接口测试
+用假的编排器处理函数代替LLM，不需要API密钥
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+os.environ.setdefault("CLAUDE_API_KEY", "sk-ant-test")
+os.environ.setdefault("USE_REAL_SKILLS", "true")
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+import asyncio
+import json
+import unittest
+from fastapi.testclient import TestClient
+import app.main as main_module
+
+
+class FakeProcess:
+    """按输入中的延迟处理请求，记录最大并发数"""
+
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+
+    async def __call__(self, user_input, history=None):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            if user_input == "boom":
+                raise RuntimeError("上游故障")
+            await asyncio.sleep(float(user_input))
+            return {
+                "success": True,
+                "response": f"done {user_input}",
+                "plan": {"intent": "测试", "steps": []},
+                "execution_result": {"success": True, "results": []},
+                "fast_path": False,
+                "llm_usage": {"total": {"calls": 0, "cost": 0.0, "input_tokens": 0, "output_tokens": 0,
+                                        "cache_creation_tokens": 0, "cache_read_tokens": 0}},
+                "execution_time_ms": 0
+            }
+        finally:
+            self.running -= 1
+
+
+class TestChatBatch(unittest.TestCase):
+    """批量对话测试"""
+
+    def setUp(self):
+        self.fake = FakeProcess()
+        self.original = main_module.orchestrator.process
+        main_module.orchestrator.process = self.fake
+        self.client = TestClient(main_module.app)
+
+    def tearDown(self):
+        main_module.orchestrator.process = self.original
+
+    def post(self, inputs, **extra):
+        response = self.client.post("/chat/batch", json={"items": [{"user_input": i} for i in inputs], **extra})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("application/x-ndjson"))
+        return [json.loads(line) for line in response.text.splitlines()]
+
+    def test_completion_order_and_errors(self):
+        """结果按完成顺序返回，单条失败不影响其他请求"""
+        lines = self.post(["0.3", "boom", "0.05"], concurrency=3)
+
+        self.assertEqual([line["index"] for line in lines], [1, 2, 0])
+        self.assertFalse(lines[0]["success"])
+        self.assertIn("上游故障", lines[0]["error"])
+        self.assertEqual(lines[2]["message"], "done 0.3")
+        self.assertNotIn("debug", lines[2])
+        print("✅ 批量完成顺序测试通过")
+
+    def test_concurrency_bounded(self):
+        """并发数不超过请求的 concurrency"""
+        lines = self.post(["0.02"] * 10, concurrency=3, include_debug=True)
+
+        self.assertEqual(len(lines), 10)
+        self.assertTrue(all(line["success"] for line in lines))
+        self.assertIn("debug", lines[0])
+        self.assertEqual(self.fake.max_running, 3)
+        print("✅ 批量并发上限测试通过")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+条件请求（ETag / 304）测试
+技能请求通过 conftest.MockAPIUpstream 转发给进程内的 Mock API Server，不需要启动服务
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+import httpx
+import mock_api_server
+from conftest import MockAPIUpstream, make_skill
+from app.conditional_get import ConditionalGetCache, endpoint_of
+from app.skills_real import LogisticsSkill
+
+
+class TestConditionalGet(unittest.TestCase):
+    """ETag缓存测试"""
+
+    def setUp(self):
+        self.upstream = MockAPIUpstream()
+        self.cache = ConditionalGetCache()
+        self.skill = make_skill(LogisticsSkill, self.upstream, api_base="http://logistics")
+        self.skill.conditional_get = self.cache
+
+    def test_not_modified_reuses_parsed_result(self):
+        """未变化的资源返回无响应体的304，技能结果与首次请求相同；数据变化后重新下载"""
+        first = self.skill.query_logistics("SF1234567890")
+        size = self.cache.stats()["endpoints"]["/api/logistics/{id}"]["bytes_received"]
+        second = self.skill.query_logistics("SF1234567890")
+        third = self.skill.query_logistics("SF1234567890")
+        self.assertEqual(self.upstream.statuses, [200, 304, 304])
+        self.assertEqual(second, first)
+        self.assertEqual(third["history"], first["history"])
+        second["status"] = "已修改"  # 调用方修改结果不影响缓存
+        self.assertEqual(self.skill.query_logistics("SF1234567890")["status"], first["status"])
+
+        record = mock_api_server.LOGISTICS_DB["SF1234567890"]
+        original = record["status"]
+        record["status"] = "已签收"
+        try:
+            self.assertEqual(self.skill.query_logistics("SF1234567890")["status"], "已签收")
+        finally:
+            record["status"] = original
+        self.assertEqual(self.upstream.statuses[-1], 200)
+
+        stats = self.cache.stats()["endpoints"]["/api/logistics/{id}"]
+        self.assertEqual((stats["requests"], stats["not_modified"]), (5, 3))
+        self.assertEqual(stats["bytes_saved"], 3 * size)
+        self.assertEqual(stats["not_modified_ratio"], 0.6)
+        print("✅ 304复用解析结果测试通过")
+
+    def test_disabled_and_not_found(self):
+        """关闭时不带条件请求头；404不缓存"""
+        self.skill.conditional_get = ConditionalGetCache(enabled=False)
+        for _ in range(2):
+            self.assertTrue(self.skill.query_logistics("SF1234567890")["success"])
+        self.skill.conditional_get = self.cache
+        for _ in range(2):
+            self.assertEqual(self.skill.query_logistics("NOPE")["status"], "未找到")
+        self.assertEqual(self.upstream.statuses, [200, 200, 404, 404])
+        self.assertEqual(endpoint_of(httpx.URL("http://x/api/customers/CUST001/orders")), "/api/customers/{id}/orders")
+        print("✅ 关闭条件请求与404测试通过")
+
+    def test_nested_mutation_isolated(self):
+        """修改结果中嵌套的 history 不影响之后304复用的结果"""
+        first = self.skill.query_logistics("SF1234567890")
+        first["history"][0]["status"] = "已篡改"
+        first["history"].append({"status": "多出的记录"})
+        second = self.skill.query_logistics("SF1234567890")
+        self.assertEqual(self.upstream.statuses, [200, 304])
+        self.assertEqual(second["history"], mock_api_server.LOGISTICS_DB["SF1234567890"]["history"])
+        print("✅ 嵌套字段修改隔离测试通过")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
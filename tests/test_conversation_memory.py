@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+会话记忆测试
+使用内存数据库和假的LLM客户端，不需要API密钥
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import unittest
+from app.conversation_memory import ConversationMemory
+from app.database import Database
+from app.plan_cache import PlanCache
+from tests.test_orchestrator import make_orchestrator, plan_json
+
+
+class TestConversationMemory(unittest.TestCase):
+    """会话记忆测试"""
+
+    def setUp(self):
+        self.db = Database(":memory:")
+        self.memory = ConversationMemory(self.db, window_turns=2, message_max_chars=50, max_entities=3, max_requests=2)
+
+    def chat(self, session_id, turns):
+        async def run():
+            for user_input, response in turns:
+                await self.memory.append(session_id, "user_001", user_input, response)
+            return await self.memory.load(session_id)
+        return asyncio.run(run())
+
+    def test_window_and_summary(self):
+        """最近的轮次保留原文，更早的折叠成摘要（实体最近的在前），会话之间互不影响"""
+        context = self.chat("s1", [
+            ("查询订单12345", "订单12345已发货，库存150件"),
+            ("产品A还有库存吗", "产品A库存充足"),
+            ("物流单号SF1234567890到哪了", "运输中"),
+            ("谢谢", "不客气"),
+        ])
+
+        self.assertIn("之前提到过：产品A、订单12345", context)
+        self.assertNotIn("订单150", context)  # 助手回复中的数字不当作订单号
+        self.assertIn("更早的请求：查询订单12345；产品A还有库存吗", context)
+        self.assertIn("用户：物流单号SF1234567890到哪了\n助手：运输中\n用户：谢谢\n助手：不客气", context)
+        self.assertNotIn("助手：产品A库存充足", context)
+        self.assertEqual(self.chat("s2", []), "")
+        print("✅ 窗口与摘要测试通过")
+
+    def test_context_bounded(self):
+        """对话轮数增加时注入的上下文长度有上限"""
+        lengths = []
+        for i in range(30):
+            context = self.chat("long", [(f"查询订单{10000 + i}的状态和物流信息，" + "尽快" * 20, "订单已发货，" + "详细说明" * 30)])
+            lengths.append(len(context))
+
+        self.assertEqual(max(lengths[10:]), lengths[-1])
+        self.assertLess(lengths[-1], 600)
+        self.assertEqual(self.memory.stats()["messages_folded"], 30 * 2 - self.memory.window_messages)
+        print("✅ 上下文长度上限测试通过")
+
+    def test_history_injected_into_planning(self):
+        """会话上下文放在规划的用户消息中；依赖上下文的输入不读写计划缓存"""
+        orchestrator = make_orchestrator(
+            plan_json([{"step": 1, "skill": "get_order", "params": {"order_id": "12345"}}], "订单{order_id}：{status}"),
+            plan_json([{"step": 1, "skill": "get_order", "params": {"order_id": "67890"}}], "订单{order_id}：{status}")
+        )
+        orchestrator.plan_cache = PlanCache()
+        history = self.chat("s3", [("查询订单12345", "订单12345已发货")])
+
+        asyncio.run(orchestrator.process("它现在什么状态", history=history))
+        result = asyncio.run(orchestrator.process("它现在什么状态", history="用户：查询订单67890"))
+
+        first, second = orchestrator.client.messages.calls
+        self.assertIn("用户：查询订单12345", first["messages"][0]["content"])
+        self.assertIn("用户输入：\"它现在什么状态\"", first["messages"][0]["content"])
+        self.assertEqual(result["plan"]["steps"][0]["params"]["order_id"], "67890")
+        print("✅ 规划注入会话上下文测试通过")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
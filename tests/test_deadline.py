@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+请求截止时间测试
+使用假的LLM客户端，不需要API密钥
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import time
+import unittest
+from app.deadline import DeadlineExceeded, clamp_timeout, deadline_scope, remaining
+from app.orchestrator import DEADLINE_SKIP_ERROR
+from tests.test_orchestrator import make_orchestrator, plan_json
+
+
+class TestDeadlineScope(unittest.TestCase):
+    """截止时间作用域测试"""
+
+    def test_clamp_timeout(self):
+        """下游超时取自身超时与剩余时间的较小值；嵌套作用域保留更早的截止时间；用完时抛出异常"""
+        self.assertIsNone(remaining())
+        self.assertEqual(clamp_timeout(10.0), 10.0)
+
+        with deadline_scope(1.0):
+            self.assertLessEqual(clamp_timeout(10.0), 1.0)
+            self.assertEqual(clamp_timeout(0.5), 0.5)
+            with deadline_scope(30.0):
+                self.assertLessEqual(remaining(), 1.0)
+        self.assertIsNone(remaining())
+
+        with deadline_scope(0.01):
+            time.sleep(0.02)
+            with self.assertRaises(DeadlineExceeded):
+                clamp_timeout(10.0)
+        print("✅ 超时收紧测试通过")
+
+
+class TestDeadlinePipeline(unittest.TestCase):
+    """编排流程截止时间测试"""
+
+    def setUp(self):
+        self.orchestrator = make_orchestrator(
+            plan_json([
+                {"step": 1, "skill": "slow_lookup", "params": {"order_id": "12345"}},
+                {"step": 2, "skill": "get_order", "params": {"order_id": "$step1_result"}}
+            ]),
+            "不应调用回复LLM",
+            fast_path=False
+        )
+
+        async def slow_lookup(order_id):
+            await asyncio.sleep(1.0)
+            return {"success": True, "order_id": order_id}
+
+        self.orchestrator.register_skill("slow_lookup", None, "慢查询", {"order_id": "订单号"}, async_func=slow_lookup, read_only=True)
+
+    def test_partial_response(self):
+        """慢技能在截止时间被中断，后续步骤跳过，不再调用回复LLM而是返回部分回复"""
+        async def run():
+            with deadline_scope(0.2):
+                return await self.orchestrator.process("查询订单12345")
+
+        start = time.perf_counter()
+        result = asyncio.run(run())
+        elapsed = time.perf_counter() - start
+
+        self.assertLess(elapsed, 0.6)
+        self.assertTrue(result["deadline_exceeded"])
+        step1, step2 = result["execution_result"]["results"]
+        self.assertEqual(step1["error"], "请求超时")
+        self.assertEqual(step2["error"], DEADLINE_SKIP_ERROR)
+        self.assertTrue(step2["skipped"])
+        self.assertIn("处理时间已超出限制", result["response"])
+        self.assertEqual(len(self.orchestrator.client.messages.calls), 1)
+        print("✅ 截止时间部分回复测试通过")
+
+    def test_llm_timeout_clamped(self):
+        """LLM调用的超时按剩余时间收紧"""
+        self.orchestrator.register_skill("slow_lookup", lambda order_id: {"success": True, "order_id": order_id}, "快查询", {"order_id": "订单号"}, read_only=True)
+
+        async def run():
+            with deadline_scope(5.0):
+                return await self.orchestrator.process("查询订单12345")
+
+        result = asyncio.run(run())
+        self.assertFalse(result["deadline_exceeded"])
+        for call in self.orchestrator.client.messages.calls:
+            self.assertLessEqual(call["timeout"], 5.0)
+        print("✅ LLM超时收紧测试通过")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
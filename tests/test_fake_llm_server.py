@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Fake LLM Server 测试
+在后台线程启动假服务器，用真实的 AsyncAnthropic 客户端调用，不需要API密钥
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import socket
+import threading
+import time
+import unittest
+import uvicorn
+import fake_llm_server
+from app.orchestrator import AIOrchestrator
+from app.skills import MockSkills
+
+
+def start_server() -> str:
+    """在后台线程启动假服务器，返回地址"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(fake_llm_server.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+BASE_URL = None
+
+
+def make_orchestrator():
+    """创建指向假服务器的编排器"""
+    orchestrator = AIOrchestrator("sk-ant-test", fast_path=True, base_url=BASE_URL)
+    orchestrator.client = orchestrator.client.with_options(max_retries=0)
+    orchestrator.register_skill("get_order", MockSkills.get_order, "查询订单信息", {"order_id": "订单号"}, read_only=True)
+    orchestrator.register_skill("send_notification", MockSkills.send_email, "发送通知", {"to": "收件人", "template": "模板名", "context": "模板数据"})
+    orchestrator.register_skill("update_order_status", MockSkills.update_order_status, "更新订单状态", {"order_id": "订单号", "status": "新状态"})
+    return orchestrator
+
+
+class TestFakeLLMServer(unittest.TestCase):
+    """假LLM服务器测试"""
+
+    @classmethod
+    def setUpClass(cls):
+        global BASE_URL
+        BASE_URL = BASE_URL or start_server()
+
+    def setUp(self):
+        self.saved_config = dict(fake_llm_server.CONFIG)
+        fake_llm_server.CONFIG.update(latency_ms=0, token_ms=0)
+        fake_llm_server.reset()
+
+    def tearDown(self):
+        fake_llm_server.CONFIG.update(self.saved_config)
+
+    def test_deterministic_plan_and_prompt_cache(self):
+        """已知问法返回确定性计划；第二次规划命中提示缓存"""
+        orchestrator = make_orchestrator()
+
+        async def run():
+            return await orchestrator.process("取消订单12345"), await orchestrator.process("取消订单888")
+        first, second = asyncio.run(run())
+
+        self.assertEqual(first["plan"]["steps"][0]["skill"], "update_order_status")
+        self.assertEqual(second["plan"]["steps"][0]["params"], {"order_id": "888", "status": "已取消"})
+        self.assertIn("取消订单888", second["response"])
+        self.assertGreater(first["llm_usage"]["plan"]["cache_creation_tokens"], 0)
+        self.assertEqual(second["llm_usage"]["plan"]["cache_read_tokens"], first["llm_usage"]["plan"]["cache_creation_tokens"])
+        self.assertEqual(fake_llm_server.STATS["plan_requests"], 2)
+        print("✅ 确定性计划与提示缓存测试通过")
+
+    def test_streaming(self):
+        """流式回复按Anthropic事件格式输出，最终消息带用量"""
+        orchestrator = make_orchestrator()
+
+        async def run():
+            return [event async for event in orchestrator.process_stream("订单12345延迟了，发个道歉邮件给客户")]
+        events = asyncio.run(run())
+
+        tokens = [e["text"] for e in events if e["type"] == "token"]
+        self.assertGreater(len(tokens), 1)
+        self.assertEqual(len(events[0]["steps"]), 2)
+        self.assertGreater(events[-1]["llm_usage"]["response"]["output_tokens"], 0)
+        print("✅ 流式回复测试通过")
+
+    def test_overload_injection(self):
+        """注入529过载错误"""
+        fake_llm_server.CONFIG["overload_rate"] = 1.0
+        orchestrator = make_orchestrator()
+
+        plan = asyncio.run(orchestrator.analyze_intent("取消订单12345"))
+        self.assertIn("error", plan)
+        self.assertEqual(fake_llm_server.STATS["injected_errors"]["overloaded_error"], 1)
+        print("✅ 错误注入测试通过")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+共享HTTP连接池测试
+在本地启动一个支持keep-alive的HTTP服务，不需要Mock API Server
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from app.http_transport import HTTPTransportManager, origin_of
+from app.inventory_cache import InventoryCache
+from app.skills_real import OrderSkill, InventorySkill
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """返回固定JSON的HTTP/1.1处理器，记录新建的TCP连接数"""
+    protocol_version = "HTTP/1.1"
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+
+    def do_GET(self):
+        body = json.dumps({"status": "已发货", "stock": 100}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHTTPTransport(unittest.TestCase):
+    """共享连接池测试"""
+
+    def setUp(self):
+        KeepAliveHandler.connections = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+        self.transport = HTTPTransportManager(max_connections=4, max_keepalive_connections=2)
+
+    def test_skills_share_pool(self):
+        """同一上游的不同技能共用一个客户端，多次请求复用同一条连接"""
+        order = OrderSkill(api_base=self.base, transport=self.transport)
+        inventory = InventorySkill(api_base=self.base + "/", transport=self.transport)
+        inventory.cache = InventoryCache(enabled=False)  # 每次都请求上游
+        self.assertIs(order.client, inventory.client)
+        self.assertEqual(origin_of("https://api.example.com/v1"), "https://api.example.com:443")
+
+        for _ in range(3):
+            self.assertTrue(order.get_order("12345")["success"])
+            self.assertTrue(inventory.query_inventory("A")["success"])
+
+        self.assertEqual(KeepAliveHandler.connections, 1)
+        upstream = self.transport.stats()["upstreams"][origin_of(self.base)]
+        self.assertEqual((upstream["requests"], upstream["connections"], upstream["clients"]), (6, 1, 1))
+        self.transport.client(self.base).close()
+        print("✅ 同步连接复用测试通过")
+
+    def test_async_lifecycle(self):
+        """异步客户端按事件循环共享，启动时预热、关闭时释放连接"""
+        self.transport = HTTPTransportManager(max_connections=4, max_keepalive_connections=4)
+        order = OrderSkill(api_base=self.base, transport=self.transport)
+        order.order_loader.enabled = False  # 逐个请求，观察连接复用
+
+        async def run():
+            await self.transport.startup([self.base, self.base + "/api"])
+            client = self.transport.async_client(self.base)
+            results = []
+            for _ in range(2):
+                results += await asyncio.gather(*(order.aget_order(str(i)) for i in range(8)))
+            self.assertIs(order.async_client, client)
+            stats = self.transport.stats()["upstreams"][origin_of(self.base)]
+            await self.transport.aclose()
+            return results, stats, client
+
+        results, stats, client = asyncio.run(run())
+        self.assertTrue(all(r["success"] for r in results))
+        self.assertLessEqual(KeepAliveHandler.connections, 4)  # 并发受 max_connections 限制，第二批复用连接
+        self.assertEqual(stats["requests"], 16)
+        self.assertTrue(client.is_closed)
+        self.assertEqual(self.transport.stats()["upstreams"], {})
+        print("✅ 异步连接池生命周期测试通过")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
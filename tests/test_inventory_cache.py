@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+库存缓存（stale-while-revalidate）测试
+使用 conftest.MockUpstream 模拟库存系统，不需要启动Mock API Server
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import threading
+import unittest
+import httpx
+import conftest
+from app.inventory_cache import InventoryCache, FieldBound, MISS, parse_field_bounds
+from app.skills_real import InventorySkill, OrderSkill, RefundSkill, ReplenishmentSkill
+
+
+class InventoryUpstream(conftest.MockUpstream):
+    """每次请求返回递减的库存"""
+
+    def respond(self, request):
+        return httpx.Response(200, json={
+            "product_name": "产品A",
+            "stock": 101 - self.calls,
+            "warehouse_address": "深圳市宝安区物流园"
+        })
+
+
+def make_cache(now):
+    return InventoryCache(
+        field_bounds=parse_field_bounds("stock=2/10,warehouse_address=3600/86400"),
+        default_bound=FieldBound(30, 300),
+        clock=lambda: now[0]
+    )
+
+
+def make_skill(upstream, cache):
+    skill = conftest.make_skill(InventorySkill, upstream, api_base="http://inventory")
+    skill.cache = cache
+    return skill
+
+
+class TestInventoryCache(unittest.TestCase):
+    """按字段时效的读穿透缓存测试"""
+
+    def setUp(self):
+        self.now = [0.0]
+        self.cache = make_cache(self.now)
+        self.upstream = InventoryUpstream()
+        self.skill = make_skill(self.upstream, self.cache)
+
+    def test_fresh_stale_expired(self):
+        """新鲜直接返回；过了 stock 的新鲜期先返回旧数据并后台刷新；超过最大过期时间同步请求"""
+        self.refreshed = threading.Event()
+        end_refresh = self.cache.end_refresh
+
+        def notify(*args):
+            end_refresh(*args)
+            self.refreshed.set()
+
+        self.cache.end_refresh = notify
+        self.assertEqual(self.skill.query_inventory("A")["stock"], 100)
+        self.now[0] = 1
+        fresh = self.skill.query_inventory("A")
+        self.assertEqual((fresh["stock"], self.upstream.calls), (100, 1))
+        self.assertNotIn("stale", fresh)
+
+        self.now[0] = 5
+        stale = self.skill.query_inventory("A")
+        self.assertEqual(stale["stock"], 100)
+        self.assertTrue(stale["stale"])
+        self.assertEqual(stale["stale_fields"], ["stock"])  # warehouse_address 仍在新鲜期内
+        self.assertEqual(stale["data_age_seconds"], 5)
+        self.assertTrue(self.refreshed.wait(2))
+        refreshed = self.skill.query_inventory("A")
+        self.assertEqual((refreshed["stock"], self.upstream.calls), (99, 2))
+        self.assertNotIn("stale", refreshed)
+
+        self.now[0] = 20  # 超过 stock 的最大过期时间10秒
+        self.assertEqual(self.skill.query_inventory("A")["stock"], 98)
+        stats = self.cache.stats()
+        self.assertEqual((stats["fresh_hits"], stats["stale_hits"], stats["misses"], stats["refreshes"]), (2, 1, 2, 1))
+        print("✅ 新鲜/过期/超期测试通过")
+
+    def test_async_refresh_once(self):
+        """异步并发读取过期条目时只发起一次后台刷新"""
+        async def run():
+            await self.skill.aquery_inventory("A")
+            self.now[0] = 5
+            served = await asyncio.gather(*(self.skill.aquery_inventory("A") for _ in range(5)))
+            await asyncio.gather(*self.skill._refresh_tasks)
+            latest = await self.skill.aquery_inventory("A")
+            await self.skill.transport.aclose()
+            return served, latest
+
+        served, latest = asyncio.run(run())
+        self.assertTrue(all(r["stale"] and r["stock"] == 100 for r in served))
+        self.assertEqual((latest["stock"], self.upstream.calls), (99, 2))
+        print("✅ 异步后台刷新测试通过")
+
+    def fill(self, *product_ids):
+        for product_id in product_ids:
+            self.cache.put(product_id, {"success": True, "product_id": product_id, "product_name": f"产品{product_id}", "stock": 1}, self.cache.generation)
+
+    def test_replenishment_invalidation(self):
+        """补货申请只失效对应商品，其他商品失效前发出的请求照常写回"""
+        self.fill("A", "B")
+        generation_a, generation_b = self.cache.lookup("A")[1], self.cache.lookup("B")[1]
+        self.cache.on_skill_result("create_replenishment", {"product_id": "A", "quantity": 10}, {"success": True})
+        self.assertIs(self.cache.lookup("A")[0], MISS)
+        self.assertIsNot(self.cache.lookup("B")[0], MISS)
+        self.assertFalse(self.cache.put("A", {"success": True, "stock": 1}, generation_a))  # 失效前发出的请求不写回
+        self.assertTrue(self.cache.put("B", {"success": True, "stock": 2}, generation_b))
+        print("✅ 补货申请失效测试通过")
+
+    def test_create_refund_invalidation(self):
+        """创建退款按订单中的商品名称失效，未知订单清空缓存"""
+        self.fill("A", "B")
+        generation = self.cache.lookup("B")[1]
+        self.cache.on_skill_result("get_order", {"order_id": "12345"}, {"success": True, "products": [{"name": "产品B"}]})
+        self.cache.on_skill_result("create_refund", {"order_id": "12345", "reason": "质量问题"}, {"success": True})
+        self.assertIs(self.cache.lookup("B")[0], MISS)
+        self.assertIsNot(self.cache.lookup("A")[0], MISS)
+        self.assertFalse(self.cache.put("B", {"success": True, "stock": 1}, generation))
+
+        self.cache.on_skill_result("create_refund", {"order_id": "999", "reason": "质量问题"}, {"success": True})
+        self.assertEqual(self.cache.stats()["size"], 0)
+        self.assertFalse(self.cache.put("A", {"success": True, "stock": 1}, generation))  # 清空前发出的请求都不写回
+        print("✅ 创建退款失效测试通过")
+
+    def test_approve_refund_invalidation(self):
+        """审批退款按创建退款时记下的订单失效，未知退款清空缓存"""
+        self.fill("A", "B")
+        self.cache.on_skill_result("get_order", {"order_id": "12345"}, {"success": True, "products": [{"name": "产品B"}]})
+        self.cache.on_skill_result(
+            "create_refund", {"order_id": "12345", "reason": "质量问题"},
+            {"success": True, "refund": {"refund_id": "RF009", "order_id": "12345"}}
+        )
+        self.fill("B")
+        self.cache.on_skill_result("approve_refund", {"refund_id": "RF009"}, {"success": True, "refund_id": "RF009"})
+        self.assertIs(self.cache.lookup("B")[0], MISS)
+        self.assertIsNot(self.cache.lookup("A")[0], MISS)
+
+        self.cache.on_skill_result("approve_refund", {"refund_id": "RF404"}, {"success": True, "refund_id": "RF404"})
+        self.assertEqual(self.cache.stats()["size"], 0)
+        print("✅ 审批退款失效测试通过")
+
+    def test_direct_skill_calls_invalidate(self):
+        """不经过编排器直接调用写操作技能时同样失效库存缓存"""
+        upstream = conftest.MockAPIUpstream()
+
+        def real_skill(skill_class):
+            skill = conftest.make_skill(skill_class, upstream)
+            skill.inventory_cache = self.cache
+            return skill
+
+        for product_id in ("A", "B", "C"):
+            self.cache.put(product_id, {"success": True, "product_id": product_id, "product_name": f"产品{product_id}", "stock": 1}, 0)
+
+        self.assertTrue(real_skill(ReplenishmentSkill).create_replenishment("A", 10)["success"])
+        self.assertIs(self.cache.lookup("A")[0], MISS)
+
+        self.assertTrue(real_skill(OrderSkill).get_order("12345")["success"])  # 订单包含产品A、产品B
+        refund = real_skill(RefundSkill).create_refund("12345", "质量问题")
+        self.assertIs(self.cache.lookup("B")[0], MISS)
+        self.assertIsNot(self.cache.lookup("C")[0], MISS)
+
+        self.fill("A", "B")
+        self.assertTrue(real_skill(RefundSkill).approve_refund(refund["refund"]["refund_id"])["success"])
+        self.assertIs(self.cache.lookup("A")[0], MISS)
+        self.assertIs(self.cache.lookup("B")[0], MISS)
+        self.assertIsNot(self.cache.lookup("C")[0], MISS)
+        print("✅ 直接调用写操作失效测试通过")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+JSON编解码与精简响应测试
+用假的编排器处理函数代替LLM，不需要API密钥
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+os.environ.setdefault("CLAUDE_API_KEY", "sk-ant-test")
+os.environ.setdefault("USE_REAL_SKILLS", "true")
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+import json
+import unittest
+from datetime import datetime
+from unittest import mock
+import httpx
+from fastapi.testclient import TestClient
+from app import json_codec
+import app.main as main_module
+
+PAYLOAD = {
+    "tracking": "SF1234567890",
+    "status": "运输中",
+    "history": [{"time": datetime(2025, 1, 21, 15, 20), "location": "深圳转运中心"}],
+    1: "非字符串的键"
+}
+
+
+async def fake_process(user_input, history=None):
+    if user_input == "boom":
+        raise RuntimeError("上游故障")
+    return {
+        "success": True,
+        "response": "订单12345已发货",
+        "plan": {"intent": "查询订单", "steps": [{"skill": "get_order", "params": {"order_id": "12345"}}]},
+        "execution_result": {"success": True, "results": [{"skill": "get_order", "result": {"order_id": "12345", "status": "已发货"}}]},
+        "fast_path": True,
+        "llm_usage": {"total": {"calls": 0, "cost": 0.0, "input_tokens": 0, "output_tokens": 0,
+                                "cache_creation_tokens": 0, "cache_read_tokens": 0}},
+        "timings_ms": {"plan": 1.0},
+        "execution_time_ms": 0
+    }
+
+
+class TestJSONCodec(unittest.TestCase):
+    """编解码测试"""
+
+    def test_backends_agree(self):
+        """orjson 与标准库输出相同的文本，解析错误都是 json.JSONDecodeError"""
+        outputs = {}
+        for backend in ("orjson", "json"):
+            if backend == "orjson" and json_codec.orjson is None:
+                continue
+            with mock.patch.object(json_codec, "BACKEND", backend):
+                outputs[backend] = (
+                    json_codec.dumps(PAYLOAD),
+                    json_codec.dumps(PAYLOAD, indent=True),
+                    json_codec.dumps({"b": 1, "a": [1, 2]}, sort_keys=True)
+                )
+                self.assertEqual(json_codec.loads(json_codec.dumps_bytes(PAYLOAD))["history"][0]["time"], "2025-01-21 15:20:00")
+                with self.assertRaises(json.JSONDecodeError):
+                    json_codec.loads("{坏的JSON")
+        self.assertEqual(len(set(outputs.values())), 1)
+        compact, pretty, ordered = next(iter(outputs.values()))
+        self.assertEqual(ordered, '{"a":[1,2],"b":1}')
+        self.assertIn('"status":"运输中"', compact)
+        self.assertEqual(json.loads(pretty)["1"], "非字符串的键")
+
+        response = json_codec.CodecResponse.wrap(
+            httpx.Response(200, json={"status": "已发货"}, request=httpx.Request("GET", "http://upstream/api/orders/12345"))
+        )
+        self.assertIsInstance(response, json_codec.CodecResponse)
+        self.assertEqual(response.json(), {"status": "已发货"})
+        print("✅ 编解码一致性测试通过")
+
+    def test_backend_chosen_on_first_use(self):
+        """后端在首次编解码时按 JSON_CODEC 选定（.env 在导入本模块之后才加载）"""
+        with mock.patch.object(json_codec, "BACKEND", None), mock.patch.dict(os.environ, {"JSON_CODEC": "json"}):
+            self.assertEqual(json_codec.dumps({"a": 1}), '{"a":1}')
+            self.assertEqual(json_codec.BACKEND, "json")
+        print("✅ 后端延迟选择测试通过")
+
+
+class TestLeanChatResponse(unittest.TestCase):
+    """/chat 默认返回完整调试信息，include_debug=false 时只返回摘要"""
+
+    def setUp(self):
+        self.original = main_module.orchestrator.process
+        main_module.orchestrator.process = fake_process
+        self.client = TestClient(main_module.app)
+
+    def tearDown(self):
+        main_module.orchestrator.process = self.original
+
+    def test_lean_and_full_debug(self):
+        """精简模式只有摘要字段，不含执行结果和错误堆栈"""
+        full = self.client.post("/chat", params={"user_input": "查询订单12345"}).json()
+        self.assertEqual(full["debug"]["result"], {"order_id": "12345", "status": "已发货"})
+        self.assertIn("steps", full["debug"])
+
+        lean = self.client.post("/chat", params={"user_input": "查询订单12345", "include_debug": "false"}).json()
+        self.assertEqual(set(lean["debug"]), set(main_module.LEAN_DEBUG_FIELDS))
+        self.assertEqual((lean["debug"]["skill"], lean["debug"]["timings_ms"]), ("get_order", {"plan": 1.0}))
+
+        error = self.client.post("/chat", params={"user_input": "boom"}).json()
+        self.assertIn("RuntimeError", error["debug"]["traceback"])
+        self.assertIsNone(self.client.post("/chat", params={"user_input": "boom", "include_debug": "false"}).json()["debug"])
+        print("✅ 精简/完整调试信息测试通过")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
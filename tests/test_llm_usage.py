@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+LLM用量与成本统计测试
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import sqlite3
+import tempfile
+import unittest
+from types import SimpleNamespace
+from app.database import Database
+from app.llm_usage import UsageTracker, compute_cost, usage_to_dict
+from tests.test_orchestrator import make_orchestrator, plan_json
+
+
+class TestCost(unittest.TestCase):
+    """成本计算测试"""
+
+    def test_compute_cost_with_cache_tokens(self):
+        """缓存写入/读取按各自价格计费，缺失字段记为0"""
+        usage = usage_to_dict(SimpleNamespace(
+            input_tokens=1000, output_tokens=200,
+            cache_creation_input_tokens=None, cache_read_input_tokens=2000
+        ))
+        self.assertEqual(usage["cache_creation_tokens"], 0)
+        # Sonnet 4: 3 / 15 / 0.30 美元每百万token
+        self.assertAlmostEqual(compute_cost("claude-sonnet-4-20250514", usage), (1000 * 3 + 200 * 15 + 2000 * 0.3) / 1e6)
+        self.assertAlmostEqual(compute_cost("claude-3-5-haiku-20241022", usage), (1000 * 0.8 + 200 * 4 + 2000 * 0.08) / 1e6)
+        print("✅ 成本计算测试通过")
+
+    def test_process_records_stages(self):
+        """process 按 plan / response 两个阶段记录用量"""
+        orchestrator = make_orchestrator(
+            plan_json([{"step": 1, "skill": "update_order_status", "params": {"order_id": "12345", "status": "已取消"}}]),
+            "订单已取消"
+        )
+        usage = asyncio.run(orchestrator.process("取消订单12345"))["llm_usage"]
+
+        self.assertEqual(usage["plan"]["input_tokens"], 100)
+        self.assertEqual(usage["response"]["output_tokens"], 20)
+        self.assertEqual(usage["total"]["calls"], 2)
+        self.assertAlmostEqual(usage["total"]["cost"], usage["plan"]["cost"] + usage["response"]["cost"])
+        print("✅ 分阶段用量测试通过")
+
+
+class TestUsagePersistence(unittest.TestCase):
+    """用量持久化测试"""
+
+    def test_save_and_aggregate(self):
+        db = Database(":memory:")
+        tracker = UsageTracker()
+        tracker.record("plan", "claude-sonnet-4-20250514", SimpleNamespace(input_tokens=50, output_tokens=100, cache_read_input_tokens=1500))
+        tracker.record("response", "claude-sonnet-4-20250514", SimpleNamespace(input_tokens=400, output_tokens=80))
+        summary = tracker.summary()
+
+        db.save_decision(user_input="q", intent="i", action="a", result={}, llm_usage=summary)
+        db.save_decision(user_input="q", intent="i", action="a", result={}, llm_cost=0.001)  # 旧调用方式
+
+        stats = db.get_today_llm_usage()
+        self.assertEqual(stats["requests"], 1)
+        self.assertEqual(stats["plan"]["output_tokens"], 100)
+        self.assertEqual(stats["response"]["input_tokens"], 400)
+        self.assertAlmostEqual(stats["total_cost"], summary["total"]["cost"])
+        self.assertAlmostEqual(stats["cache_hit_rate"], 1500 / 1950)
+        self.assertAlmostEqual(db.get_today_stats()["today_cost"], summary["total"]["cost"] + 0.001)
+        print("✅ 用量持久化测试通过")
+
+    def test_migrates_old_table(self):
+        """旧库缺少用量列时自动补齐"""
+        path = os.path.join(tempfile.mkdtemp(), "old.db")
+        conn = sqlite3.connect(path)
+        conn.execute("""CREATE TABLE ai_decisions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT DEFAULT 'default', user_input TEXT NOT NULL,
+            intent TEXT, action TEXT, result TEXT, success INTEGER DEFAULT 1,
+            execution_time_ms REAL, llm_cost REAL, timestamp TEXT NOT NULL)""")
+        conn.commit()
+        conn.close()
+
+        db = Database(path)
+        db.save_decision(user_input="q", intent="i", action="a", result={}, llm_usage=UsageTracker().summary())
+        self.assertEqual(db.get_today_llm_usage()["requests"], 1)
+        print("✅ 旧库迁移测试通过")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+模型分级测试
+使用假的LLM客户端，不需要API密钥
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import tempfile
+import unittest
+from types import SimpleNamespace
+from app.database import Database
+from app.model_router import ModelRouter, SMALL_MODEL, LARGE_MODEL
+from app.orchestrator import AIOrchestrator
+from app.skills import MockSkills
+from tests.test_orchestrator import ToolUseMessages
+
+
+def make_orchestrator(*plans):
+    """创建配置了模型分级的编排器，规划按顺序返回预设的工具调用"""
+    orchestrator = AIOrchestrator("sk-ant-test", model_router=ModelRouter())
+    orchestrator.client = SimpleNamespace(messages=ToolUseMessages(*plans))
+    orchestrator.register_skill("get_order", MockSkills.get_order, "查询订单信息", {"order_id": "订单号"}, read_only=True)
+    orchestrator.register_skill("update_order_status", MockSkills.update_order_status, "更新订单状态", {"order_id": "订单号", "status": "新状态"})
+    return orchestrator
+
+
+class PlanAndReplyMessages(ToolUseMessages):
+    """规划返回预设的工具调用，回复返回固定文本"""
+
+    async def create(self, **kwargs):
+        if "tools" in kwargs:
+            return await super().create(**kwargs)
+        self.calls.append(kwargs)
+        return SimpleNamespace(content=[SimpleNamespace(text="好的")], usage=SimpleNamespace(input_tokens=100, output_tokens=5))
+
+
+LOOKUP_PLAN = {"intent": "查询订单", "steps": [{"step": 1, "skill": "get_order", "params": {"order_id": "12345"}}]}
+
+
+class TestPlanEscalation(unittest.TestCase):
+    """规划升级测试"""
+
+    def plan(self, *plans):
+        orchestrator = make_orchestrator(*plans)
+        plan = asyncio.run(orchestrator.analyze_intent("查询订单12345"))
+        models = [call["model"] for call in orchestrator.client.messages.calls]
+        return orchestrator, plan, models
+
+    def test_small_model_accepted(self):
+        """小模型的计划合格时不调用大模型"""
+        orchestrator, plan, models = self.plan({**LOOKUP_PLAN, "confidence": 0.95})
+        self.assertEqual(models, [SMALL_MODEL])
+        self.assertEqual(plan["model_routing"]["plan_tier"], "small")
+        self.assertIsNone(plan["model_routing"]["escalation"])
+        self.assertEqual(orchestrator.model_router.stats()["escalation_rate"], 0.0)
+        print("✅ 小模型规划测试通过")
+
+    def test_escalation_reasons(self):
+        """未知技能、参数不合法、把握不足时升级到大模型，大模型的计划直接采用"""
+        cases = [
+            ({"intent": "查询订单", "steps": [{"step": 1, "skill": "lookup_order", "params": {}}]}, "unknown_skill"),
+            ({"intent": "查询订单", "steps": [{"step": 1, "skill": "get_order", "params": {}}]}, "invalid_plan"),
+            ({**LOOKUP_PLAN, "confidence": 0.3}, "low_confidence"),
+        ]
+        for small_plan, reason in cases:
+            orchestrator, plan, models = self.plan(small_plan, {**LOOKUP_PLAN, "confidence": 0.2})
+            self.assertEqual(models, [SMALL_MODEL, LARGE_MODEL])
+            self.assertEqual(plan["steps"][0]["params"], {"order_id": "12345"})
+            routing = plan["model_routing"]
+            self.assertEqual((routing["plan_tier"], routing["escalation"]), ("large", reason))
+            self.assertEqual(set(routing["plan_latency_ms"]), {"small", "large"})
+            self.assertEqual(orchestrator.model_router.stats()["escalation_reasons"], {reason: 1})
+        print("✅ 规划升级测试通过")
+
+
+class TestResponseTiering(unittest.TestCase):
+    """回复模型选择与决策日志测试"""
+
+    def test_response_model_by_intent(self):
+        """查询类回复用小模型、写操作用大模型，模型和各级耗时写入决策日志"""
+        orchestrator = make_orchestrator()
+        orchestrator.fast_path = False
+        plans = [
+            LOOKUP_PLAN,
+            {"intent": "取消订单", "steps": [{"step": 1, "skill": "update_order_status", "params": {"order_id": "12345", "status": "已取消"}}]}
+        ]
+        results = []
+        for plan in plans:
+            orchestrator.client = SimpleNamespace(messages=PlanAndReplyMessages(plan))
+            results.append(asyncio.run(orchestrator.process("订单12345")))
+
+        self.assertEqual([r["model_routing"]["response_model"] for r in results], [SMALL_MODEL, LARGE_MODEL])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            db = Database(os.path.join(tmp, "test.db"))
+            for result in results:
+                db.save_decision(user_input="订单12345", intent=result["plan"]["intent"], action="test", result={},
+                                 llm_usage=result["llm_usage"], model_routing=result["model_routing"])
+            stats = db.get_model_tier_stats()
+        self.assertEqual(stats["plan"]["small"]["requests"], 2)
+        self.assertEqual(stats["escalation_rate"], 0.0)
+        self.assertEqual(set(stats["response"]), {SMALL_MODEL, LARGE_MODEL})
+        print("✅ 回复模型分级测试通过")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
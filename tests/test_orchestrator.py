@@ -0,0 +1,365 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+AI编排器测试
+使用假的LLM客户端，不需要API密钥
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import json
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from app.database import Database
+from app.llm_usage import UsageTracker
+from app.orchestrator import AIOrchestrator, DEPENDENCY_SKIP_ERROR
+from app.skills import MockSkills
+
+
+class FakeStream:
+    """假的流式响应：把文本按2个字符一段输出"""
+
+    def __init__(self, text):
+        self.text = text
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    @property
+    async def text_stream(self):
+        for i in range(0, len(self.text), 2):
+            yield self.text[i:i + 2]
+
+    async def get_final_message(self):
+        return SimpleNamespace(usage=SimpleNamespace(input_tokens=200, output_tokens=len(self.text)))
+
+
+class FakeMessages:
+    """假的 client.messages：按顺序返回预设文本，并记录调用次数"""
+
+    def __init__(self, *texts):
+        self.texts = list(texts)
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        text = self.texts.pop(0)
+        return SimpleNamespace(
+            content=[SimpleNamespace(text=text)],
+            usage=SimpleNamespace(input_tokens=100, output_tokens=20)
+        )
+
+    def stream(self, **kwargs):
+        self.calls.append(kwargs)
+        return FakeStream(self.texts.pop(0))
+
+
+def make_orchestrator(*texts, fast_path=True):
+    """创建注册了Mock技能的编排器"""
+    orchestrator = AIOrchestrator("sk-ant-test", fast_path=fast_path)
+    orchestrator.client = SimpleNamespace(messages=FakeMessages(*texts))
+    orchestrator.register_skill("get_order", MockSkills.get_order, "查询订单信息", {"order_id": "订单号"}, read_only=True)
+    orchestrator.register_skill("query_inventory", MockSkills.query_inventory, "查询库存信息", {"product_id": "产品ID"}, read_only=True)
+    orchestrator.register_skill("update_order_status", MockSkills.update_order_status, "更新订单状态", {"order_id": "订单号", "status": "新状态"})
+    return orchestrator
+
+
+def plan_json(steps, template=None):
+    """构造LLM返回的计划文本"""
+    plan = {"intent": "测试意图", "steps": steps}
+    if template:
+        plan["final_response_template"] = template
+    return json.dumps(plan, ensure_ascii=False)
+
+
+class TestFastPath(unittest.TestCase):
+    """快速路径测试"""
+
+    def test_single_read_step_skips_llm(self):
+        """单步骤只读意图本地渲染回复，只调用一次LLM"""
+        orchestrator = make_orchestrator(plan_json(
+            [{"step": 1, "skill": "query_inventory", "params": {"product_id": "A"}}],
+            "{product_name}当前库存{stock}件"
+        ))
+        result = asyncio.run(orchestrator.process("产品A的库存"))
+
+        self.assertTrue(result["fast_path"])
+        self.assertEqual(result["response"], "产品A当前库存100件")
+        self.assertEqual(len(orchestrator.client.messages.calls), 1)
+        print("✅ 快速路径测试通过")
+
+    def test_missing_field_falls_back(self):
+        """模板引用不存在的字段时降级为LLM生成回复"""
+        orchestrator = make_orchestrator(
+            plan_json([{"step": 1, "skill": "get_order", "params": {"order_id": "12345"}}], "订单状态：{no_such_field}"),
+            "LLM生成的回复"
+        )
+        result = asyncio.run(orchestrator.process("订单12345"))
+
+        self.assertFalse(result["fast_path"])
+        self.assertEqual(result["response"], "LLM生成的回复")
+        self.assertEqual(len(orchestrator.client.messages.calls), 2)
+        print("✅ 模板降级测试通过")
+
+    def test_write_skill_not_fast(self):
+        """写操作技能不走快速路径"""
+        orchestrator = make_orchestrator(
+            plan_json([{"step": 1, "skill": "update_order_status", "params": {"order_id": "12345", "status": "已取消"}}], "已更新为{new_status}"),
+            "订单已更新"
+        )
+        result = asyncio.run(orchestrator.process("取消订单12345"))
+
+        self.assertFalse(result["fast_path"])
+        self.assertEqual(result["response"], "订单已更新")
+        print("✅ 写操作不走快速路径测试通过")
+
+    def test_fast_path_disabled(self):
+        """关闭快速路径时总是调用LLM生成回复"""
+        orchestrator = make_orchestrator(
+            plan_json([{"step": 1, "skill": "get_order", "params": {"order_id": "12345"}}], "订单状态：{status}"),
+            "LLM生成的回复",
+            fast_path=False
+        )
+        result = asyncio.run(orchestrator.process("订单12345"))
+
+        self.assertFalse(result["fast_path"])
+        self.assertEqual(len(orchestrator.client.messages.calls), 2)
+        print("✅ 关闭快速路径测试通过")
+
+
+class TestProcessStream(unittest.TestCase):
+    """流式处理测试"""
+
+    def collect(self, orchestrator, user_input):
+        async def run():
+            return [event async for event in orchestrator.process_stream(user_input)]
+        return asyncio.run(run())
+
+    def test_event_order(self):
+        """事件按 plan → step_start/step_end → token → done 的顺序产出（独立步骤并行，开始/结束事件交错）"""
+        orchestrator = make_orchestrator(
+            plan_json([
+                {"step": 1, "skill": "get_order", "params": {"order_id": "12345"}},
+                {"step": 2, "skill": "query_inventory", "params": {"product_id": "A"}}
+            ]),
+            "订单已发货，库存充足"
+        )
+        events = self.collect(orchestrator, "订单12345和产品A")
+        types = [e["type"] for e in events]
+
+        self.assertEqual(types[:5], ["plan", "step_start", "step_start", "step_end", "step_end"])
+        self.assertEqual(types[-1], "done")
+        tokens = [e["text"] for e in events if e["type"] == "token"]
+        self.assertGreater(len(tokens), 1)
+        self.assertEqual("".join(tokens), "订单已发货，库存充足")
+        self.assertEqual(events[-1]["response"], "订单已发货，库存充足")
+        print("✅ 流式事件顺序测试通过")
+
+    def test_fast_path_single_token(self):
+        """快速路径下回复一次性输出，不调用流式LLM"""
+        orchestrator = make_orchestrator(plan_json(
+            [{"step": 1, "skill": "get_order", "params": {"order_id": "12345"}}],
+            "订单{order_id}：{status}"
+        ))
+        events = self.collect(orchestrator, "订单12345")
+
+        self.assertTrue(events[-1]["fast_path"])
+        self.assertEqual([e["text"] for e in events if e["type"] == "token"], ["订单12345：已发货"])
+        print("✅ 流式快速路径测试通过")
+
+
+class TestParallelExecution(unittest.TestCase):
+    """计划DAG并行执行测试"""
+
+    def setUp(self):
+        self.log = []
+        self.running = 0
+        self.max_running = 0
+        self.orchestrator = AIOrchestrator("sk-ant-test", max_parallel_steps=2)
+
+        def make_skill(name, read_only):
+            async def skill(**params):
+                self.running += 1
+                self.max_running = max(self.max_running, self.running)
+                self.log.append(("start", name))
+                await asyncio.sleep(0.05)
+                self.log.append(("end", name))
+                self.running -= 1
+                return {"success": True, "customer_email": f"{name}@example.com", **params}
+            self.orchestrator.register_skill(name, lambda **p: None, name, async_func=skill, read_only=read_only)
+
+        for name in ("read_a", "read_b", "read_c"):
+            make_skill(name, True)
+        make_skill("write", False)
+
+        async def read_missing(**params):
+            self.log.append(("start", "read_missing"))
+            return {"success": False, "error": "未找到"}
+        self.orchestrator.register_skill("read_missing", lambda **p: None, "read_missing", async_func=read_missing, read_only=True)
+
+    def run_plan(self, steps):
+        return asyncio.run(self.orchestrator.execute_plan({"steps": steps}))
+
+    def test_independent_steps_run_concurrently(self):
+        """独立的只读步骤并发执行，受 max_parallel_steps 限制，结果按计划顺序返回"""
+        steps = [{"step": i + 1, "skill": name, "params": {}} for i, name in enumerate(("read_a", "read_b", "read_c"))]
+        result = self.run_plan(steps)
+
+        self.assertTrue(result["success"])
+        self.assertEqual([r["skill"] for r in result["results"]], ["read_a", "read_b", "read_c"])
+        self.assertEqual(self.max_running, 2)
+        self.assertEqual(self.log[:2], [("start", "read_a"), ("start", "read_b")])
+        print("✅ 独立步骤并发执行测试通过")
+
+    def test_dependencies(self):
+        """$引用、depends_on 和写操作都会等待前面的步骤"""
+        result = self.run_plan([
+            {"step": 1, "skill": "read_a", "params": {}},
+            {"step": 2, "skill": "read_b", "params": {}},
+            {"step": 3, "skill": "read_c", "params": {"to": "$step1_result"}},
+            {"step": 4, "skill": "write", "params": {"to": "$customer_email"}},
+            {"step": 5, "skill": "read_a", "params": {}, "depends_on": [2]},
+        ])
+
+        self.assertEqual(result["results"][2]["result"]["to"]["customer_email"], "read_a@example.com")
+        # 第4步在前3步之后执行，$customer_email 按计划顺序取最后一个提供者（第3步）
+        self.assertEqual(result["results"][3]["result"]["to"], "read_c@example.com")
+        self.assertLess(self.log.index(("end", "read_a")), self.log.index(("start", "read_c")))
+        self.assertEqual(self.log[-2:], [("start", "read_a"), ("end", "read_a")])
+        self.assertEqual(self.orchestrator._build_dependencies([
+            {"step": 1, "skill": "read_a", "params": {}},
+            {"step": 2, "skill": "read_b", "params": {}, "depends_on": [1, 9]},
+        ]), [[], [0]])
+        print("✅ 步骤依赖测试通过")
+
+    def test_context_from_dependencies_only(self):
+        """步骤的参数上下文只包含它依赖的步骤的输出，不包含已完成的无关步骤"""
+        resolve = self.orchestrator._resolve_params
+        contexts = []
+
+        def capture(params, context):
+            contexts.append(dict(context))
+            return resolve(params, context)
+
+        with mock.patch.object(self.orchestrator, "_resolve_params", side_effect=capture):
+            result = self.run_plan([
+                {"step": 1, "skill": "read_a", "params": {}},
+                {"step": 2, "skill": "read_b", "params": {}},
+                {"step": 3, "skill": "read_c", "params": {"to": "$step2_result"}},
+            ])
+
+        self.assertTrue(result["success"])
+        self.assertEqual(set(contexts[-1]), {"step2_result", "customer_email"})
+        self.assertEqual(contexts[-1]["customer_email"], "read_b@example.com")
+        self.assertEqual(set(result["context"]), {"step1_result", "step2_result", "step3_result", "customer_email"})
+        print("✅ 依赖步骤上下文测试通过")
+
+    def test_failed_dependency_skipped(self):
+        """依赖的步骤失败时跳过该步骤（不调用技能），无关的步骤照常执行"""
+        result = self.run_plan([
+            {"step": 1, "skill": "read_missing", "params": {}},
+            {"step": 2, "skill": "read_b", "params": {"to": "$step1_result"}},
+            {"step": 3, "skill": "read_c", "params": {}},
+            {"step": 4, "skill": "write", "params": {}},
+        ])
+
+        missing, dependent, independent, write = result["results"]
+        self.assertFalse(result["success"])
+        self.assertEqual((missing["success"], independent["success"]), (False, True))
+        self.assertEqual(dependent["error"], DEPENDENCY_SKIP_ERROR.format(steps="1"))
+        self.assertEqual(write["error"], DEPENDENCY_SKIP_ERROR.format(steps="1, 2"))
+        self.assertTrue(dependent["skipped"] and write["skipped"])
+        self.assertEqual({name for _, name in self.log}, {"read_missing", "read_c"})
+        print("✅ 依赖失败跳过测试通过")
+
+
+class TestPlannerPrompt(unittest.TestCase):
+    """规划提示词缓存测试"""
+
+    def test_cached_prefix(self):
+        """技能目录放在带 cache_control 的 system 前缀中，每次请求只发送用户输入"""
+        step = [{"step": 1, "skill": "update_order_status", "params": {"order_id": "1", "status": "x"}}]
+        orchestrator = make_orchestrator(plan_json(step), plan_json(step))
+        asyncio.run(orchestrator.analyze_intent("取消订单12345"))
+        asyncio.run(orchestrator.analyze_intent("取消订单888"))
+
+        first, second = orchestrator.client.messages.calls
+        self.assertIs(first["system"], second["system"])
+        self.assertEqual(first["system"][0]["cache_control"], {"type": "ephemeral"})
+        self.assertIn("query_inventory", first["system"][0]["text"])
+        self.assertEqual(second["messages"], [{"role": "user", "content": "用户输入：\"取消订单888\""}])
+
+        orchestrator.register_skill("query_logistics", MockSkills.query_logistics, "查询物流信息", {"tracking_number": "物流单号"})
+        self.assertIn("query_logistics", orchestrator._planner_system[0]["text"])
+        print("✅ 规划提示词缓存测试通过")
+
+
+class ToolUseMessages:
+    """假的 client.messages：按顺序返回预设的 submit_plan 工具调用"""
+
+    def __init__(self, *plans):
+        self.plans = list(plans)
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        block = SimpleNamespace(type="tool_use", id=f"toolu_{len(self.calls)}", name="submit_plan", input=self.plans.pop(0))
+        return SimpleNamespace(content=[block], usage=SimpleNamespace(input_tokens=100, output_tokens=20))
+
+
+class TestToolUsePlanning(unittest.TestCase):
+    """结构化（tool use）规划测试"""
+
+    def test_schema_validation_and_repair(self):
+        """工具schema由技能元数据生成；缺少必填参数时把错误反馈给模型修正"""
+        orchestrator = make_orchestrator()
+        orchestrator.client = SimpleNamespace(messages=ToolUseMessages(
+            {"intent": "取消订单", "steps": [{"step": 1, "skill": "update_order_status", "params": {"order_id": "12345"}}]},
+            {"intent": "取消订单", "steps": [{"step": "1", "skill": "update_order_status", "params": {"order_id": "12345", "status": "已取消"}}]}
+        ))
+        usage = UsageTracker()
+        plan = asyncio.run(orchestrator.analyze_intent("取消订单12345", usage))
+
+        first, second = orchestrator.client.messages.calls
+        self.assertEqual(first["tool_choice"], {"type": "tool", "name": "submit_plan"})
+        variants = first["tools"][0]["input_schema"]["properties"]["steps"]["items"]["anyOf"]
+        update = next(v for v in variants if v["properties"]["skill"]["enum"] == ["update_order_status"])
+        self.assertEqual(update["properties"]["params"]["required"], ["order_id", "status"])
+
+        feedback = second["messages"][-1]["content"][0]
+        self.assertEqual((feedback["type"], feedback["tool_use_id"], feedback["is_error"]), ("tool_result", "toolu_1", True))
+        self.assertIn("status", feedback["content"])
+        self.assertEqual(plan["steps"][0]["step"], 1)
+        self.assertEqual(plan["plan_format"], "tool")
+        self.assertEqual(usage.summary()["plan"]["calls"], 2)
+        print("✅ 结构化规划与修正测试通过")
+
+    def test_invalid_plan_recorded(self):
+        """修正后仍不合法时返回错误计划，并计入规划失败率"""
+        orchestrator = make_orchestrator()
+        bad = {"intent": "x", "steps": [{"step": 1, "skill": "drop_database", "params": {}}]}
+        orchestrator.client = SimpleNamespace(messages=ToolUseMessages(bad, bad))
+        plan = asyncio.run(orchestrator.analyze_intent("删库"))
+        self.assertEqual(plan["intent"], "计划校验失败")
+        self.assertIn("drop_database", plan["error"])
+
+        db = Database(":memory:")
+        db.save_decision(user_input="删库", intent=plan["intent"], action="none", result={},
+                         plan_source=plan.get("plan_source"), plan_format=plan["plan_format"], plan_error=plan["error"])
+        db.save_decision(user_input="q", intent="查询订单", action="get_order", result={}, plan_source="llm", plan_format="tool")
+        db.save_decision(user_input="q", intent="解析失败", action="none", result={})  # 旧记录
+        stats = db.get_plan_failure_stats()
+        self.assertEqual(stats["tool"], {"requests": 2, "failures": 1, "failure_rate": 0.5})
+        self.assertEqual(stats["legacy"]["failures"], 1)
+        print("✅ 规划失败率统计测试通过")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
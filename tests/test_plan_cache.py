@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+参数化计划缓存测试
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import unittest
+from app.entities import extract_entities
+from app.plan_cache import PlanCache
+from app.skills import MockSkills
+from tests.test_orchestrator import make_orchestrator, plan_json
+
+
+def order_plan(order_id):
+    return {
+        "intent": "查询订单",
+        "steps": [{"step": 1, "skill": "get_order", "params": {"order_id": order_id}, "description": f"查询订单{order_id}"}],
+        "final_response_template": "订单{order_id}：{status}"
+    }
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestEntities(unittest.TestCase):
+    """实体识别测试"""
+
+    def test_extract(self):
+        entities = extract_entities("订单12345的物流SF1234567890，产品A库存，客户CUST001")
+        self.assertEqual(
+            [(e.kind, e.value) for e in entities],
+            [("order_id", "12345"), ("tracking_number", "SF1234567890"), ("product_id", "A"), ("customer_id", "CUST001")]
+        )
+        print("✅ 实体识别测试通过")
+
+
+class TestPlanCache(unittest.TestCase):
+    """计划缓存测试"""
+
+    def test_hit_rebinds_slots(self):
+        """同一问法换了订单号，命中缓存并绑定新订单号"""
+        cache = PlanCache()
+        self.assertTrue(cache.put("查询订单12345的状态", order_plan("12345")))
+
+        plan = cache.get("查询订单888的状态")
+        self.assertEqual(plan, order_plan("888"))
+        self.assertIsNone(cache.get("查询产品A的库存"))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        print("✅ 槽位重新绑定测试通过")
+
+    def test_unbound_slot_not_cached(self):
+        """输入中的实体值没有出现在计划里时不缓存"""
+        cache = PlanCache()
+        self.assertFalse(cache.put("查询订单12345的状态", order_plan("00012345")))
+        self.assertEqual(cache.stats()["uncacheable"], 1)
+        self.assertFalse(cache.put("查询订单12345", {"intent": "解析失败", "steps": [], "error": "x"}))
+        print("✅ 不可缓存计划测试通过")
+
+    def test_lru_and_ttl(self):
+        """超出容量淘汰最久未使用的模板，超过有效期自动失效"""
+        clock = FakeClock()
+        cache = PlanCache(max_size=2, ttl_seconds=10, clock=clock)
+        cache.put("查询订单111", order_plan("111"))
+        cache.put("订单111的状态", order_plan("111"))
+        cache.get("查询订单222")  # 刷新第一个模板
+        cache.put("订单111发货了吗", order_plan("111"))
+
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertIsNone(cache.get("订单333的状态"))
+        self.assertIsNotNone(cache.get("查询订单333"))
+
+        clock.now = 11
+        self.assertIsNone(cache.get("查询订单444"))
+        self.assertEqual(cache.stats()["expirations"], 1)
+        print("✅ LRU与TTL测试通过")
+
+    def test_orchestrator_uses_cache(self):
+        """编排器命中缓存时跳过规划LLM调用，注册技能后缓存失效"""
+        orchestrator = make_orchestrator(
+            plan_json([{"step": 1, "skill": "get_order", "params": {"order_id": "12345"}}], "订单{order_id}：{status}"),
+            plan_json([{"step": 1, "skill": "get_order", "params": {"order_id": "999"}}], "订单{order_id}：{status}")
+        )
+        orchestrator.plan_cache = PlanCache()
+
+        first = asyncio.run(orchestrator.process("查询订单12345"))
+        second = asyncio.run(orchestrator.process("查询订单888"))
+        self.assertEqual(first["plan"]["plan_source"], "llm")
+        self.assertEqual(second["plan"]["plan_source"], "cache")
+        self.assertTrue(second["response"].startswith("订单888："))
+        self.assertEqual(len(orchestrator.client.messages.calls), 1)
+
+        orchestrator.register_skill("get_order", MockSkills.get_order, "查询订单信息", {"order_id": "订单号"}, read_only=True)
+        third = asyncio.run(orchestrator.process("查询订单999"))
+        self.assertEqual(third["plan"]["plan_source"], "llm")
+        self.assertEqual(orchestrator.plan_cache.stats()["invalidations"], 1)
+        print("✅ 编排器计划缓存测试通过")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+投机预取测试
+使用假的LLM客户端，不需要API密钥
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import time
+import unittest
+from types import SimpleNamespace
+from app.orchestrator import AIOrchestrator
+from tests.test_orchestrator import FakeMessages, plan_json
+
+
+class SlowMessages(FakeMessages):
+    """规划调用耗时0.1秒的假LLM"""
+
+    async def create(self, **kwargs):
+        await asyncio.sleep(0.1)
+        return await super().create(**kwargs)
+
+
+class TestSpeculativePrefetch(unittest.TestCase):
+    """投机预取测试"""
+
+    def setUp(self):
+        self.calls = []
+
+        async def get_order(order_id):
+            self.calls.append(("get_order", order_id))
+            await asyncio.sleep(0.1)
+            return {"success": True, "order_id": order_id, "status": "已发货"}
+
+        async def update_order_status(order_id, status):
+            self.calls.append(("update_order_status", order_id))
+            return {"success": True, "order_id": order_id, "new_status": status}
+
+        self.orchestrator = AIOrchestrator("sk-ant-test", fast_path=True, speculative_prefetch=True)
+        self.orchestrator.register_skill("get_order", None, "查询订单", {"order_id": "订单号"}, async_func=get_order, read_only=True, prefetch=True)
+        self.orchestrator.register_skill("update_order_status", None, "更新订单状态", {"order_id": "订单号", "status": "新状态"}, async_func=update_order_status)
+
+    def process(self, plan_text, user_input):
+        self.orchestrator.client = SimpleNamespace(messages=SlowMessages(plan_text))
+        return asyncio.run(self.orchestrator.process(user_input))
+
+    def test_prefetch_used(self):
+        """规划期间预取的结果被计划直接使用，执行阶段不再等待技能"""
+        start = time.perf_counter()
+        result = self.process(
+            plan_json([{"step": 1, "skill": "get_order", "params": {"order_id": "12345"}}], "订单{order_id}：{status}"),
+            "订单12345现在什么情况"
+        )
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(result["response"], "订单12345：已发货")
+        self.assertEqual(self.calls, [("get_order", "12345")])
+        self.assertLess(elapsed, 0.18)  # 规划0.1秒与查询0.1秒重叠
+        stats = self.orchestrator.prefetch_stats.stats()
+        self.assertEqual((stats["launched"], stats["used"], stats["wasted"]), (1, 1, 0))
+        print("✅ 预取命中测试通过")
+
+    def test_prefetch_discarded(self):
+        """计划用不到、或写操作之后的预取结果被丢弃"""
+        self.process(
+            plan_json([
+                {"step": 1, "skill": "update_order_status", "params": {"order_id": "888", "status": "已取消"}},
+                {"step": 2, "skill": "get_order", "params": {"order_id": "888"}}
+            ]),
+            "取消订单888，再看看订单999"
+        )
+
+        self.assertEqual(self.calls[-2:], [("update_order_status", "888"), ("get_order", "888")])
+        stats = self.orchestrator.prefetch_stats.stats()
+        self.assertEqual((stats["launched"], stats["used"], stats["wasted"]), (2, 0, 2))
+        print("✅ 预取丢弃测试通过")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
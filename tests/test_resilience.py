@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+重试与熔断测试
+使用 conftest.MockUpstream 模拟上游，不需要Mock API Server
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import time
+import unittest
+import httpx
+import conftest
+from app.deadline import deadline_scope
+from app.resilience import CircuitBreaker, ResilienceManager, STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN
+from app.skills_real import OrderSkill, RefundSkill
+
+
+class FlakyUpstream(conftest.MockUpstream):
+    """前 failures 次请求失败（连接错误或指定状态码），之后正常返回"""
+
+    def __init__(self, failures, status=None):
+        super().__init__()
+        self.failures = failures
+        self.status = status
+
+    def respond(self, request):
+        if self.calls <= self.failures:
+            if self.status is None:
+                raise httpx.ConnectError("refused", request=request)
+            return httpx.Response(self.status, json={"detail": "unavailable"})
+        return httpx.Response(200, json={"status": "已发货", "refund_id": "RF001"})
+
+
+def make_skill(skill_class, upstream, resilience):
+    return conftest.make_skill(skill_class, upstream, api_base="http://order-system", resilience=resilience)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """熔断器状态机测试"""
+
+    def test_open_half_open_close(self):
+        """连续失败后打开并直接拒绝；冷却后放行一个探测请求，成功则关闭，失败则重新打开"""
+        now = [0.0]
+        breaker = CircuitBreaker("order", failure_threshold=3, recovery_timeout=10, clock=lambda: now[0])
+        for _ in range(3):
+            breaker.before_call()
+            breaker.record_failure()
+        self.assertEqual(breaker.state, STATE_OPEN)
+        with self.assertRaises(httpx.ConnectError):
+            breaker.before_call()
+
+        now[0] = 10
+        self.assertEqual(breaker.state, STATE_HALF_OPEN)
+        breaker.before_call()
+        with self.assertRaises(httpx.ConnectError):
+            breaker.before_call()  # 探测名额已用完
+        breaker.record_failure()
+        self.assertEqual(breaker.state, STATE_OPEN)
+
+        now[0] = 20
+        breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(breaker.state, STATE_CLOSED)
+        self.assertEqual(breaker.stats()["times_opened"], 2)
+        self.assertEqual(breaker.stats()["rejected"], 2)
+        print("✅ 熔断器状态测试通过")
+
+
+class TestSkillResilience(unittest.TestCase):
+    """技能请求重试与熔断测试"""
+
+    def setUp(self):
+        self.resilience = ResilienceManager(max_retries=2, base_delay=0.001, max_delay=0.001, failure_threshold=3)
+
+    def test_get_retried(self):
+        """GET遇到连接错误或503时重试，恢复后返回正常结果"""
+        for status in (None, 503):
+            upstream = FlakyUpstream(2, status)
+            result = make_skill(OrderSkill, upstream, self.resilience).get_order("12345")
+            self.assertTrue(result["success"])
+            self.assertEqual(upstream.calls, 3)
+        self.assertEqual(self.resilience.stats()["upstreams"]["http://order-system"]["retries"], 4)
+        print("✅ GET重试测试通过")
+
+    def test_post_not_retried(self):
+        """非幂等的POST不重试"""
+        upstream = FlakyUpstream(1)
+        result = make_skill(RefundSkill, upstream, self.resilience).create_refund("12345", "质量问题")
+        self.assertFalse(result["success"])
+        self.assertEqual(upstream.calls, 1)
+        print("✅ POST不重试测试通过")
+
+    def test_fail_fast_when_open(self):
+        """上游持续故障时熔断打开，之后的请求不再发出，直接返回连接失败"""
+        upstream = FlakyUpstream(100)
+        skill = make_skill(OrderSkill, upstream, self.resilience)
+
+        first = skill.get_order("12345")
+        self.assertEqual(upstream.calls, 3)  # 1次 + 2次重试，达到阈值后打开
+
+        second = asyncio.run(skill.aget_order("12345"))
+        self.assertEqual(upstream.calls, 3)
+        self.assertEqual((first["status"], second["status"]), ("连接失败", "连接失败"))
+        stats = self.resilience.stats()["upstreams"]["http://order-system"]
+        self.assertEqual((stats["state"], stats["rejected"]), (STATE_OPEN, 1))
+        print("✅ 熔断快速失败测试通过")
+
+    def open_breaker(self):
+        """让 order-system 的熔断器打开并立即进入半开状态"""
+        self.resilience.recovery_timeout = 0
+        make_skill(OrderSkill, FlakyUpstream(100), self.resilience).get_order("12345")
+        breaker = self.resilience.breaker("http://order-system")
+        self.assertEqual(breaker.state, STATE_HALF_OPEN)
+        return breaker
+
+    def test_cancelled_probe_released(self):
+        """探测请求被 wait_for 取消后归还名额，下一个请求仍可以探测并关闭熔断器"""
+        breaker = self.open_breaker()
+
+        async def hang():
+            await asyncio.sleep(10)
+
+        async def run():
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(self.resilience.aexecute("http://order-system", "GET", hang), 0.01)
+
+        asyncio.run(run())
+        self.assertEqual(breaker.state, STATE_HALF_OPEN)
+        self.assertTrue(make_skill(OrderSkill, FlakyUpstream(0), self.resilience).get_order("12345")["success"])
+        self.assertEqual(breaker.state, STATE_CLOSED)
+        print("✅ 取消探测请求测试通过")
+
+    def test_deadline_probe_released(self):
+        """请求截止时间已到时探测请求没有发出，不占用探测名额"""
+        breaker = self.open_breaker()
+        upstream = FlakyUpstream(0)
+        skill = make_skill(OrderSkill, upstream, self.resilience)
+        with deadline_scope(0.001):
+            time.sleep(0.01)
+            self.assertEqual(skill.get_order("12345")["status"], "超时")
+        self.assertEqual((breaker.state, upstream.calls), (STATE_HALF_OPEN, 0))
+        self.assertTrue(skill.get_order("12345")["success"])
+        self.assertEqual(breaker.state, STATE_CLOSED)
+        print("✅ 截止时间中止探测请求测试通过")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
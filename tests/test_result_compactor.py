@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+回复提示词结果压缩测试
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import json
+import unittest
+from app.result_compactor import ResultCompactor, estimate_tokens, project, truncate
+from tests.test_orchestrator import make_orchestrator, plan_json
+
+
+def logistics_result(events=40):
+    return {
+        "success": True,
+        "tracking": "SF1234567890",
+        "carrier": "顺丰速运",
+        "carrier_phone": "95338",
+        "status": "运输中",
+        "history": [{"time": f"2025-01-{i % 28 + 1:02d} 08:00", "location": f"站点{i}", "status": "转运"} for i in range(events)],
+        "query_time": "2025-01-28T10:00:00"
+    }
+
+
+class TestCompaction(unittest.TestCase):
+    """投影与截断测试"""
+
+    def test_project_and_truncate(self):
+        """投影保留声明的字段（可嵌套）；长列表保留开头和最后一条并注明省略条数"""
+        orders = {"success": True, "customer_id": "CUST001", "orders": [{"order_id": str(i), "status": "已发货", "address": "很长的地址"} for i in range(6)]}
+        projected = project(orders, ["customer_id", {"orders": ["order_id", "status"]}])
+        self.assertEqual(projected["orders"][0], {"order_id": "0", "status": "已发货"})
+        self.assertTrue(projected["success"])
+
+        truncated = truncate(projected, max_items=3, max_str_len=100)
+        self.assertEqual([o["order_id"] if isinstance(o, dict) else o for o in truncated["orders"]],
+                         ["0", "1", "...（共6条，省略3条）", "5"])
+        self.assertEqual(truncate("字" * 10, 5, 4), "字字字字...")
+        print("✅ 投影与截断测试通过")
+
+    def test_token_budget(self):
+        """超出预算时逐级收紧，最终不超过预算太多"""
+        compactor = ResultCompactor(token_budget=120)
+        compactor.set_projection("query_logistics", ["tracking", "status", "history"])
+        results = [{"step": 1, "skill": "query_logistics", "success": True, "result": logistics_result(200)}]
+        compacted = compactor.compact(results)
+
+        self.assertLessEqual(compacted["compacted_tokens"], 130)
+        self.assertGreater(compacted["saved_tokens"], 1000)
+        self.assertNotIn("carrier_phone", compacted["text"])
+        self.assertEqual(compactor.stats()["saved_tokens"], compacted["saved_tokens"])
+        print("✅ token预算测试通过")
+
+
+class TestResponsePrompt(unittest.TestCase):
+    """回复提示词集成测试"""
+
+    def test_process_reports_savings(self):
+        orchestrator = make_orchestrator(
+            plan_json([{"step": 1, "skill": "query_logistics", "params": {"tracking_number": "SF1234567890"}}]),
+            "包裹运输中",
+            fast_path=False
+        )
+        orchestrator.register_skill("query_logistics", lambda tracking_number: logistics_result(), "查询物流信息",
+                                    {"tracking_number": "物流单号"}, read_only=True,
+                                    result_fields=["tracking", "carrier", "status", "history"])
+        result = asyncio.run(orchestrator.process("SF1234567890到哪了"))
+
+        prompt = orchestrator.client.messages.calls[-1]["messages"][0]["content"]
+        self.assertIn("省略", prompt)
+        self.assertNotIn("query_time", prompt)
+        savings = result["prompt_compaction"]["response"]
+        full = estimate_tokens(json.dumps(result["execution_result"]["results"], ensure_ascii=False, indent=2))
+        self.assertEqual(savings["original_tokens"], full)
+        self.assertGreater(savings["saved_tokens"], savings["compacted_tokens"])
+        print("✅ 回复提示词压缩测试通过")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+规则预路由测试
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import unittest
+from app.rule_router import RuleRouter
+from tests.test_orchestrator import make_orchestrator
+
+
+def make_router():
+    router = RuleRouter()
+    router.add_skill("get_order", "查询订单信息", {"order_id": "订单号"}, ["订单"], "订单{order_id}：{status}", read_only=True)
+    router.add_skill("query_inventory", "查询库存信息", {"product_id": "产品ID"}, ["库存"], read_only=True)
+    router.add_skill("query_logistics", "查询物流信息", {"tracking_number": "物流单号"}, ["物流", "到哪"], read_only=True)
+    router.add_skill("get_customer_orders", "查询客户订单历史", {"customer_id": "客户ID"}, ["订单"], read_only=True)
+    return router
+
+
+class TestRuleRouter(unittest.TestCase):
+    """规则路由测试"""
+
+    def test_unambiguous_queries_routed(self):
+        """意图明确的单实体查询直接生成计划"""
+        router = make_router()
+        cases = {
+            "查询订单12345的状态": ("get_order", {"order_id": "12345"}),
+            "产品A还有库存吗": ("query_inventory", {"product_id": "A"}),
+            "SF1234567890到哪了": ("query_logistics", {"tracking_number": "SF1234567890"}),
+            "客户CUST001的订单": ("get_customer_orders", {"customer_id": "CUST001"}),
+        }
+        for user_input, (skill, params) in cases.items():
+            plan = router.route(user_input)
+            self.assertIsNotNone(plan, user_input)
+            self.assertEqual(plan["steps"][0]["skill"], skill)
+            self.assertEqual(plan["steps"][0]["params"], params)
+            self.assertEqual(plan["plan_source"], "rule")
+        print("✅ 规则路由测试通过")
+
+    def test_ambiguous_queries_deferred(self):
+        """写操作、多实体、组合意图交给LLM"""
+        router = make_router()
+        for user_input in [
+            "取消订单12345",
+            "订单12345延迟了，发个道歉邮件给客户",
+            "订单12345和订单999",
+            "订单12345的物流",
+            "帮我看看12345",
+        ]:
+            self.assertIsNone(router.route(user_input), user_input)
+
+        stats = router.stats()
+        self.assertEqual((stats["total"], stats["routed"], stats["coverage"]), (5, 0, 0.0))
+        self.assertEqual(len(stats["recent_misses"]), 5)
+        print("✅ 模糊请求交给LLM测试通过")
+
+    def test_rules_follow_metadata(self):
+        """只有只读、单个实体参数且声明了关键词的技能才生成规则"""
+        router = RuleRouter()
+        self.assertFalse(router.add_skill("update_order_status", "更新订单状态", {"order_id": "订单号", "status": "新状态"}, ["订单"]))
+        self.assertFalse(router.add_skill("query_promotions", "查询促销", {"product_id": "产品ID（可选）"}, ["促销"], read_only=True))
+        self.assertTrue(router.add_skill("get_order", "查询订单信息", {"order_id": "订单号"}, ["订单"], read_only=True))
+        self.assertFalse(router.add_skill("get_order", "查询订单信息", {"order_id": "订单号"}, read_only=True))
+        self.assertEqual(router.stats()["rules"], 0)
+        print("✅ 规则元数据测试通过")
+
+    def test_orchestrator_skips_llm(self):
+        """规则路由 + 快速路径：整个请求不调用LLM"""
+        orchestrator = make_orchestrator()
+        orchestrator.rule_router = RuleRouter()
+        orchestrator.register_skill(
+            "get_order", orchestrator.skills["get_order"], "查询订单信息", {"order_id": "订单号"},
+            read_only=True, keywords=["订单"], response_template="订单{order_id}：{status}"
+        )
+
+        result = asyncio.run(orchestrator.process("订单12345现在什么状态"))
+        self.assertEqual(result["plan"]["plan_source"], "rule")
+        self.assertTrue(result["fast_path"])
+        self.assertEqual(result["response"], "订单12345：已发货")
+        self.assertEqual(orchestrator.client.messages.calls, [])
+        print("✅ 编排器规则路由测试通过")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
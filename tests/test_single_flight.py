@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+请求合并测试
+使用 conftest.MockUpstream 模拟慢上游，不需要Mock API Server
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import conftest
+from app.single_flight import SingleFlight
+from app.skills_real import OrderSkill, LogisticsSkill
+
+
+class SlowUpstream(conftest.MockUpstream):
+    """每个请求耗时 delay 秒（异步请求不阻塞事件循环）"""
+
+    def __init__(self, delay=0.2):
+        super().__init__()
+        self.delay = delay
+
+    def respond(self, request):
+        time.sleep(self.delay)
+        return self._reply(request)
+
+    async def arespond(self, request):
+        await asyncio.sleep(self.delay)
+        return self._reply(request)
+
+    @staticmethod
+    def _reply(request):
+        return httpx.Response(200, json={"status": "运输中", "tracking_number": request.url.path.rsplit("/", 1)[-1]})
+
+
+def make_skill(skill_class, upstream, flight):
+    skill = conftest.make_skill(skill_class, upstream)
+    skill.single_flight = flight
+    for loader in ("order_loader", "logistics_loader"):
+        if hasattr(skill, loader):
+            getattr(skill, loader).enabled = False  # 只测请求合并，不同ID不合并为批量请求
+    return skill
+
+
+class TestSingleFlight(unittest.TestCase):
+    """相同只读调用合并测试"""
+
+    def setUp(self):
+        self.upstream = SlowUpstream()
+        self.flight = SingleFlight()
+
+    def test_threaded_calls_collapsed(self):
+        """线程池中的并发相同查询只发一次请求，每个调用拿到各自的结果副本"""
+        skill = make_skill(OrderSkill, self.upstream, self.flight)
+        order_ids = ["1"] * 10 + ["2"] * 5
+        with ThreadPoolExecutor(max_workers=len(order_ids)) as pool:
+            results = list(pool.map(skill.get_order, order_ids))
+
+        self.assertTrue(all(r["success"] for r in results))
+        self.assertEqual(sorted(self.upstream.paths), ["/api/orders/1", "/api/orders/2"])
+        self.assertEqual(len({id(r) for r in results}), len(results))
+        stats = self.flight.stats()
+        self.assertEqual((stats["executed"], stats["collapsed"], stats["in_flight"]), (2, 13, 0))
+        self.assertEqual(stats["by_skill"]["get_order"]["collapsed"], 13)
+
+        skill.get_order("1")  # 只合并执行中的请求，完成后再查询会重新请求
+        self.assertEqual(len(self.upstream.paths), 3)
+        print("✅ 同步请求合并测试通过")
+
+    def test_async_calls_collapsed(self):
+        """同一事件循环上的并发相同查询共享一次请求，某个调用方取消不影响其他调用方"""
+        skill = make_skill(LogisticsSkill, self.upstream, self.flight)
+
+        async def run():
+            first = asyncio.create_task(skill.aquery_logistics("SF1"))
+            await asyncio.sleep(0)
+            others = [asyncio.create_task(skill.aquery_logistics(n)) for n in ["SF1"] * 7 + ["SF2"] * 3]
+            await asyncio.sleep(0.05)
+            first.cancel()
+            results = await asyncio.gather(*others)
+            await skill.transport.aclose()
+            return first, results
+
+        first, results = asyncio.run(run())
+        self.assertTrue(first.cancelled())
+        self.assertTrue(all(r["success"] for r in results))
+        self.assertEqual(sorted(self.upstream.paths), ["/api/logistics/SF1", "/api/logistics/SF2"])
+        self.assertEqual(self.flight.stats()["collapsed"], 9)
+        print("✅ 异步请求合并测试通过")
+
+    def test_disabled(self):
+        """关闭合并时每次调用都请求上游"""
+        self.flight = SingleFlight(enabled=False)
+        skill = make_skill(OrderSkill, self.upstream, self.flight)
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(skill.get_order, ["1"] * 4))
+        self.assertEqual(len(self.upstream.paths), 4)
+        self.assertEqual(self.flight.stats()["collapsed"], 0)
+        print("✅ 关闭请求合并测试通过")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+技能结果缓存测试
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import unittest
+from app.orchestrator import AIOrchestrator
+from app.skill_cache import SkillCache, MISS
+from tests.test_plan_cache import FakeClock
+
+
+class TestSkillCache(unittest.TestCase):
+    """缓存本身的测试"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = SkillCache(max_size=2, clock=self.clock)
+        self.cache.register("get_order", ["order_id"], ttl_seconds=30)
+        self.cache.register("query_promotions", ["product_id", "status"], ttl_seconds=300)
+        self.cache.register("create_refund", ["order_id", "reason"], invalidates=["get_order", "query_promotions"])
+
+    def put(self, name, params, result):
+        _, generation = self.cache.get(name, params)
+        return self.cache.put(name, params, result, generation)
+
+    def test_ttl_and_lru(self):
+        """过期后未命中；超过容量淘汰最久未使用的条目；失败结果不缓存"""
+        self.put("get_order", {"order_id": "1"}, {"success": True, "status": "已发货"})
+        self.put("get_order", {"order_id": "2"}, {"success": True})
+        self.assertFalse(self.put("get_order", {"order_id": "9"}, {"success": False, "error": "不存在"}))
+        self.assertEqual(self.cache.get("get_order", {"order_id": "1"})[0]["status"], "已发货")
+
+        self.put("get_order", {"order_id": "3"}, {"success": True})
+        self.assertIs(self.cache.get("get_order", {"order_id": "2"})[0], MISS)
+
+        self.clock.now = 31
+        self.assertIs(self.cache.get("get_order", {"order_id": "1"})[0], MISS)
+        stats = self.cache.stats()
+        self.assertEqual((stats["evictions"], stats["expirations"]), (1, 1))
+        self.assertEqual(stats["skills"]["get_order"]["hits"], 1)
+        print("✅ TTL与LRU测试通过")
+
+    def test_invalidation(self):
+        """写操作按参数精确失效，取不到键参数时失效整个技能；失效期间的查询结果不写回"""
+        self.put("get_order", {"order_id": "1"}, {"success": True})
+        self.put("query_promotions", {"product_id": "A"}, {"success": True})
+        _, stale_generation = self.cache.get("get_order", {"order_id": "2"})
+
+        self.cache.invalidate_for("create_refund", {"order_id": "1", "reason": "质量问题"})
+
+        self.assertIs(self.cache.get("get_order", {"order_id": "1"})[0], MISS)
+        self.assertIs(self.cache.get("query_promotions", {"product_id": "A"})[0], MISS)
+        self.assertFalse(self.cache.put("get_order", {"order_id": "2"}, {"success": True}, stale_generation))
+        self.assertEqual(self.cache.stats()["skills"]["get_order"]["invalidations"], 1)
+        print("✅ 写操作失效测试通过")
+
+
+class TestOrchestratorSkillCache(unittest.TestCase):
+    """编排器集成测试"""
+
+    def test_cached_skill_calls(self):
+        calls = []
+
+        async def get_order(order_id):
+            calls.append(order_id)
+            return {"success": True, "order_id": order_id, "status": f"状态{len(calls)}"}
+
+        async def update_order_status(order_id, status):
+            return {"success": True, "order_id": order_id, "new_status": status}
+
+        orchestrator = AIOrchestrator("sk-ant-test", skill_cache=SkillCache())
+        orchestrator.register_skill("get_order", None, "查询订单", {"order_id": "订单号"}, async_func=get_order, read_only=True, cache_ttl=30)
+        orchestrator.register_skill("update_order_status", None, "更新订单状态", {"order_id": "订单号", "status": "新状态"},
+                                    async_func=update_order_status, invalidates=["get_order"])
+
+        async def run():
+            first = await orchestrator._call_skill("get_order", {"order_id": "12345"})
+            second = await orchestrator._call_skill("get_order", {"order_id": "12345"})
+            await orchestrator._call_skill("update_order_status", {"order_id": "12345", "status": "已取消"})
+            third = await orchestrator._call_skill("get_order", {"order_id": "12345"})
+            return first, second, third
+        first, second, third = asyncio.run(run())
+
+        self.assertEqual(calls, ["12345", "12345"])
+        self.assertEqual(first, second)
+        self.assertEqual(third["status"], "状态2")
+        print("✅ 编排器技能缓存测试通过")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -2,6 +2,8 @@
 import streamlit as st
 import requests
 import json
+import uuid
+from chat_stream import stream_chat
 
 st.set_page_config(page_title="AI业务助手", page_icon="🤖")
 
@@ -11,6 +13,8 @@ st.caption("15天极速版 v0.1")
 # 初始化会话
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 # 显示历史消息
 for message in st.session_state.messages:
@@ -24,19 +28,24 @@ if prompt := st.chat_input("输入您的需求..."):
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    # 调用后端API
+    # 调用后端流式API：先显示执行进度，再逐字显示回复
     with st.chat_message("assistant"):
-        with st.spinner("AI正在思考..."):
-            try:
-                response = requests.post(
-                    "http://localhost:8000/chat",
-                    params={"user_input": prompt},
-                    timeout=30
-                )
-                data = response.json()
-
-                if data["success"]:
-                    st.markdown(data["message"])
+        status = st.empty()
+        placeholder = st.empty()
+        answer = ""
+        status.caption("🤔 AI正在思考...")
+        try:
+            for event, data in stream_chat("http://localhost:8000", prompt, session_id=st.session_state.session_id):
+                if event == "plan":
+                    status.caption(f"🧭 {data.get('intent')}（{len(data.get('steps', []))}个步骤）")
+                elif event == "step_start":
+                    status.caption(f"⚙️ 正在执行：{data.get('description') or data.get('skill')}")
+                elif event == "token":
+                    answer += data["text"]
+                    placeholder.markdown(answer + "▌")
+                elif event == "done":
+                    status.empty()
+                    placeholder.markdown(data["message"])
 
                     # 显示调试信息
                     with st.expander("🔍 查看执行详情"):
@@ -46,11 +55,13 @@ if prompt := st.chat_input("输入您的需求..."):
                         "role": "assistant",
                         "content": data["message"]
                     })
-                else:
+                elif event == "error":
+                    status.empty()
                     st.error(f"错误：{data['error']}")
-            except Exception as e:
-                st.error(f"连接失败：{e}")
-                st.info("请确保后端服务已启动：uvicorn app.main:app --reload")
+        except Exception as e:
+            status.empty()
+            st.error(f"连接失败：{e}")
+            st.info("请确保后端服务已启动：uvicorn app.main:app --reload")
 
 # 侧边栏
 with st.sidebar:
@@ -89,6 +100,7 @@ with st.sidebar:
 
     if st.button("清空对话"):
         st.session_state.messages = []
+        st.session_state.session_id = uuid.uuid4().hex
         st.rerun()
 
     st.divider()
@@ -4,6 +4,8 @@ import requests
 import json
 from datetime import datetime
 import time
+import uuid
+from chat_stream import stream_chat
 
 # 页面配置
 st.set_page_config(
@@ -53,6 +55,9 @@ API_BASE_URL = "http://localhost:8000"
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
 if "stats" not in st.session_state:
     st.session_state.stats = {
         "total_queries": 0,
@@ -66,7 +71,7 @@ def call_chat_api(user_input: str) -> dict:
     try:
         response = requests.post(
             f"{API_BASE_URL}/chat",
-            params={"user_input": user_input},
+            params={"user_input": user_input, "session_id": st.session_state.session_id},
             timeout=30
         )
         return response.json()
@@ -136,40 +141,68 @@ with main_col:
         with st.chat_message("user"):
             st.markdown(prompt)
 
-        # 调用后端API
+        # 调用后端流式API：先显示执行进度，再逐字显示回复
         with st.chat_message("assistant"):
-            with st.spinner("🤔 AI正在分析您的请求..."):
-                start_time = time.time()
-                data = call_chat_api(prompt)
-                elapsed_time = (time.time() - start_time) * 1000
-
-                # 更新统计
-                st.session_state.stats["total_queries"] += 1
-                st.session_state.stats["total_time"] += elapsed_time
-
-                if data.get("success"):
-                    st.session_state.stats["successful_queries"] += 1
+            start_time = time.time()
+            data = {"success": False, "error": "未收到响应"}
+            answer = ""
+            first_token_ms = None
+
+            with st.status("🤔 AI正在分析您的请求...", expanded=False) as progress:
+                placeholder = st.empty()
+                try:
+                    for event, event_data in stream_chat(API_BASE_URL, prompt, session_id=st.session_state.session_id):
+                        if event == "plan":
+                            progress.update(label=f"🧭 {event_data.get('intent')}（{len(event_data.get('steps', []))}个步骤）")
+                        elif event == "step_start":
+                            progress.update(label=f"⚙️ 正在执行：{event_data.get('description') or event_data.get('skill')}")
+                        elif event == "step_end":
+                            mark = "✅" if event_data.get("success") else "❌"
+                            st.caption(f"{mark} 步骤{event_data.get('step')}：{event_data.get('skill')}")
+                        elif event == "token":
+                            if first_token_ms is None:
+                                first_token_ms = (time.time() - start_time) * 1000
+                            answer += event_data["text"]
+                            placeholder.markdown(answer + "▌")
+                        elif event in ("done", "error"):
+                            data = event_data
+                except Exception as e:
+                    data = {"success": False, "error": str(e)}
+                placeholder.empty()
+                progress.update(label="处理完成", state="complete" if data.get("success") else "error")
+
+            elapsed_time = (time.time() - start_time) * 1000
+
+            # 更新统计
+            st.session_state.stats["total_queries"] += 1
+            st.session_state.stats["total_time"] += elapsed_time
+
+            if data.get("success"):
+                st.session_state.stats["successful_queries"] += 1
+                st.markdown(data["message"])
+
+                # 保存消息（包含调试信息）
+                st.session_state.messages.append({
+                    "role": "assistant",
+                    "content": data["message"],
+                    "debug": data.get("debug")
+                })
+
+                # 显示成功提示
+                first_token_text = f" | 首字: {first_token_ms:.0f}ms" if first_token_ms is not None else ""
+                st.success(f"✅ 处理成功 | 耗时: {elapsed_time:.0f}ms{first_token_text}")
+            else:
+                error_msg = data.get("error", "未知错误")
+                if data.get("message"):
                     st.markdown(data["message"])
+                st.error(f"❌ 处理失败：{error_msg}")
 
-                    # 保存消息（包含调试信息）
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": data["message"],
-                        "debug": data.get("debug")
-                    })
-
-                    # 显示成功提示
-                    st.success(f"✅ 处理成功 | 耗时: {elapsed_time:.0f}ms")
-                else:
-                    error_msg = data.get("error", "未知错误")
-                    st.error(f"❌ 处理失败：{error_msg}")
-
-                    # 显示详细错误信息
-                    if data.get("debug"):
-                        with st.expander("🔧 错误详情"):
-                            st.json(data["debug"])
+                # 显示详细错误信息
+                if data.get("debug"):
+                    with st.expander("🔧 错误详情"):
+                        st.json(data["debug"])
 
-                    st.info("💡 提示：请检查输入格式或联系管理员")
+                st.info("💡 提示：请检查输入格式或联系管理员")
 
 # 右侧统计面板
 with stats_col:
@@ -280,6 +313,7 @@ with st.sidebar:
     with col1:
         if st.button("🗑️ 清空对话", use_container_width=True):
             st.session_state.messages = []
+            st.session_state.session_id = uuid.uuid4().hex
             st.rerun()
 
     with col2:
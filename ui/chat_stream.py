@@ -0,0 +1,40 @@
+# ui/chat_stream.py - 流式对话客户端（供各聊天界面共用）
+import json
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import requests
+
+
+def stream_chat(
+    api_base: str,
+    user_input: str,
+    user_id: str = "default",
+    timeout: float = 30,
+    session_id: Optional[str] = None
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    调用 /chat/stream，逐个产出 (事件类型, 数据)
+
+    传 session_id 时后端带上同一会话的对话上下文（可以追问"它到哪了"）
+
+    事件类型：plan / step_start / step_end / token / done / error
+    """
+    with requests.post(
+        f"{api_base}/chat/stream",
+        params={"user_input": user_input, "user_id": user_id, "session_id": session_id},
+        stream=True,
+        timeout=timeout
+    ) as response:
+        response.raise_for_status()
+        response.encoding = "utf-8"
+
+        event_type, data_lines = "message", []
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event_type = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data_lines.append(line[len("data:"):].strip())
+            elif not line and data_lines:
+                # 空行表示一条事件结束
+                yield event_type, json.loads("\n".join(data_lines))
+                event_type, data_lines = "message", []